@@ -1,26 +1,37 @@
 import os
-import glob
 import sys
 import re
 import csv
 import json
 import argparse
 import pathlib
-import tiktoken
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import networkx as nx
-import numpy as np
-import requests
-from scipy.spatial.distance import cosine
 from tree_sitter import Parser, Language
-from rag import RaggedyRag, load_embeddings_db, load_file_trees, loaded_graph
+from rag import CODEBASE_STORE_PATH, FILE_TREES_PATH, QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_TTL, RaggedyRag, load_embeddings_db, save_embeddings_db, convert_embeddings_db, load_file_trees, loaded_graph
+from utils.embeddings.embedding_client import EmbeddingClient
+from utils.embeddings.embedding_cache import EmbeddingCache
+from utils.embeddings.embedding_pipeline import EmbeddingPipeline
+from utils.indexing.file_tree_store import write_file_trees
+from utils.indexing.file_manifest import diff_manifest, file_entry, hash_bytes, load_manifest, save_manifest
+from utils.indexing.element_lookup import element_lookup
+from utils.indexing.embedding_keys import extract_component_name, path_of_key
+from utils.search.vector_search import VectorSearch, ann_enabled, ann_nprobe, configure_ann, search_index_for
+from utils.search.query_cache import QueryCache, normalize_query
+from utils.search.ann_index import IVFIndex, ann_index_path, load_ann_index, recall_at_k
+from utils.graph.dependency_graph import DependencyGraph
+from utils.graph.symbol_index import FileSymbolIndex, element_index_for
+from utils.graph.graph_writer import write_graph_json
 
 
 # custom written ast post-processing utils (there are prob better/cleaner ways of doing this?)
 # the intent is to make retrieving file properties on demand a brainless & quick task.
 # maybe there's a totally big brain way of looking at this in which case pls lmk!
 from utils.grammar.ast_traversers import (
-    TreeNode, traverse_tree_js, traverse_tree_go, traverse_tree_go, traverse_tree_java,
+    TreeNode, traverse_tree_js, traverse_tree_go, traverse_tree_java,
     traverse_tree_kt, traverse_tree_python, traverse_tree_swift, traverse_tree_cpp,traverse_tree_c,
 )
 
@@ -29,10 +40,26 @@ EMBEDDING_API_URL = "http://localhost:11434/api/embeddings"
 LLM_API_URL = "http://localhost:11434/api/generate"
 CODEBASE_DB_PATH = "./assets/codebase_embeddings.db"
 REQUIREMENTS_DB_PATH = "./assets/requirements_embeddings.db"
+EMBEDDING_CACHE_PATH = "./assets/embedding_cache.db"
+EMBEDDING_CACHE_MAX_ENTRIES = 2_000_000
+MANIFEST_PATH = "./assets/file_manifest.json"
+README_INFO_PATH = "./assets/repos_readme.json"
+FULL_GRAPH_PATH = "./frontend/public/api/graph-data/full_graph.json"
+# indent of the generated tree/graph json, None writes it compact. --pretty_json sets 4 for debugging
+JSON_INDENT = None
+# files handed to a parse worker at a time with --workers
+PARSE_CHUNK_SIZE = 16
 CODE_EMBEDDING_MODEL = "unclemusclez/jina-embeddings-v2-base-code:q4"
 REQUIREMENT_EMBEDDING_MODEL = "unclemusclez/jina-embeddings-v2-base-code:q4"
 logging.basicConfig(level=logging.DEBUG)
 
+# Shared pooled client, every embedding request of an indexing run goes through it
+embedding_client = EmbeddingClient(EMBEDDING_API_URL, model=CODE_EMBEDDING_MODEL)
+# (model, prompt hash) -> vector, so re-indexing only embeds text that actually changed
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+# recent query embeddings in memory, shared with RaggedyRag and the flask routes
+query_embedding_cache = QueryCache(QUERY_EMBEDDING_CACHE_SIZE, ttl=QUERY_EMBEDDING_TTL)
+
 LANGUAGE_SO_PATH = "./utils/grammar/language_grammars.so"
 LANGUAGE_DATA = {
     "java": ("java", [".java"]),
@@ -44,12 +71,6 @@ LANGUAGE_DATA = {
     "c": ("c", [".c"]),
     "swift": ("swift", [".swift"])}
 
-# Initialize tiktoken encoder
-enc = tiktoken.encoding_for_model("gpt-4")
-
-def count_tokens(text):
-    return len(enc.encode(text))
-
 ########################################################################################################################
 #################################### THIS SECTION OF THE CODE DOES THE FOLLOWING #######################################
 ########################################################################################################################
@@ -80,109 +101,88 @@ def init_tree_sitter_languages():
     }
 
 def generate_embeddings(text, model=CODE_EMBEDDING_MODEL):
-    payload = json.dumps({"model": model, "prompt": text})
-    headers = {'Content-Type': 'application/json'}
-    try:
-        response = requests.post(EMBEDDING_API_URL, data=payload, headers=headers)
-        response.raise_for_status()
-        result = response.json()
-        embeddings = result.get('embedding')
-        if not embeddings:
-            logging.error(f"Invalid embedding format received. Expected 768 dimensions, got {len(embeddings) if embeddings else 'None'}")
-            return None
-        return np.array(embeddings, dtype=np.float32)
-    except Exception as e:
-        logging.error(f"Error in generate_embeddings: {str(e)}")
-        return None
+    return generate_embeddings_batch([text], model=model)[0]
+
+def embed_query(query_text, model=CODE_EMBEDDING_MODEL):
+    # repeated queries skip the embedding server, identical ones in flight share a single request.
+    # Only the in-memory query cache holds them, the on-disk cache is for indexed code.
+    query_text = normalize_query(query_text)
+    return query_embedding_cache.get_or_compute((model, query_text), lambda: embedding_client.embed(query_text, model=model))
+
+def generate_embeddings_batch(texts, model=CODE_EMBEDDING_MODEL):
+    texts = list(texts)
+    embeddings = embedding_cache.get_many(model, texts)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+        fresh = dict(zip(missing_texts, embedding_client.embed_many(missing_texts, model=model)))
+        for i in missing:
+            embeddings[i] = fresh[texts[i]]
+        embedding_cache.put_many(model, fresh.items())
+    return embeddings
 
 def query_embeddings(query_text, code_embeddings_db, requirements_db, file_trees, top_k=5):
-    file_trees = load_file_trees()
-    query_embedding = generate_embeddings(query_text)
+    # snippets can come from any file, not only the retrieval subset passed in
+    file_trees = load_file_trees(lazy=True)
+    query_embedding = embed_query(query_text)
     if query_embedding is None:
         return [], []
 
-    code_results = []
-    requirement_results = []
-
     # Query code embeddings
-    for key, embedding in code_embeddings_db.items():
-        if embedding is not None:
-            similarity = 1 - cosine(query_embedding, embedding)
-            file_path = key.split('|path:')[-1]
-            snippet = get_snippet(file_trees.get(file_path), key.split('|')[0])
-            code_results.append((key, similarity, snippet, "code"))
+    code_results = []
+    for key, similarity in search_index_for(code_embeddings_db).search(query_embedding, top_k):
+        snippet = get_snippet(file_trees.get(path_of_key(key)), key.split('|')[0])
+        code_results.append((key, similarity, snippet, "code"))
 
     # Query requirements embeddings
-    for requirement_id, data in requirements_db.items():
-        embedding = np.array(data.get("embedding", []))
-        if embedding.size == 0:
-            continue
-        similarity = 1 - cosine(query_embedding, embedding)
-        requirement_results.append((requirement_id, similarity, data, "requirement"))
-
-    code_results.sort(key=lambda x: x[1], reverse=True)
-    requirement_results.sort(key=lambda x: x[1], reverse=True)
+    requirement_index = search_index_for(requirements_db, vectors_of=requirement_vectors)
+    requirement_results = [
+        (requirement_id, similarity, requirements_db[requirement_id], "requirement")
+        for requirement_id, similarity in requirement_index.search(query_embedding, top_k)
+    ]
 
-    return code_results[:top_k], requirement_results[:top_k]
+    return code_results, requirement_results
 
+def requirement_vectors(requirements_db):
+    return {requirement_id: data.get("embedding") for requirement_id, data in requirements_db.items() if data.get("embedding")}
 
 
 def layered_query_embeddings(query_text, embeddings_db, file_trees, top_k=5, min_repos=2, merge_mode='overall'):
-    query_embedding = generate_embeddings(query_text)
+    query_embedding = embed_query(query_text)
     if query_embedding is None:
         return {}
 
-    all_results = []
-    for key, embedding in embeddings_db.items():
-        if embedding is not None:
-            similarity = 1 - cosine(query_embedding, embedding)
-            file_path = key.split('|path:')[-1]
+    index = search_index_for(embeddings_db)
+    # walk a generous top slice first, only fall back to ranking everything if it
+    # doesn't contain min_repos distinct repos
+    candidate_count = max(top_k * 20, 100)
+    while True:
+        candidates = index.search(query_embedding, candidate_count)
+        top_results = []
+        unique_repos = set()
+        for key, similarity in candidates:
+            file_path = path_of_key(key)
             repo_name = file_path.split(os.sep)[0]
-            snippet = get_snippet(file_trees.get(file_path), key.split('|')[0])
-            all_results.append((key, similarity, snippet, repo_name))
-
-    all_results.sort(key=lambda x: x[1], reverse=True)
-
-    top_results = []
-    unique_repos = set()
-    for result in all_results:
-        top_results.append(result)
-        unique_repos.add(result[3])
-        if len(top_results) >= top_k and len(unique_repos) >= min_repos:
+            top_results.append((key, similarity, file_path, repo_name))
+            unique_repos.add(repo_name)
+            if len(top_results) >= top_k and len(unique_repos) >= min_repos:
+                break
+        if len(unique_repos) >= min_repos or candidate_count >= len(index):
             break
+        candidate_count = len(index)
 
-    final_results = top_results[:top_k]
+    final_results = [
+        (key, similarity, get_snippet(file_trees.get(file_path), key.split('|')[0]), repo_name)
+        for key, similarity, file_path, repo_name in top_results[:top_k]
+    ]
 
     return organize_results(file_trees, final_results, top_k)
 
 
 
 def find_imported_elements(import_stmt, file_trees):
-    imported_elements = []
-    for file_path, node_tree in file_trees.items():
-        if isinstance(node_tree, dict):
-            class_names = node_tree.get('class_names', [])
-            functions = node_tree.get('functions', [])
-            properties = node_tree.get('property_declarations', [])
-        else:
-            class_names = node_tree.class_names
-            functions = node_tree.functions
-            properties = node_tree.property_declarations
-
-        # Check if the import statement matches any class, function, or property
-        for class_name in class_names:
-            if import_stmt in class_name:
-                imported_elements.append(f"class:{class_name}|{file_path}")
-
-        for func in functions:
-            if import_stmt == func.name:
-                imported_elements.append(f"function:{func.name}|{file_path}")
-
-        for prop in properties:
-            if import_stmt in prop:
-                imported_elements.append(f"property:{prop}|{file_path}")
-
-    return imported_elements
+    # classes and properties containing import_stmt and functions named import_stmt, in file_trees order
+    return element_index_for(file_trees).find_imported_elements(import_stmt)
 
 
 def get_snippet(node_tree, element_type):
@@ -197,37 +197,23 @@ def get_snippet(node_tree, element_type):
 
     element_prefix = parts[0]
     element_name = parts[1]
-
-    if isinstance(node_tree, dict):
-        functions = node_tree.get('functions', [])
-        class_names = node_tree.get('class_names', [])
-        property_declarations = node_tree.get('property_declarations', [])
-        imports = node_tree.get('imports', [])
-    else:
-        functions = node_tree.functions
-        class_names = node_tree.class_names
-        property_declarations = node_tree.property_declarations
-        imports = node_tree.imports
+    lookup = element_lookup(node_tree)
 
     if element_prefix == "function":
-        for func in functions:
-            if func.get('name') == element_name:
-                func_body = func.get('body', '')
-                return func_body[:200] + "..." if len(func_body) > 200 else func_body
+        func_body = lookup.function_body(element_name)
+        if func_body is not None:
+            return func_body[:200] + "..." if len(func_body) > 200 else func_body
     elif element_prefix == "class":
-        if element_name in class_names:
+        if lookup.has_class(element_name):
             return f"class {element_name}"
     elif element_prefix == "property":
-        for prop in property_declarations:
-            if element_name in prop:
-                return prop
+        prop = lookup.property_containing(element_name)
+        if prop is not None:
+            return prop
     elif element_prefix == "import":
-        for imp in imports:
-            if element_name in imp:
-                return imp
-            # Check if the element_name is a part of a longer import statement
-            if any(part in imp for part in element_name.split('.')):
-                return imp
+        imp = lookup.import_matching(element_name)
+        if imp is not None:
+            return imp
 
     logging.warning(f"No matching element found for element type '{element_type}'.")
     return "Snippet not available"
@@ -237,62 +223,96 @@ def chunk_text(text, tokens_per_chunk=500):
     words = text.split()
     return [' '.join(words[i:i+tokens_per_chunk]) for i in range(0, len(words), tokens_per_chunk)]
 
-def manage_embeddings(tree_node, file_path, embeddings_db):
+def manage_embeddings(tree_node, file_path, pipeline):
+    prompts = {}
     for class_name in tree_node.class_names:
         key = f"class:{class_name}|path:{file_path}"
-        embeddings_db[key] = generate_embeddings(f"{key}: {class_name}")
+        prompts[key] = f"{key}: {class_name}"
 
     for import_stmt in tree_node.imports:
         key = f"import:{import_stmt}|path:{file_path}"
-        embeddings_db[key] = generate_embeddings(f"{key}: {import_stmt}")
+        prompts[key] = f"{key}: {import_stmt}"
 
     for export_stmt in tree_node.exports:
         key = f"export:{export_stmt}|path:{file_path}"
-        embeddings_db[key] = generate_embeddings(f"{key}: {export_stmt}")
+        prompts[key] = f"{key}: {export_stmt}"
 
     for prop in tree_node.property_declarations:
         key = f"property:{prop}|path:{file_path}"
-        embeddings_db[key] = generate_embeddings(f"{key}: {prop}")
+        prompts[key] = f"{key}: {prop}"
 
     for func in tree_node.functions:
         key = f"function:{func.name}|class:{func.class_name}|path:{file_path}"
-        embeddings_db[key] = generate_embeddings(f"{key}: {func.name}")
+        prompts[key] = f"{key}: {func.name}"
 
         body_chunks = chunk_text(func.body)
         for i, chunk in enumerate(body_chunks):
             key = f"function_{func.name}_body_chunk_{i}|class:{func.class_name}|path:{file_path}"
-            embeddings_db[key] = generate_embeddings(f"{key}: {chunk}")
+            prompts[key] = f"{key}: {chunk}"
+
+    # batched together with the prompts of the next files and embedded while they are parsed
+    pipeline.add(prompts)
+
+def open_embedding_pipeline(embeddings_db):
+    return EmbeddingPipeline(generate_embeddings_batch, embeddings_db,
+                             batch_size=embedding_client.batch_size, max_workers=embedding_client.max_workers)
+
+# one Parser per (thread, language); building one and loading its grammar costs more than parsing a small file
+_parsers = threading.local()
+
+def get_parser(language):
+    parsers = getattr(_parsers, "by_language", None)
+    if parsers is None:
+        parsers = _parsers.by_language = {}
+    parser = parsers.get(language.name)
+    if parser is None:
+        parser = parsers[language.name] = Parser()
+        parser.set_language(language)
+    return parser
+
+TRAVERSERS = {
+    "java": traverse_tree_java,
+    "kotlin": traverse_tree_kt,
+    "javascript": traverse_tree_js,
+    "go": traverse_tree_go,
+    "python": traverse_tree_python,
+    "cpp": traverse_tree_cpp,
+    "c": traverse_tree_c,
+    "swift": traverse_tree_swift,
+}
 
 def process_code_string(code_string, language, file_path):
-    parser = Parser()
-    parser.set_language(language)
-    tree = parser.parse(bytes(code_string, "utf8"))
-    root_node = tree.root_node
-
-    node_tree = TreeNode(file_path=file_path)
+    return process_code_bytes(bytes(code_string, "utf8"), language, file_path)
 
-    if language.name == "java":
-        traverse_tree_java(root_node, bytes(code_string, "utf8"), node_tree, language)
-    elif language.name == "kotlin":
-        traverse_tree_kt(root_node, bytes(code_string, "utf8"), node_tree, language)
-    elif language.name == "javascript":
-        traverse_tree_js(root_node, bytes(code_string, "utf8"), node_tree, language)
-    elif language.name == "go":
-        traverse_tree_go(root_node, bytes(code_string, "utf8"), node_tree, language)
-    elif language.name == "python":
-        traverse_tree_python(root_node, bytes(code_string, "utf8"), node_tree, language)
-    elif language.name == "cpp":
-        traverse_tree_cpp(root_node, bytes(code_string, "utf8"), node_tree, language)
-    elif language.name == "c":
-        traverse_tree_c(root_node, bytes(code_string, "utf8"), node_tree, language)
-    elif language.name == "swift":
-        traverse_tree_swift(root_node, bytes(code_string, "utf8"), node_tree, language)
-    else:
+def process_code_bytes(code, language, file_path):
+    # same as process_code_string for utf-8 source that is already bytes, e.g. straight from disk.
+    traverser = TRAVERSERS.get(language.name)
+    if traverser is None:
         raise ValueError(f"Unsupported language: {language.name}")
 
+    tree = get_parser(language).parse(code)
+    node_tree = TreeNode(file_path=file_path)
+    traverser(tree.root_node, code, node_tree, language)
     return node_tree
 
-def init_tree_sitter(root_dir):
+def read_source(file_path):
+    # (raw bytes, manifest entry of exactly those bytes). The stat is taken before reading,
+    # so an edit that lands during or after the read shows up as a newer mtime on the next update.
+    with open(file_path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        raw = f.read()
+    return raw, file_entry(file_path, stat, hash_bytes(raw))
+
+def decode_source(raw):
+    # (utf-8 bytes to parse, decoded text). Matches reading in text mode:
+    # newlines are normalized to "\n", files without "\r" are passed through without re-encoding.
+    file_content = raw.decode("utf-8")
+    if b"\r" in raw:
+        file_content = file_content.replace("\r\n", "\n").replace("\r", "\n")
+        return file_content.encode("utf-8"), file_content
+    return raw, file_content
+
+def init_tree_sitter(root_dir, workers=1):
     modules = {}
     file_trees = {}
     file_sizes = {}
@@ -301,33 +321,74 @@ def init_tree_sitter(root_dir):
     total_directories = len(directories)
     processed_directories = 0
     readme_info_list = []
-    global embeddings_db
+    global embeddings_db, embedding_pipeline
     embeddings_db = {}
+    embedding_client.reset_stats()
+    embedding_cache.reset_stats()
 
-    for dir_name in directories:
-        repo_path = os.path.join(root_dir, dir_name)
-        if os.path.isdir(repo_path):
-            module_dir = dir_name
-            processed_directories += 1
-            logging.info(f"Processing {dir_name}: {(processed_directories / total_directories) * 100:.2f}% complete")
-            process_repository(repo_path, modules, file_trees, file_sizes, package_names, readme_info_list)
-
+    # built from the bytes that were parsed, not from a second walk after indexing
+    manifest = {}
+    embedding_pipeline = open_embedding_pipeline(embeddings_db)
+    pool = create_parse_pool(workers)
+    try:
+        for dir_name in directories:
+            repo_path = os.path.join(root_dir, dir_name)
+            if os.path.isdir(repo_path):
+                processed_directories += 1
+                logging.info(f"Processing {dir_name}: {(processed_directories / total_directories) * 100:.2f}% complete")
+                process_repository(repo_path, modules, file_trees, file_sizes, package_names, readme_info_list, pool=pool, manifest=manifest)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        embedding_pipeline.close()
+        embedding_pipeline = None
+
+    embedding_client.log_report()
     save_file_trees(file_trees)
     save_embeddings_db(embeddings_db)
 
-    json_data = process_full_graph("./frontend/public/api/tree-node-data/file_trees.json")
+    json_data = process_full_graph(FILE_TREES_PATH)
 
-    with open("./frontend/public/api/graph-data/full_graph.json", "w") as outfile:
-        json.dump(json_data, outfile, indent=4, sort_keys=True)
+    write_graph_json(FULL_GRAPH_PATH, json_data['nodes'], json_data['links'], indent=JSON_INDENT)
+    reload_dependency_graph(json_data)
 
-    with open("./assets/repos_readme.json", 'w', encoding='utf-8') as file:
-        json.dump(readme_info_list, file, ensure_ascii=False, indent=4)
+    save_readme_info(readme_info_list)
 
-    generate_individual_user_jsons(json_data)
+    generate_individual_user_jsons(json_data, workers=workers)
     generate_root_level_json(json_data)
 
+    save_manifest(MANIFEST_PATH, root_dir, manifest)
+
     return modules, file_sizes, package_names, file_trees, json_data
 
+def save_readme_info(readme_info_list):
+    with open(README_INFO_PATH, 'w', encoding='utf-8') as file:
+        json.dump(readme_info_list, file, ensure_ascii=False, indent=JSON_INDENT)
+
+def is_readme(file_path):
+    return "README" in file_path.upper()
+
+def readme_info(file_path, file_content):
+    return {"id": os.path.basename(os.path.dirname(file_path)), "content": file_content}
+
+def collect_readme_info(file_paths, contents):
+    # repos_readme.json entries for every indexed README; contents parsed in this run are in `contents`,
+    # the others haven't changed since they were indexed and are read back from disk
+    readme_info_list = []
+    for file_path in file_paths:
+        if not is_readme(file_path):
+            continue
+        file_content = contents.get(file_path)
+        if file_content is None:
+            try:
+                file_content = decode_source(read_source(file_path)[0])[1]
+            except (OSError, UnicodeDecodeError) as e:
+                logging.warning(f"Skipping README {file_path}: {str(e)}")
+                continue
+        readme_info_list.append(readme_info(file_path, file_content))
+    return readme_info_list
+
 def should_skip_path(path):
     skip_directories = [
         'node_modules', 'build', 'dist', 'out', 'bin', '.git', '.svn', '.vscode',
@@ -336,20 +397,141 @@ def should_skip_path(path):
     ]
     return any(skip_dir in path.split(os.path.sep) for skip_dir in skip_directories)
 def save_file_trees(file_trees):
-    with open("./frontend/public/api/tree-node-data/file_trees.json", "w") as file:
-        json.dump({k: v.to_dict() for k, v in file_trees.items()}, file, indent=4)
+    # values are TreeNodes after a parse, or plain dicts when patching a loaded index.
+    # Written entry by entry together with the offset index the flask server reads it through.
+    # TreeNodes are replaced by their dicts as they are written, which frees the parsed source bytes
+    # their function bodies point into.
+    def entries():
+        for file_path, node_tree in file_trees.items():
+            if isinstance(node_tree, TreeNode):
+                node_tree = file_trees[file_path] = node_tree.to_dict()
+            yield file_path, node_tree
+
+    write_file_trees(FILE_TREES_PATH, entries(), indent=JSON_INDENT)
+
+def iter_source_files(root_dir):
+    # same walk as init_tree_sitter/process_repository, restricted to files a traverser can parse
+    extensions = {ext for _, exts in LANGUAGE_DATA.values() for ext in exts}
+    for dir_name in sorted(os.listdir(root_dir)):
+        repo_path = os.path.join(root_dir, dir_name)
+        if not os.path.isdir(repo_path) or should_skip_path(repo_path):
+            continue
+        for root, dirs, files in os.walk(repo_path):
+            if should_skip_path(root):
+                continue
+            for file in files:
+                if os.path.splitext(file)[1] in extensions:
+                    yield os.path.join(root, file)
 
-def extract_component_name(file_path):
-    match = re.search(r"/([^/]+)/(?:app/)?src/", file_path)
-    if match:
-        return match.group(1)
-    return None
-def process_codebase(root_directory):
+def process_codebase(root_directory, workers=1):
     init_tree_sitter_languages()
-    modules, file_sizes, package_names, file_trees, json_data = init_tree_sitter(root_directory)
+    # init_tree_sitter has already saved the file trees and embeddings
+    modules, file_sizes, package_names, file_trees, json_data = init_tree_sitter(root_directory, workers=workers)
+    build_ann_index()
+    print_embedding_cache_stats()
+    return "Codebase processing complete. Embeddings have been saved."
+
+def build_ann_index(reuse_centroids=False):
+    # only with --ann, queries use exact search otherwise
+    path = ann_index_path(CODEBASE_STORE_PATH)
+    if not ann_enabled():
+        if os.path.exists(path) and not reuse_centroids:
+            # a full run rewrote the store, the old index can't match it anymore (an update keeps it
+            # so a later 'update --ann' can re-file the rows under its trained centroids)
+            os.remove(path)
+        return None
+    store = load_embeddings_db()
+    if len(store) == 0:
+        return None
+
+    index = VectorSearch(store)
+    centroids = None
+    if reuse_centroids and os.path.exists(path):
+        # keep the trained partition, only re-file the rows of the rewritten store
+        centroids = IVFIndex.load(path).centroids
+    logging.info(f"Building IVF index over {len(store)} embeddings")
+    index.ann = IVFIndex.build(index.matrix, index.inv_norms, store.key_list, centroids=centroids, nprobe=ann_nprobe())
+    index.ann.save(path)
+    logging.info(f"ANN index: {index.ann.n_lists} lists, nprobe {index.ann.nprobe}, "
+                 f"recall@10 vs exact search {recall_at_k(index, k=10):.3f}")
+    return index.ann
+
+def check_ann_recall(k=10, nprobes=(1, 2, 4, 8, 16, 32, 64)):
+    store = load_embeddings_db()
+    index = VectorSearch(store)
+    index.ann = load_ann_index(CODEBASE_STORE_PATH, store.key_list) if len(store) else None
+    if index.ann is None:
+        print("No ANN index found, queries use exact search.")
+        return
+    print(f"IVF index with {index.ann.n_lists} lists over {len(store)} embeddings")
+    for nprobe in nprobes:
+        if nprobe > index.ann.n_lists:
+            break
+        print(f"nprobe {nprobe:>4}: recall@{k} {recall_at_k(index, k=k, nprobe=nprobe):.3f}")
+
+def print_embedding_cache_stats():
+    cache_stats = embedding_cache.log_report()
+    print(f"Embedding cache hits: {cache_stats['hits']}, misses: {cache_stats['misses']} "
+          f"({cache_stats['hit_rate'] * 100:.1f}% hit rate)")
+
+def update_codebase(root_directory, workers=1):
+    previous = load_manifest(MANIFEST_PATH)
+    if not previous["files"] or not os.path.exists(FILE_TREES_PATH) or not os.path.exists(FULL_GRAPH_PATH):
+        logging.info("No previous index found, running a full process instead")
+        return process_codebase(root_directory, workers=workers)
+
+    init_tree_sitter_languages()
+    current, added, changed, removed = diff_manifest(previous["files"], iter_source_files(root_directory))
+    logging.info(f"Incremental update: {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+    if not (added or changed or removed):
+        save_manifest(MANIFEST_PATH, root_directory, current)
+        return "Index is already up to date."
+
+    global embeddings_db, embedding_pipeline
+    embedding_client.reset_stats()
+    embedding_cache.reset_stats()
+    file_trees = load_file_trees()
+    stale = set(changed) | set(removed)
+    for file_path in stale:
+        file_trees.pop(file_path, None)
+    embeddings_db = {k: v for k, v in load_embeddings_db().items() if k.split('|path:')[-1] not in stale}
+
+    parsed_trees = {}
+    readme_contents = {}
+    reparse = added + changed
+    embedding_pipeline = open_embedding_pipeline(embeddings_db)
+    pool = create_parse_pool(workers if len(reparse) > 1 else 1)
+    try:
+        parsed_files = pool.imap(parse_source_file, reparse, chunksize=PARSE_CHUNK_SIZE) if pool else map(parse_source_file, reparse)
+        for file_path, parsed in zip(reparse, parsed_files):
+            # the manifest entries of re-parsed files describe the bytes that were actually indexed
+            record_parsed_file(file_path, parsed, {}, parsed_trees, {}, {}, [], manifest=current)
+            if parsed is not None and parsed[0] is not None and is_readme(file_path):
+                readme_contents[file_path] = parsed[1]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        embedding_pipeline.close()
+        embedding_pipeline = None
+    file_trees.update({k: v.to_dict() for k, v in parsed_trees.items()})
+    embedding_client.log_report()
+
     save_file_trees(file_trees)
     save_embeddings_db(embeddings_db)
-    return "Codebase processing complete. Embeddings have been saved."
+    if any(is_readme(file_path) for file_path in reparse + removed):
+        save_readme_info(collect_readme_info(file_trees, readme_contents))
+
+    json_data, affected_users = patch_full_graph(loaded_graph(FULL_GRAPH_PATH), file_trees, added, changed, removed)
+    write_graph_json(FULL_GRAPH_PATH, json_data['nodes'], json_data['links'], indent=JSON_INDENT)
+    reload_dependency_graph(json_data)
+    generate_individual_user_jsons(json_data, users=affected_users, workers=workers)
+    generate_root_level_json(json_data)
+
+    build_ann_index(reuse_centroids=True)
+    save_manifest(MANIFEST_PATH, root_directory, current)
+    print_embedding_cache_stats()
+    return "Incremental update complete. Embeddings have been saved."
 
 
 ########################################################################################################################
@@ -383,48 +565,86 @@ def process_codebase(root_directory):
 #################################### CODE FOR QUERYING YOUR EMBEDDINGS DATABASE ########################################
 ########################################################################################################################
 
-def process_repository(repo_path, modules, file_trees, file_sizes, package_names, readme_info_list):
+def process_repository(repo_path, modules, file_trees, file_sizes, package_names, readme_info_list, pool=None, manifest=None):
+    file_paths = []
     for root, dirs, files in os.walk(repo_path):
         if should_skip_path(root):
             continue
 
         for file in files:
-            file_path = os.path.join(root, file)
-            process_file(file_path, modules, file_trees, file_sizes, package_names, readme_info_list)
+            file_paths.append(os.path.join(root, file))
+
+    if pool is None:
+        for file_path in file_paths:
+            process_file(file_path, modules, file_trees, file_sizes, package_names, readme_info_list, manifest=manifest)
+        return
+
+    # workers parse ahead while this process embeds; imap keeps the sequential order
+    # so every output file comes out exactly as in a single-process run
+    parsed_files = pool.imap(parse_source_file, file_paths, chunksize=PARSE_CHUNK_SIZE)
+    for file_path, parsed in zip(file_paths, parsed_files):
+        record_parsed_file(file_path, parsed, modules, file_trees, file_sizes, package_names, readme_info_list, manifest=manifest)
 
 
-def process_file(file_path, modules, file_trees, file_sizes, package_names, readme_info_list):
+def process_file(file_path, modules, file_trees, file_sizes, package_names, readme_info_list, manifest=None):
+    record_parsed_file(file_path, parse_source_file(file_path), modules, file_trees, file_sizes, package_names, readme_info_list, manifest=manifest)
+
+
+def parse_source_file(file_path):
+    # (node_tree, file_content, size in bytes, manifest entry) or None for unsupported files; node_tree
+    # is None for binary files, which still get a manifest entry. Runs in pool workers.
     _, file_extension = os.path.splitext(file_path)
 
     for lang, (language_obj, extensions) in extension_to_language.items():
         if file_extension in extensions:
+            raw, manifest_entry = read_source(file_path)
             try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    file_content = f.read()
+                code, file_content = decode_source(raw)
+            except UnicodeDecodeError:
+                logging.warning(f"Skipping binary file: {file_path}")
+                return None, None, len(raw), manifest_entry
 
-                node_tree = process_code_string(file_content, language_obj, file_path)
-                file_trees[file_path] = node_tree
-                package_names[file_path] = "/".join(os.path.relpath(file_path, start=os.path.dirname(file_path)).split(os.sep)[:-1])
-                file_sizes[file_path] = len(file_content.encode("utf-8")).__float__()
+            node_tree = process_code_bytes(code, language_obj, file_path)
+            return node_tree, file_content, len(code), manifest_entry
+    return None
 
-                manage_embeddings(node_tree, file_path, embeddings_db)
 
-                repo_name = os.path.basename(os.path.dirname(file_path))
-                if repo_name not in modules:
-                    modules[repo_name] = {}
-                modules[repo_name][file_path] = file_content
+def record_parsed_file(file_path, parsed, modules, file_trees, file_sizes, package_names, readme_info_list, manifest=None):
+    if parsed is None:
+        return
+    node_tree, file_content, file_size, manifest_entry = parsed
+    if manifest is not None:
+        manifest[file_path] = manifest_entry
+    if node_tree is None:
+        return
 
-                if "README" in file_path.upper():
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        content = file.read()
-                        readme_info_list.append({"id": os.path.basename(os.path.dirname(file_path)), "content": content})
-            except UnicodeDecodeError:
-                logging.warning(f"Skipping binary file: {file_path}")
-                continue
+    file_trees[file_path] = node_tree
+    package_names[file_path] = "/".join(os.path.relpath(file_path, start=os.path.dirname(file_path)).split(os.sep)[:-1])
+    file_sizes[file_path] = float(file_size)
+
+    manage_embeddings(node_tree, file_path, embedding_pipeline)
+
+    # sizes only: holding on to every file's text until the run ends was the largest memory cost of indexing
+    repo_name = os.path.basename(os.path.dirname(file_path))
+    if repo_name not in modules:
+        modules[repo_name] = {}
+    modules[repo_name][file_path] = file_size
+
+    if is_readme(file_path):
+        readme_info_list.append(readme_info(file_path, file_content))
+
+
+def create_parse_pool(workers):
+    # None means parse in-process; spawn so workers never inherit locks from the embedding threads
+    if not workers or workers <= 1:
+        return None
+    return multiprocessing.get_context("spawn").Pool(workers, initializer=init_tree_sitter_languages)
 
 
 def build_dynamic_graph(query_results, file_trees):
     G = nx.DiGraph()
+    element_index = element_index_for(file_trees)
+    imported_elements_of = {}
 
     for key, similarity, node_tree in query_results:
         # Extract the code element type and name from the key
@@ -440,7 +660,9 @@ def build_dynamic_graph(query_results, file_trees):
             imports = []
 
         for import_stmt in imports:
-            imported_elements = find_imported_elements(import_stmt, file_trees)
+            imported_elements = imported_elements_of.get(import_stmt)
+            if imported_elements is None:
+                imported_elements = imported_elements_of[import_stmt] = element_index.find_imported_elements(import_stmt)
             for imported_element in imported_elements:
                 G.add_edge(node_id, imported_element)
 
@@ -539,6 +761,8 @@ def format_top_repos(top_repos, top_k):
     return sorted(formatted_repos, key=lambda x: x["similarity"], reverse=True)[:top_k]
 
 embeddings_db = {}
+# set while init_tree_sitter or update_codebase runs, see manage_embeddings
+embedding_pipeline = None
 
 def process_full_graph(full_graph_path, file_paths=None):
     with open(full_graph_path, 'r') as file:
@@ -548,50 +772,72 @@ def process_full_graph(full_graph_path, file_paths=None):
         parsed_data = {k: v for k, v in parsed_data.items() if k in file_paths}
         logging.info(f"Filtered parsed_data: {parsed_data}")
 
-    links = set()
-    dependencies = {}
+    links = compute_file_links(parsed_data)
+
+    nodes = []
+    for file_path in parsed_data.keys():
+        node = build_graph_node(file_path)
+        nodes.append(node)
+        logging.info(f"Added node: {node}")
 
+    # sorted so full_graph.json comes out the same whatever order the set iterates in
+    unique_links = [{"source": source, "target": target} for source, target in sorted(links)]
+    logging.info(f"Unique links: {unique_links}")
+    return {"nodes": nodes, "links": unique_links}
+
+def compute_file_links(parsed_data):
+    # one pass to index every file's symbols, then each file's links are hash lookups
+    symbol_index = FileSymbolIndex(parsed_data)
+    links = set()
     for file_path, node_tree in parsed_data.items():
         if not isinstance(node_tree, dict):
             continue
 
-        node_imports = extract_imports(node_tree)
-        property_dependencies = extract_property_dependencies(node_tree)
-        file_dependencies = []
-
-        current_file_base = os.path.splitext(os.path.basename(file_path))[0]
-        logging.info(f"Processing file: {file_path}")
+        logging.debug(f"Processing file: {file_path}")
+        file_dependencies = find_file_dependencies(file_path, node_tree, symbol_index)
+        links.update((file_path, other_file_path) for other_file_path in file_dependencies)
+        logging.debug(f"Dependencies for {file_path}: {file_dependencies}")
+    return links
+
+def find_file_dependencies(file_path, node_tree, symbol_index):
+    return sorted(symbol_index.resolve(
+        file_path,
+        extract_imports(node_tree),
+        extract_property_dependencies(node_tree),
+        [func.get('name', '') for func in node_tree.get('functions', [])],
+        node_tree.get('class_names', []),
+        raw_imports=node_tree.get('imports', []),
+    ))
+
+def build_graph_node(file_path):
+    return {
+        "id": file_path,
+        "user": extract_component_name(file_path),
+        "description": "",
+        "fileSize": os.path.getsize(file_path),
+    }
 
-        for other_file_path, other_node_tree in parsed_data.items():
-            if file_path == other_file_path or not isinstance(other_node_tree, dict):
-                continue
+def patch_full_graph(json_data, file_trees, added, changed, removed):
+    # Links are cheap to recompute with the symbol index (and a qualified import can
+    # gain or lose its target when that file changes), so relink everything and only
+    # patch the nodes of the files that changed.
+    reparsed = set(added) | set(changed)
+    stale = reparsed | set(removed)
+    old_users = {node['id']: node['user'] for node in json_data['nodes']}
+    old_links = {(link['source'], link['target']) for link in json_data['links']}
 
-            other_file_base = os.path.splitext(os.path.basename(other_file_path))[0]
+    links = compute_file_links(file_trees)
 
-            if any(imp.endswith(other_file_base) for imp in node_imports) or \
-               any(prop == other_file_base for prop in property_dependencies) or \
-               any(other_file_base in func.get('name', '') for func in node_tree.get('functions', [])) or \
-               any(other_file_base in class_name for class_name in node_tree.get('class_names', [])):
-                file_dependencies.append(other_file_path)
-                links.add((file_path, other_file_path))
+    nodes = [node for node in json_data['nodes'] if node['id'] not in stale]
+    nodes.extend(build_graph_node(file_path) for file_path in file_trees if file_path in reparsed)
+    new_users = {node['id']: node['user'] for node in nodes}
 
-        dependencies[file_path] = list(set(file_dependencies))
-        logging.info(f"Dependencies for {file_path}: {file_dependencies}")
+    # components whose per-repo json needs rewriting: touched files plus both ends of any changed link
+    touched = stale.union(*(link for link in links.symmetric_difference(old_links)))
+    affected_users = {new_users.get(file_path, old_users.get(file_path)) for file_path in touched}
 
-    nodes = []
-    for file_path in parsed_data.keys():
-        node = {
-            "id": file_path,
-            "user": extract_component_name(file_path),
-            "description": "",
-            "fileSize": os.path.getsize(file_path),
-        }
-        nodes.append(node)
-        logging.info(f"Added node: {node}")
-
-    unique_links = [{"source": source, "target": target} for source, target in links]
-    logging.info(f"Unique links: {unique_links}")
-    return {"nodes": nodes, "links": unique_links}
+    patched = {"nodes": nodes, "links": [{"source": source, "target": target} for source, target in sorted(links)]}
+    return patched, affected_users
 
 def extract_imports(node_tree):
     imports = []
@@ -612,10 +858,31 @@ def extract_property_dependencies(node_tree):
     return properties
 
 
+_dependency_graph = None
+_dependency_graph_lock = threading.Lock()
+
+def get_dependency_graph():
+    # built on first use: read full_graph.json, or derive it from file_trees.json if it was never written
+    global _dependency_graph
+    with _dependency_graph_lock:
+        if _dependency_graph is None:
+            if os.path.exists(FULL_GRAPH_PATH):
+                _dependency_graph = DependencyGraph.load(FULL_GRAPH_PATH)
+            elif os.path.exists(FILE_TREES_PATH):
+                _dependency_graph = DependencyGraph(process_full_graph(FILE_TREES_PATH))
+            else:
+                _dependency_graph = DependencyGraph({})
+        return _dependency_graph
+
+def reload_dependency_graph(graph_data=None):
+    # call whenever the index is rebuilt or patched; without graph_data the graph is read again on next use
+    global _dependency_graph
+    with _dependency_graph_lock:
+        _dependency_graph = DependencyGraph(graph_data) if graph_data is not None else None
+
 def extended_retrieval(parsed_data, initial_files, top_k):
-    # Compute dependency graph for initial_files
-    dependency_graph = process_full_graph('./frontend/public/api/tree-node-data/file_trees.json', initial_files)
-    dependencies = {node['id'] for node in dependency_graph['nodes']}
+    # Direct dependencies of initial_files, straight from the in-memory graph
+    dependencies = get_dependency_graph().dependencies(initial_files)
 
     # Add dependencies to initial_files
     extended_files = set(initial_files).union(dependencies)
@@ -624,7 +891,7 @@ def extended_retrieval(parsed_data, initial_files, top_k):
     sorted_extended_files = sorted(extended_files)
     return sorted_extended_files[:top_k * 2]
 
-def generate_individual_user_jsons(json_data):
+def generate_individual_user_jsons(json_data, users=None, workers=1):
     nodes = json_data['nodes']
     links = json_data['links']
 
@@ -643,43 +910,85 @@ def generate_individual_user_jsons(json_data):
     assets_dir = script_location / 'frontend/public/api/graph-data/files'
     assets_dir.mkdir(parents=True, exist_ok=True)
 
+    # users limits the rewrite to those components (incremental updates), None rewrites all of them
+    if users is not None:
+        for user in users:
+            if user not in user_nodes_dict:
+                (assets_dir / f'{user}.json').unlink(missing_ok=True)
+
+    wanted = [user for user in user_nodes_dict if users is None or user in users]
+    user_of = {node['id']: node['user'] for node in nodes}
+
+    # a component's file is complete after the last link touching it, so it is written right there
+    last_link = {user: -1 for user in wanted}
+    for i, link in enumerate(links):
+        for user in {user_of.get(link['source']), user_of.get(link['target'])}:
+            if user in last_link:
+                last_link[user] = i
+    done_at = {}
+    for user, i in last_link.items():
+        done_at.setdefault(i, []).append(user)
+
+    executor = ThreadPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+    pending = []
+    user_links = {user: [] for user in wanted}
     file_json = {}
-    for user, user_nodes in user_nodes_dict.items():
-        user_links = [
-            link for link in links
-            if link['source'] in [node['id'] for node in user_nodes]
-            or link['target'] in [node['id'] for node in user_nodes]
-        ]
+
+    def write_user(user):
+        nonlocal file_json
         file_json = {
-            'nodes': user_nodes,
-            'links': user_links
+            'nodes': user_nodes_dict[user],
+            'links': user_links.pop(user)
         }
-        file_path = assets_dir / f'{user}.json'
-        with open(file_path, 'w') as outfile:
-            json.dump(file_json, outfile, indent=4, sort_keys=True)
+        if executor is None:
+            write_graph_json(assets_dir / f'{user}.json', file_json['nodes'], file_json['links'], indent=JSON_INDENT)
+        else:
+            pending.append(executor.submit(write_graph_json, assets_dir / f'{user}.json', file_json['nodes'], file_json['links'], indent=JSON_INDENT))
+
+    try:
+        for user in done_at.pop(-1, []):
+            write_user(user)
+        for i, link in enumerate(links):
+            for user in {user_of.get(link['source']), user_of.get(link['target'])}:
+                if user in user_links:
+                    user_links[user].append(link)
+            for user in done_at.pop(i, []):
+                write_user(user)
+        for future in pending:
+            future.result()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
 
     return file_json
 
 def generate_root_level_json(json_data):
-    users = {node['user'] for node in json_data['nodes']}
-    new_nodes = [
-        {
-            'id': user,
-            'description': user,
-            'fileSize': sum(node['fileSize'] for node in json_data['nodes'] if node['user'] == user),
-            'fileCount': sum(1 for node in json_data['nodes'] if node['user'] == user)
-        }
-        for user in users
-    ]
-
-    links = set()
+    # one pass over the nodes for an id -> component map and the per-component totals,
+    # one pass over the links for the cross-component edges and how many file links each stands for
+    user_of = {}
+    totals = {}
+    for node in json_data['nodes']:
+        user = node['user']
+        user_of[node['id']] = user
+        total = totals.get(user)
+        if total is None:
+            total = totals[user] = {'id': user, 'description': user, 'fileSize': 0, 'fileCount': 0}
+        total['fileSize'] += node['fileSize']
+        total['fileCount'] += 1
+
+    link_weights = {}
     for link in json_data['links']:
-        source_user = next(node['user'] for node in json_data['nodes'] if node['id'] == link['source'])
-        target_user = next(node['user'] for node in json_data['nodes'] if node['id'] == link['target'])
-        if source_user != target_user:
-            links.add((source_user, target_user))
+        # files outside any component have user None, their links still count
+        if link['source'] not in user_of or link['target'] not in user_of:
+            continue
+        source_user = user_of[link['source']]
+        target_user = user_of[link['target']]
+        if source_user == target_user:
+            continue
+        link_weights[(source_user, target_user)] = link_weights.get((source_user, target_user), 0) + 1
 
-    new_links = [{'source': link[0], 'target': link[1]} for link in links]
+    new_nodes = list(totals.values())
+    new_links = [{'source': source, 'target': target, 'weight': weight} for (source, target), weight in link_weights.items()]
     repo_json = {
         'nodes': new_nodes,
         'links': new_links
@@ -689,9 +998,7 @@ def generate_root_level_json(json_data):
     assets_dir = script_location / 'frontend/public/api/graph-data'
     assets_dir.mkdir(parents=True, exist_ok=True)
 
-    file_path = assets_dir / 'repos_graph.json'
-    with open(file_path, 'w') as outfile:
-        json.dump(repo_json, outfile, indent=4, sort_keys=True)
+    write_graph_json(assets_dir / 'repos_graph.json', new_nodes, new_links, indent=JSON_INDENT)
 
     return repo_json
 
@@ -706,12 +1013,13 @@ def calculate_link_counts(nodes, links):
 
 
 
-def interactive_query_mode(file_trees_path):
+def interactive_query_mode(file_trees_path, summary_workers=None):
     file_trees = load_file_trees()
     embeddings_db = load_embeddings_db()
-    full_graph = loaded_graph("./frontend/public/api/graph-data/full_graph.json")
+    full_graph = loaded_graph(FULL_GRAPH_PATH)
     repos_graph = loaded_graph("./frontend/public/api/graph-data/repos_graph.json")
-    rag_system = RaggedyRag(embeddings_db, file_trees, full_graph, repos_graph)
+    rag_system = RaggedyRag(embeddings_db, file_trees, full_graph, repos_graph, embedding_client=embedding_client, summary_workers=summary_workers,
+                            query_embedding_cache=query_embedding_cache)
 
     print("Improved RAG system initialized. Ready for queries.")
     print("Enter your queries (type 'exit' to quit):")
@@ -721,10 +1029,12 @@ def interactive_query_mode(file_trees_path):
         if query.lower() == 'exit':
             break
 
-        response, relevant_snippets = rag_system.query(query)
+        response_tokens, relevant_snippets = rag_system.query_stream(query)
 
         print("\nRAG System Response:")
-        print(response)
+        for token in response_tokens:
+            print(token, end="", flush=True)
+        print()
 
         print("\nRelevant code snippets:")
         for i, (file_path, score) in enumerate(relevant_snippets, 1):
@@ -754,16 +1064,15 @@ def process_requirements(csv_file_path):
     requirements_db = {}
     try:
         with open(csv_file_path, mode='r', encoding='utf-8') as csvfile:
-            csvreader = csv.DictReader(csvfile)
-            for row in csvreader:
-                requirement_id = row["Project ID"]
-                description = row["Description"]
-                embedding = generate_embeddings(description, model=REQUIREMENT_EMBEDDING_MODEL)
-                if embedding is not None:
-                    requirements_db[requirement_id] = {
-                        "embedding": embedding.tolist(),
-                        "data": row
-                    }
+            rows = list(csv.DictReader(csvfile))
+        embeddings = generate_embeddings_batch([row["Description"] for row in rows], model=REQUIREMENT_EMBEDDING_MODEL)
+        for row, embedding in zip(rows, embeddings):
+            requirement_id = row["Project ID"]
+            if embedding is not None:
+                requirements_db[requirement_id] = {
+                    "embedding": embedding.tolist(),
+                    "data": row
+                }
     except Exception as e:
         logging.error(f"Error processing requirements: {str(e)}")
 
@@ -788,31 +1097,55 @@ def load_requirements_db():
 # Main function to process codebase and requirements
 def main():
     parser = argparse.ArgumentParser(description="Code Embedding Processor and Query System")
-    parser.add_argument("mode", choices=["process", "query", "process_requirements"],
-                        help="Mode of operation: 'process' to analyze codebase, 'query' for interactive querying, 'process_requirements' to process only requirements")
-    parser.add_argument("--root_dir", help="Root directory of the codebase (required for 'process' mode)")
+    parser.add_argument("mode", choices=["process", "update", "query", "process_requirements", "convert_embeddings", "ann_check"],
+                        help="Mode of operation: 'process' to analyze codebase, 'update' to re-index only added/changed/deleted files, 'query' for interactive querying, 'process_requirements' to process only requirements, 'convert_embeddings' to migrate a JSON codebase_embeddings.db to the binary store, 'ann_check' to report ANN recall@k for a range of nprobe values")
+    parser.add_argument("--root_dir", help="Root directory of the codebase (required for 'process' and 'update' modes)")
     parser.add_argument("--requirements_csv", help="Path to requirements CSV file (required for 'process_requirements' mode, optional for 'process' mode)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes parsing files in 'process' and 'update' modes (default 1)")
+    parser.add_argument("--embedding_workers", type=int, help="Number of concurrent requests sent to the embedding server")
+    parser.add_argument("--embedding_batch_size", type=int, help="Number of prompts sent per embedding request when the server supports batching")
+    parser.add_argument("--summary_workers", type=int, help="Number of concurrent per-file summary requests sent to the LLM in 'query' mode")
+    parser.add_argument("--pretty_json", action="store_true", help="Write the tree and graph json files indented (for debugging), compact otherwise")
+    parser.add_argument("--ann", action="store_true", help="Build the approximate nearest-neighbour (IVF) index in 'process' and 'update' modes and search through it in 'query' mode; exact search otherwise")
+    parser.add_argument("--nprobe", type=int, help="IVF cells scanned per query with --ann (default 16), higher gives better recall and slower queries")
 
     args = parser.parse_args()
+    global JSON_INDENT
+    JSON_INDENT = 4 if args.pretty_json else None
+    embedding_client.configure(max_workers=args.embedding_workers, batch_size=args.embedding_batch_size)
+    configure_ann(args.ann, nprobe=args.nprobe)
 
     if args.mode == "process":
         if not args.root_dir:
             print("Error: --root_dir is required for 'process' mode")
             sys.exit(1)
-        process_codebase(args.root_dir)
+        process_codebase(args.root_dir, workers=args.workers)
         if args.requirements_csv:
             process_requirements(args.requirements_csv)
+    elif args.mode == "update":
+        if not args.root_dir:
+            print("Error: --root_dir is required for 'update' mode")
+            sys.exit(1)
+        update_codebase(args.root_dir, workers=args.workers)
     elif args.mode == "process_requirements":
         if not args.requirements_csv:
             print("Error: --requirements_csv is required for 'process_requirements' mode")
             sys.exit(1)
         process_requirements(args.requirements_csv)
+    elif args.mode == "convert_embeddings":
+        if not os.path.exists(CODEBASE_DB_PATH):
+            print(f"Error: No JSON embeddings db found at {CODEBASE_DB_PATH}")
+            sys.exit(1)
+        store = convert_embeddings_db()
+        print(f"Converted {len(store)} embeddings to the binary vector store.")
+    elif args.mode == "ann_check":
+        check_ann_recall()
     elif args.mode == "query":
-        file_trees_path = "./frontend/public/api/tree-node-data/file_trees.json"
+        file_trees_path = FILE_TREES_PATH
         if not os.path.exists(file_trees_path):
             print("Error: No file trees found. Please run in 'process' mode first.")
             sys.exit(1)
-        interactive_query_mode(file_trees_path)
+        interactive_query_mode(file_trees_path, summary_workers=args.summary_workers)
 
 if __name__ == "__main__":
     main()
@@ -1,19 +1,30 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import networkx as nx
 import numpy as np
-from scipy.spatial.distance import cosine
+import json
+import argparse
 import logging
 from tqdm import tqdm
 import time
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
 # Import your custom modules
 from app import (
     process_codebase, load_file_trees, load_embeddings_db, load_requirements_db,
-    extended_retrieval, query_embeddings, build_dynamic_graph, process_full_graph, get_snippet
+    extended_retrieval, query_embeddings, build_dynamic_graph, process_full_graph, get_snippet,
+    get_dependency_graph, reload_dependency_graph, REQUIREMENTS_DB_PATH,
+    FULL_GRAPH_PATH, embedding_client, query_embedding_cache
+)
+from rag import CODEBASE_STORE_PATH, RaggedyRag, loaded_graph
+from utils.embeddings.vector_store import matrix_path, keys_path
+from utils.search.vector_search import configure_ann, drop_search_index, search_index_for
+from utils.search.query_cache import QueryCache, normalize_query
+from utils.search.similarity_matrix import (
+    QUERY_BLOCK_ROWS, blocked_top_k, file_signature, load_cached_matrix, save_cached_matrix
 )
 
 app = Flask(__name__)
@@ -23,10 +34,64 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SIMILARITY_MATRIX_CACHE_PATH = "./assets/similarity_matrix.json"
+REPOS_GRAPH_PATH = "./frontend/public/api/graph-data/repos_graph.json"
+# /query responses, keyed by (query, top_k, index version) and dropped whenever the index is reloaded
+QUERY_RESULT_CACHE_SIZE = 256
+QUERY_RESULT_TTL = 600
+
+similarity_matrix_lock = threading.Lock()
+rag_system_lock = threading.Lock()
+rag_system = None
+query_result_cache = QueryCache(QUERY_RESULT_CACHE_SIZE, ttl=QUERY_RESULT_TTL)
+index_version = 0
+code_embeddings_db = None
+requirements_db = None
+
+def reload_index():
+    # (re)load everything derived from the index; runs at startup and whenever the index changes
+    global file_trees, code_embeddings_db, requirements_db
+    global embeddings_signature, similarity_matrix_cache, rag_system, index_version
+    # offset-indexed and read on demand, only the entries a request touches get parsed
+    file_trees = load_file_trees(lazy=True)
+    # the vector search indexes scan the whole matrix, they are built on the first request that
+    # searches and the previous ones are dropped so the old matrices can be released
+    drop_search_index(code_embeddings_db)
+    drop_search_index(requirements_db)
+    code_embeddings_db = load_embeddings_db()
+    requirements_db = load_requirements_db()
+
+    # file-to-file dependencies are read again on the next /query or /generate_dependency_graph
+    reload_dependency_graph()
+
+    # The similarity matrix is cached against the on-disk state of both embedding dbs loaded above
+    with similarity_matrix_lock:
+        embeddings_signature = file_signature(matrix_path(CODEBASE_STORE_PATH), keys_path(CODEBASE_STORE_PATH), REQUIREMENTS_DB_PATH)
+        similarity_matrix_cache = None
+
+    # rebuilt from the new index on the next /rag
+    with rag_system_lock:
+        rag_system = None
+
+    index_version += 1
+    query_result_cache.clear()
+
+def get_rag_system():
+    global rag_system
+    with rag_system_lock:
+        if rag_system is None:
+            rag_system = RaggedyRag(code_embeddings_db, file_trees, loaded_graph(FULL_GRAPH_PATH), loaded_graph(REPOS_GRAPH_PATH),
+                                    embedding_client=embedding_client, query_embedding_cache=query_embedding_cache)
+        return rag_system
+
+def sse_event(data, event=None):
+    # one server-sent event, data json encoded on a single line
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
 # Load data
-file_trees = load_file_trees()
-code_embeddings_db = load_embeddings_db()
-requirements_db = load_requirements_db()
+reload_index()
 
 # Create a ThreadPoolExecutor
 executor = ThreadPoolExecutor(max_workers=4)
@@ -54,57 +119,100 @@ async def process():
 
         loop = asyncio.get_event_loop()
         await loop.run_in_executor(executor, partial(process_codebase, root_dir))
+        await loop.run_in_executor(executor, reload_index)
         return jsonify({"message": "Codebase processing complete. Embeddings have been saved."}), 200
     except Exception as e:
         logger.error(f"Error in /process: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/reload', methods=['POST'])
+async def reload():
+    # for indexes rebuilt outside this process, e.g. `python app.py update`
+    try:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(executor, reload_index)
+        return jsonify({"message": "Index reloaded."}), 200
+    except Exception as e:
+        logger.error(f"Error in /reload: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/query', methods=['POST'])
 async def query():
     try:
         logger.info("Received request for /query")
         data = request.get_json()
-        query_text = data.get('query')
+        query_text = normalize_query(data.get('query') or '')
         top_k = data.get('top_k', 5)
         if not query_text:
             return jsonify({"error": "query is required"}), 400
 
-        initial_files = sorted(file_trees.keys())
-        logger.info(f"initial_retrieval from /query: {initial_files}")
-
+        # repeated queries are answered from the cache, identical ones in flight are computed once
         loop = asyncio.get_event_loop()
-        extended_files = await loop.run_in_executor(executor, partial(extended_retrieval, file_trees, initial_files, top_k))
-        combined_file_trees = {k: file_trees[k] for k in extended_files}
-        logger.info(f"extended_retrieval from /query: {combined_file_trees}")
-
-        code_results, requirement_results = await loop.run_in_executor(
+        enhanced_results = await loop.run_in_executor(
             executor,
-            partial(query_embeddings, query_text, code_embeddings_db, requirements_db, combined_file_trees, top_k)
+            partial(query_result_cache.get_or_compute, (query_text, top_k, index_version), partial(compute_query_results, query_text, top_k))
         )
-
-        enhanced_results = []
-
-        for result in code_results + requirement_results:
-            key, similarity, node_tree, source = result
-            logger.info(f"Processing result: {key}, source: {source}")
-            snippets = []
-
-            if source == 'code':
-                path = key.split('|path:')[-1]
-                node_tree = file_trees.get(path, None)
-                logger.info(f"Node tree for {key}: {node_tree}")
-                snippets = await loop.run_in_executor(executor, partial(get_snippets_for_file, node_tree))
-            elif source == 'requirement':
-                snippets = await loop.run_in_executor(executor, partial(get_snippets_for_requirement, node_tree))
-
-            enhanced_results.append((key, similarity, snippets, source))
-
-        logger.info(f"enhanced_results from /query: {enhanced_results}")
-        return jsonify({"results": enhanced_results}), 200
+        logger.info(query_result_cache.report())
+        return jsonify({"results": enhanced_results or []}), 200
     except Exception as e:
         logger.error(f"Error in /query: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def compute_query_results(query_text, top_k):
+    initial_files = sorted(file_trees.keys())
+    logger.info(f"initial_retrieval from /query: {initial_files}")
+
+    extended_files = extended_retrieval(file_trees, initial_files, top_k)
+    combined_file_trees = {k: file_trees[k] for k in extended_files}
+    logger.info(f"extended_retrieval from /query: {combined_file_trees}")
+
+    code_results, requirement_results = query_embeddings(query_text, code_embeddings_db, requirements_db, combined_file_trees, top_k)
+
+    enhanced_results = []
+
+    for result in code_results + requirement_results:
+        key, similarity, node_tree, source = result
+        logger.info(f"Processing result: {key}, source: {source}")
+        snippets = []
+
+        if source == 'code':
+            path = key.split('|path:')[-1]
+            node_tree = file_trees.get(path, None)
+            logger.info(f"Node tree for {key}: {node_tree}")
+            snippets = get_snippets_for_file(node_tree)
+        elif source == 'requirement':
+            snippets = get_snippets_for_requirement(node_tree)
+
+        enhanced_results.append((key, similarity, snippets, source))
+
+    logger.info(f"enhanced_results from /query: {enhanced_results}")
+    # nothing found (or the embedding request failed) is not worth caching
+    return enhanced_results or None
+
+@app.route('/rag', methods=['POST'])
+def rag():
+    # Streams the answer as server-sent events: a "snippets" event with the files the answer is
+    # based on, then one message per chunk of the answer as the LLM produces it, then "done".
+    data = request.get_json()
+    query_text = data.get('query')
+    top_k = data.get('top_k', 5)
+    max_depth = data.get('max_depth', 2)
+    if not query_text:
+        return jsonify({"error": "query is required"}), 400
+
+    def events():
+        try:
+            response_tokens, relevant_snippets = get_rag_system().query_stream(query_text, top_k, max_depth)
+            yield sse_event(relevant_snippets, event="snippets")
+            for token in response_tokens:
+                yield sse_event({"token": token})
+            yield sse_event({}, event="done")
+        except Exception as e:
+            logger.error(f"Error in /rag: {str(e)}")
+            yield sse_event({"error": str(e)}, event="error")
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/generate_dependency_graph', methods=['POST'])
 async def generate_dependency_graph():
     try:
@@ -118,11 +226,7 @@ async def generate_dependency_graph():
         if not file_paths:
             file_paths = [result[0].split('|path:')[-1] for result in top_k_results]
 
-        loop = asyncio.get_event_loop()
-        graph_data = await loop.run_in_executor(
-            executor,
-            partial(process_full_graph, './project_multi_scale_embed/assets/file_trees.json')
-        )
+        graph_data = get_dependency_graph().subgraph(file_paths)
         logger.info(f"graph_data: {graph_data}")
         return jsonify({"graph": graph_data}), 200
     except Exception as e:
@@ -130,44 +234,47 @@ async def generate_dependency_graph():
         return jsonify({"error": str(e)}), 500
 
 def compute_similarity_matrix():
+    global similarity_matrix_cache
     logger.info("Starting similarity matrix computation")
     start_time = time.time()
 
-    similarity_matrix = []
-
-    total_requirements = len(requirements_db)
-    logger.info(f"Processing {total_requirements} requirements")
-
-    for i, (req_id, req_data) in enumerate(tqdm(requirements_db.items(), total=total_requirements, desc="Processing requirements")):
-        req_description = req_data['data']['Description']
-        req_embedding = np.array(req_data['embedding'])
-
-        code_similarities = []
-        for j, (code_key, code_embedding) in enumerate(code_embeddings_db.items()):
-            similarity = 1 - cosine(req_embedding, code_embedding)
-            code_similarities.append((code_key, similarity))
-
-            if j % 1000 == 0:
-                logger.info(f"Requirement {i+1}/{total_requirements}: Processed {j+1}/{len(code_embeddings_db)} code snippets")
-
-        top_10_code = sorted(code_similarities, key=lambda x: x[1], reverse=True)[:10]
-
-        row = {
-            'requirement_id': req_id,
-            'requirement_description': req_description,
-            'code_snippets': [
-                {
-                    'code_key': code_key,
-                    'similarity': float(similarity),
-                    'snippet': get_snippet(file_trees.get(code_key.split('|path:')[-1]), code_key.split('|')[0])
+    with similarity_matrix_lock:
+        if similarity_matrix_cache is None:
+            similarity_matrix_cache = load_cached_matrix(SIMILARITY_MATRIX_CACHE_PATH, embeddings_signature)
+        if similarity_matrix_cache is not None:
+            logger.info("Similarity matrix served from cache")
+            return similarity_matrix_cache
+
+        similarity_matrix = []
+        code_index = search_index_for(code_embeddings_db)
+        requirement_ids = [req_id for req_id, req_data in requirements_db.items() if req_data.get('embedding')]
+        total_requirements = len(requirement_ids)
+        logger.info(f"Processing {total_requirements} requirements against {len(code_index)} code embeddings")
+
+        requirement_matrix = np.array([requirements_db[req_id]['embedding'] for req_id in requirement_ids], dtype=np.float32)
+        batches = blocked_top_k(requirement_matrix, code_index, top_k=10) if total_requirements else []
+        for query_start, top_rows, top_scores in tqdm(batches, total=-(-total_requirements // QUERY_BLOCK_ROWS), desc="Processing requirements"):
+            for offset, (code_rows, code_scores) in enumerate(zip(top_rows, top_scores)):
+                req_id = requirement_ids[query_start + offset]
+                top_10_code = [(code_index.keys[code_row], score) for code_row, score in zip(code_rows, code_scores)]
+                row = {
+                    'requirement_id': req_id,
+                    'requirement_description': requirements_db[req_id]['data']['Description'],
+                    'code_snippets': [
+                        {
+                            'code_key': code_key,
+                            'similarity': float(similarity),
+                            'snippet': get_snippet(file_trees.get(code_key.split('|path:')[-1]), code_key.split('|')[0])
+                        }
+                        for code_key, similarity in top_10_code
+                    ]
                 }
-                for code_key, similarity in top_10_code
-            ]
-        }
-        similarity_matrix.append(row)
+                similarity_matrix.append(row)
+
+            logger.info(f"Processed {min(query_start + QUERY_BLOCK_ROWS, total_requirements)}/{total_requirements} requirements")
 
-        if (i + 1) % 10 == 0:
-            logger.info(f"Processed {i+1}/{total_requirements} requirements")
+        save_cached_matrix(SIMILARITY_MATRIX_CACHE_PATH, embeddings_signature, similarity_matrix)
+        similarity_matrix_cache = similarity_matrix
 
     end_time = time.time()
     logger.info(f"Similarity matrix computation completed in {end_time - start_time:.2f} seconds")
@@ -211,4 +318,9 @@ def get_snippets_for_requirement(requirement_data):
     return [{"name": "Description", "snippet": snippet}]
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Code Embedding Flask Server")
+    parser.add_argument("--ann", action="store_true", help="Search through the approximate nearest-neighbour (IVF) index built by 'app.py process --ann'; exact search otherwise")
+    parser.add_argument("--nprobe", type=int, help="IVF cells scanned per query with --ann (default 16), higher gives better recall and slower queries")
+    args = parser.parse_args()
+    configure_ann(args.ann, nprobe=args.nprobe)
     app.run(debug=True)
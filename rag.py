@@ -1,21 +1,59 @@
 import numpy as np
-from scipy.spatial.distance import cosine
 import networkx as nx
 import requests
 import json
 import os
 import time
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from utils.embeddings.embedding_client import EmbeddingClient
+from utils.embeddings.vector_store import VectorStore, save_vector_store, convert_json_db
+from utils.search.vector_search import search_index_for
+from utils.search.query_cache import QueryCache, normalize_query
+from utils.indexing.file_tree_store import FileTreeStore
+from utils.llm.summary_cache import SummaryCache
+from utils.llm.context_packer import pack_context
+from utils.indexing.embedding_keys import function_name_of_key, path_of_key
 
 EMBEDDING_API_URL = "http://localhost:11434/api/embeddings"
 CODE_EMBEDDING_MODEL = "unclemusclez/jina-embeddings-v2-base-code:q4"
 CODEBASE_DB_PATH = "./assets/codebase_embeddings.db"
+# binary store: codebase_embeddings.npy (float matrix) + codebase_embeddings.keys.json
+CODEBASE_STORE_PATH = "./assets/codebase_embeddings"
+EMBEDDINGS_DTYPE = np.float32
+FILE_TREES_PATH = "./frontend/public/api/tree-node-data/file_trees.json"
 LLM_API_URL = "http://localhost:11434/api/generate"
 LLM_MODEL = "qwen2:7b"
+SUMMARY_PROMPT = "Summarize the following code:\n{snippet}"
+# (model, prompt template, content) -> summary, shared by every query and restart
+SUMMARY_CACHE_PATH = "./assets/summary_cache.db"
+# concurrent per-file summary requests sent to the LLM server
+SUMMARY_WORKERS = 4
+# token budgets (gpt-4 encoding) of the code in one summary prompt and of the summaries combined
+# for the final one; ollama's default 2048 token context leaves room for the instructions and the answer
+SNIPPET_TOKEN_BUDGET = 1024
+CONTEXT_TOKEN_BUDGET = 1536
+# (model, query text) -> embedding for recently asked queries, in memory
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+QUERY_EMBEDDING_TTL = 3600
+# a file reached in n hops from a retrieved one scores similarity * EXPANSION_DECAY ** n
+EXPANSION_DECAY = 0.5
+# files summarized per query, the best scored ones after expansion
+MAX_EXPANDED_FILES = 20
 
 
 class RaggedyRag:
-    def __init__(self, embeddings_db, file_trees, full_graph_data, repos_graph_data):
+    def __init__(self, embeddings_db, file_trees, full_graph_data, repos_graph_data, embedding_client=None, summary_cache=None, summary_workers=None,
+                 snippet_tokens=SNIPPET_TOKEN_BUDGET, context_tokens=CONTEXT_TOKEN_BUDGET, max_expanded_files=MAX_EXPANDED_FILES,
+                 query_embedding_cache=None):
         self.embeddings_db = embeddings_db
+        self.embedding_client = embedding_client or EmbeddingClient(EMBEDDING_API_URL, model=CODE_EMBEDDING_MODEL)
+        self.summary_cache = summary_cache or SummaryCache(SUMMARY_CACHE_PATH)
+        self.summary_workers = summary_workers or SUMMARY_WORKERS
+        self.snippet_tokens = snippet_tokens
+        self.context_tokens = context_tokens
+        self.max_expanded_files = max_expanded_files
+        self.query_embedding_cache = query_embedding_cache or QueryCache(QUERY_EMBEDDING_CACHE_SIZE, ttl=QUERY_EMBEDDING_TTL)
         self.file_trees = file_trees
         self.full_graph = self._create_graph_from_data(full_graph_data)
         self.repos_graph = self._create_graph_from_data(repos_graph_data)
@@ -29,6 +67,12 @@ class RaggedyRag:
         return G
 
     def query(self, user_query, top_k=5, max_depth=2):
+        response_tokens, relevant_snippets = self.query_stream(user_query, top_k, max_depth)
+        return "".join(response_tokens), relevant_snippets
+
+    def query_stream(self, user_query, top_k=5, max_depth=2):
+        # Retrieval and summaries run here; the answer comes back as a generator of text chunks
+        # that yields as soon as the LLM produces them.
         query_embedding = self.generate_embedding(user_query)
         initial_results = self._embedding_based_retrieval(query_embedding, top_k)
 
@@ -36,60 +80,99 @@ class RaggedyRag:
         for key, similarity in initial_results:
             print(f"Similarity: {similarity:.4f} - {key}")
 
-        expanded_results = self._traverse_and_collect(initial_results, max_depth)
-        summaries = self._generate_summaries(expanded_results)
-        final_summary = self._generate_final_summary(summaries)
-        response = self._generate_response(user_query, final_summary)
-
-        # Create a list of tuples (file_path, score) for the expanded results
-        relevant_snippets = [(file_path, 1.0) for file_path in expanded_results]  # Using 1.0 as a placeholder score
+        # (file_path, score) best first, seeds keep their similarity and neighbours a decayed one
+        relevant_snippets = self._traverse_and_collect(initial_results, max_depth)
+        expanded_results = [file_path for file_path, _ in relevant_snippets]
+        summaries = self._generate_summaries(expanded_results, self._function_scores(initial_results))
+        final_summary = self._generate_final_summary(summaries, [score for _, score in relevant_snippets])
+        response_tokens = self._stream_llm(self._response_prompt(user_query, final_summary))
 
-        return response, relevant_snippets
+        return response_tokens, relevant_snippets
 
     def generate_embedding(self, text):
-        payload = json.dumps({"model": CODE_EMBEDDING_MODEL, "prompt": text})
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(EMBEDDING_API_URL, data=payload, headers=headers)
-        return np.array(response.json()['embedding'])
+        text = normalize_query(text)
+        return self.query_embedding_cache.get_or_compute(
+            (CODE_EMBEDDING_MODEL, text), lambda: self.embedding_client.embed(text, model=CODE_EMBEDDING_MODEL)
+        )
 
     def _embedding_based_retrieval(self, query_embedding, top_k):
-        results = []
-        for key, embedding in self.embeddings_db.items():
-            similarity = 1 - cosine(query_embedding, embedding)
-            results.append((key, similarity))
-        return sorted(results, key=lambda x: x[1], reverse=True)[:top_k]
+        return search_index_for(self.embeddings_db).search(query_embedding, top_k)
+
+    def _function_scores(self, initial_results):
+        # best similarity per (file, function) among the retrieved keys
+        function_scores = {}
+        for key, similarity in initial_results:
+            function_name = function_name_of_key(key)
+            if function_name is not None:
+                scores = function_scores.setdefault(path_of_key(key), {})
+                scores[function_name] = max(similarity, scores.get(function_name, similarity))
+        return function_scores
 
     def _traverse_and_collect(self, initial_results, max_depth):
-        expanded_results = set()
-        for i, (key, similarity) in enumerate(initial_results, 1):
-            file_path = key.split('|path:')[-1]
-            print(f"Traversing from initial result {i}/{len(initial_results)}: {file_path}")
-            self._dfs(file_path, max_depth, expanded_results)
-        return list(expanded_results)
-
-    def _dfs(self, node, depth, visited):
-        if depth == 0 or node in visited:
-            return
-        visited.add(node)
-        print(f"  Visited: {node}")
-        for neighbor in self.full_graph.neighbors(node):
-            self._dfs(neighbor, depth - 1, visited)
-
-    def _generate_summaries(self, file_paths):
-        summaries = []
-        for i, file_path in enumerate(file_paths, 1):
-            print(f"Generating summary for file {i}/{len(file_paths)}: {file_path}")
-            snippet = self._get_snippet(file_path)
-            summary = self._call_llm(f"Summarize the following code:\n{snippet}")
-            summaries.append(f"Summary for {file_path}:\n{summary}")
-        return summaries
-
-    def _generate_final_summary(self, summaries):
-        combined_summaries = "\n".join(summaries)
+        # Best-first expansion over full_graph from the retrieved files, at most max_depth - 1 hops out.
+        # Scores only decay along a path, so files come off the heap best first and the walk stops
+        # after max_expanded_files without looking at the rest of the neighbourhood. A file is expanded
+        # again only when it turns up closer to a seed than before, which keeps the hop bound exact.
+        best_score = {}
+        for key, similarity in initial_results:
+            file_path = path_of_key(key)
+            best_score[file_path] = max(similarity, best_score.get(file_path, similarity))
+        fewest_hops = {file_path: 0 for file_path in best_score}
+        heap = [(-score, 0, file_path) for file_path, score in best_score.items()]
+        heapq.heapify(heap)
+
+        expanded = []
+        collected = set()
+        expanded_at = {}
+        while heap and len(expanded) < self.max_expanded_files:
+            negative_score, hops, file_path = heapq.heappop(heap)
+            if file_path not in collected:
+                collected.add(file_path)
+                expanded.append((file_path, -negative_score))
+            if hops + 1 >= max_depth or hops >= expanded_at.get(file_path, max_depth) or file_path not in self.full_graph:
+                continue
+            expanded_at[file_path] = hops
+            score = -negative_score * EXPANSION_DECAY
+            for neighbor in self.full_graph.successors(file_path):
+                if score > best_score.get(neighbor, float("-inf")) or hops + 1 < fewest_hops.get(neighbor, max_depth):
+                    best_score[neighbor] = max(score, best_score.get(neighbor, score))
+                    fewest_hops[neighbor] = min(hops + 1, fewest_hops.get(neighbor, hops + 1))
+                    heapq.heappush(heap, (-score, hops + 1, neighbor))
+
+        print(f"Expanded {len(initial_results)} initial results to {len(expanded)} files")
+        return expanded
+
+    def _generate_summaries(self, file_paths, function_scores=None):
+        # the final summary and the response depend on these, so only the per-file calls run concurrently
+        if not file_paths:
+            return []
+        total = len(file_paths)
+        with ThreadPoolExecutor(max_workers=min(self.summary_workers, total)) as pool:
+            futures = [
+                pool.submit(self._summarize_file, file_path, i, total, (function_scores or {}).get(file_path))
+                for i, file_path in enumerate(file_paths, 1)
+            ]
+            return [future.result() for future in futures]
+
+    def _summarize_file(self, file_path, i, total, scores=None):
+        snippet = self._get_snippet(file_path, scores)
+        summary = self.summary_cache.get(LLM_MODEL, SUMMARY_PROMPT, snippet)
+        if summary is None:
+            print(f"Generating summary for file {i}/{total}: {file_path}")
+            summary = self._call_llm(SUMMARY_PROMPT.format(snippet=snippet))
+            self.summary_cache.put(LLM_MODEL, SUMMARY_PROMPT, snippet, summary)
+        else:
+            print(f"Using cached summary for file {i}/{total}: {file_path}")
+        return f"Summary for {file_path}:\n{summary}"
+
+    def _generate_final_summary(self, summaries, scores=None):
+        # most relevant files first, as many as fit the context budget
+        scores = scores or [0.0] * len(summaries)
+        combined_summaries = pack_context(list(zip(scores, summaries)), self.context_tokens, separator="\n")
         return self._call_llm(f"Provide a concise summary of the following summaries:\n{combined_summaries}")
 
-    def _generate_response(self, query, final_summary):
-        return self._call_llm(f"""Based on the following summary of relevant code, answer the user's question:
+    def _response_prompt(self, query, final_summary):
+        return f"""Based on the following summary of relevant code, answer the user's question:
 
 Summary:
 {final_summary}
@@ -97,15 +180,19 @@ Summary:
 User Question: {query}
 
 Response:
-""")
+"""
 
-    def _get_snippet(self, file_path):
+    def _get_snippet(self, file_path, scores=None):
+        # Functions the query hit go in first, the rest in file order while the token budget lasts.
+        # They are joined in file order, so a file that fits completely always gives the same snippet.
         file_info = self.file_trees.get(file_path, {})
         if file_info:
-            content = ""
-            for func in file_info.get('functions', []):
-                content += f"Function: {func['name']}\n{func['body']}\n\n"
-            return content[:1000]  # Return first 1000 characters
+            scores = scores or {}
+            candidates = [
+                (scores.get(func['name'], 0.0), f"Function: {func['name']}\n{func['body']}")
+                for func in file_info.get('functions', [])
+            ]
+            return pack_context(candidates, self.snippet_tokens, keep_order=True)
         return "Snippet not available"
 
     def _call_llm(self, prompt):
@@ -118,31 +205,59 @@ Response:
         response = requests.post(LLM_API_URL, data=payload, headers=headers)
         return response.json()['response']
 
-
-
-
+    def _stream_llm(self, prompt):
+        # the server answers with one json object per line, each holding the next piece of the response
+        payload = json.dumps({
+            "model": LLM_MODEL,
+            "prompt": prompt,
+            "stream": True
+        })
+        headers = {'Content-Type': 'application/json'}
+        with requests.post(LLM_API_URL, data=payload, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('response'):
+                    yield chunk['response']
+                if chunk.get('done'):
+                    break
 
 
 def loaded_graph(path):
     with open(path, 'r') as file:
         return json.load(file)
 
-def load_file_trees():
-    file_path = "./frontend/public/api/tree-node-data/file_trees.json"
-    if os.path.exists(file_path):
-        with open(file_path, "r") as file:
-            return json.load(file)
-    return {}
+_file_tree_store = None
+
+def load_file_trees(lazy=False):
+    # lazy: a shared FileTreeStore that reads entries on demand, reopened once the json is rewritten.
+    # Otherwise a plain dict that callers are free to modify.
+    global _file_tree_store
+    if not os.path.exists(FILE_TREES_PATH):
+        return {}
+    if lazy:
+        if _file_tree_store is None or _file_tree_store.is_stale():
+            _file_tree_store = FileTreeStore.open(FILE_TREES_PATH)
+        return _file_tree_store
+    with open(FILE_TREES_PATH, "r") as file:
+        return json.load(file)
 
 
 
 def load_embeddings_db():
+    if VectorStore.exists(CODEBASE_STORE_PATH):
+        return VectorStore.open(CODEBASE_STORE_PATH)
     if os.path.exists(CODEBASE_DB_PATH):
-        with open(CODEBASE_DB_PATH, "r") as file:
-            return {k: np.array(v) for k, v in json.load(file).items()}
+        # legacy JSON db from an older run, migrate it once
+        return convert_embeddings_db()
     return {}
 
 
 def save_embeddings_db(embeddings_db):
-    with open(CODEBASE_DB_PATH, "w") as file:
-        json.dump({k: v.tolist() for k, v in embeddings_db.items()}, file)
+    save_vector_store(CODEBASE_STORE_PATH, embeddings_db, dtype=EMBEDDINGS_DTYPE)
+
+
+def convert_embeddings_db(json_db_path=CODEBASE_DB_PATH, store_path=CODEBASE_STORE_PATH):
+    return convert_json_db(json_db_path, store_path, dtype=EMBEDDINGS_DTYPE)
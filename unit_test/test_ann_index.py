@@ -0,0 +1,103 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.embeddings.vector_store import VectorStore, save_vector_store
+from utils.search.ann_index import IVFIndex, ann_index_path, load_ann_index, recall_at_k
+from utils.search.vector_search import VectorSearch, configure_ann, search_index_for
+
+
+def clustered_embeddings(n_clusters=20, per_cluster=50, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    embeddings = {}
+    for cluster in range(n_clusters):
+        for i in range(per_cluster):
+            vector = centers[cluster] + 0.1 * rng.standard_normal(dim).astype(np.float32)
+            embeddings[f"function:f{cluster}_{i}|path:/code/repo/src/file{cluster}.py"] = vector
+    return embeddings
+
+
+def build_index(embeddings, **kwargs):
+    index = VectorSearch(embeddings)
+    index.ann = IVFIndex.build(index.matrix, index.inv_norms, index.keys, **kwargs)
+    return index
+
+
+def test_every_row_is_filed_once():
+    index = build_index(clustered_embeddings(), n_lists=16)
+    assert index.ann.n_lists == 16
+    assert index.ann.offsets[-1] == len(index)
+    assert sorted(index.ann.row_ids.tolist()) == list(range(len(index)))
+
+
+def test_probing_all_lists_is_exact():
+    index = build_index(clustered_embeddings(), n_lists=16)
+    query = np.random.default_rng(1).standard_normal(32).astype(np.float32)
+    exact = index.search(query, top_k=10, exact=True)
+    assert index.search(query, top_k=10, nprobe=index.ann.n_lists) == exact
+    assert recall_at_k(index, k=10, nprobe=index.ann.n_lists) == 1.0
+
+
+def test_recall_on_clustered_data():
+    index = build_index(clustered_embeddings(), n_lists=20, nprobe=4)
+    assert recall_at_k(index, k=10) >= 0.9
+
+
+def test_tight_filters_fall_back_to_exact_scan():
+    index = build_index(clustered_embeddings(), n_lists=20, nprobe=1)
+    query = np.asarray(index.matrix[0])
+    # file7 lives in another cell than row 0, the single probed cell has no matches for it
+    file7_rows = index.candidate_rows(paths=["/code/repo/src/file7.py"])
+    assert len(np.intersect1d(index.ann.probe_rows(query), file7_rows)) == 0
+    results = index.search(query, top_k=5, paths=["/code/repo/src/file7.py"])
+    assert results == index.search(query, top_k=5, paths=["/code/repo/src/file7.py"], exact=True)
+    assert len(results) == 5
+
+
+def test_reusing_centroids_refiles_rows():
+    embeddings = clustered_embeddings()
+    index = build_index(embeddings, n_lists=16)
+    embeddings.update(clustered_embeddings(n_clusters=5, per_cluster=10, seed=1))
+    grown = VectorSearch(embeddings)
+    ann = IVFIndex.build(grown.matrix, grown.inv_norms, grown.keys, centroids=index.ann.centroids)
+    np.testing.assert_array_equal(ann.centroids, index.ann.centroids)
+    assert ann.n_rows == len(grown)
+
+
+def test_save_load_and_stale_detection(tmp_path):
+    embeddings = clustered_embeddings(n_clusters=5, per_cluster=20)
+    prefix = str(tmp_path / "store")
+    save_vector_store(prefix, embeddings)
+    store = VectorStore.open(prefix)
+    index = build_index(store, n_lists=8)
+    index.ann.save(ann_index_path(prefix))
+
+    loaded = load_ann_index(prefix, store.key_list, nprobe=3)
+    assert loaded.nprobe == 3
+    np.testing.assert_array_equal(loaded.row_ids, index.ann.row_ids)
+
+    # an index built for other keys is ignored instead of returning wrong rows
+    assert load_ann_index(prefix, store.key_list[:-1]) is None
+    assert load_ann_index(prefix, list(reversed(store.key_list))) is None
+    assert load_ann_index(str(tmp_path / "missing"), store.key_list) is None
+
+
+def test_ann_is_only_used_when_configured(tmp_path):
+    embeddings = clustered_embeddings(n_clusters=5, per_cluster=20)
+    prefix = str(tmp_path / "store")
+    save_vector_store(prefix, embeddings)
+    store = VectorStore.open(prefix)
+    build_index(store, n_lists=8).ann.save(ann_index_path(prefix))
+
+    try:
+        configure_ann(False)
+        assert search_index_for(store).ann is None
+        configure_ann(True, nprobe=2)
+        ann = search_index_for(store).ann
+        assert ann is not None and ann.nprobe == 2
+    finally:
+        configure_ann(False)
@@ -0,0 +1,77 @@
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.tokens import token_counter
+from utils.llm.context_packer import pack_context, select_within_budget
+
+
+class WordEncoder:
+    # every word and every whitespace run is one token; the real encoding is downloaded on first use
+    def encode(self, text):
+        return re.findall(r"\S+|\s+", text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(token_counter, "_encoder", WordEncoder())
+    token_counter.clear_cache()
+    yield
+    token_counter.clear_cache()
+
+
+def words(n, word="w"):
+    return " ".join([word] * n)  # 2n - 1 tokens
+
+
+def test_best_scores_first_within_budget():
+    candidates = [(0.2, words(3, "low")), (0.9, words(3, "best")), (0.5, words(3, "mid"))]
+    # 5 tokens per piece, 1 per separator
+    assert pack_context(candidates, 11) == "\n\n".join([words(3, "best"), words(3, "mid")])
+    assert pack_context(candidates, 17) == "\n\n".join([words(3, "best"), words(3, "mid"), words(3, "low")])
+
+
+def test_packed_text_never_exceeds_budget():
+    candidates = [(score / 10, words(score % 5 + 1, f"p{score}")) for score in range(10)]
+    for budget in range(1, 60):
+        packed = pack_context(candidates, budget)
+        assert token_counter.count_tokens(packed) <= budget
+
+
+def test_pieces_that_dont_fit_are_skipped_for_smaller_ones():
+    candidates = [(0.9, words(3, "first")), (0.8, words(10, "big")), (0.1, words(2, "small"))]
+    assert pack_context(candidates, 9) == "\n\n".join([words(3, "first"), words(2, "small")])
+
+
+def test_keep_order_joins_in_candidate_order():
+    candidates = [(0.1, "one"), (0.5, "two"), (0.9, "three"), (0.7, words(20))]
+    assert pack_context(candidates, 3) == "three\n\ntwo"
+    assert pack_context(candidates, 3, keep_order=True) == "two\n\nthree"
+
+
+def test_duplicates_and_blank_pieces_go_in_once():
+    candidates = [(0.9, "same text"), (0.8, "  same text\n"), (0.7, "   "), (0.6, ""), (0.5, "other")]
+    assert select_within_budget(candidates, 100) == [(0, "same text"), (4, "other")]
+
+
+def test_only_an_oversized_first_piece_is_truncated():
+    candidates = [(0.9, words(10, "huge")), (0.5, "small")]
+    assert pack_context(candidates, 5) == words(3, "huge")
+    assert select_within_budget(candidates, 5, truncate_first=False) == [(1, "small")]
+    assert pack_context([], 5) == ""
+
+
+def test_token_counts_are_cached_without_the_texts(monkeypatch):
+    monkeypatch.setattr(token_counter, "TOKEN_COUNT_CACHE_SIZE", 2)
+    texts = [words(n, f"body{n}") for n in (3, 4, 5)]
+    assert [token_counter.count_tokens(text) for text in texts] == [5, 7, 9]
+    assert len(token_counter._counts) == 2
+    assert all(not isinstance(key, str) and len(key) == 16 for key in token_counter._counts)
+    assert token_counter.count_tokens(texts[2]) == 9
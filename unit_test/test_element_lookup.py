@@ -0,0 +1,88 @@
+import os
+import sys
+import random
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.grammar.ast_traversers import FunctionNode, TreeNode
+from utils.indexing import element_lookup as element_lookup_module
+from utils.indexing.element_lookup import ElementLookup, element_lookup
+
+NAMES = ["get", "getUser", "user", "User", "userId", "set", "com", "ex", "Foo", "FooBar", "a"]
+
+
+def random_tree(seed):
+    rng = random.Random(seed)
+    return {
+        "functions": [{"name": rng.choice(NAMES), "body": f"body {i}"} for i in range(rng.randrange(8))],
+        "class_names": [rng.choice(NAMES) for _ in range(rng.randrange(4))],
+        "property_declarations": [f"val {rng.choice(NAMES)}: {rng.choice(NAMES)}" for _ in range(rng.randrange(6))],
+        "imports": [f"import com.ex.{rng.choice(NAMES)}" for _ in range(rng.randrange(6))],
+    }
+
+
+# the linear scans get_snippet used before ElementLookup
+def scan_function_body(tree, name):
+    for func in tree["functions"]:
+        if func["name"] == name:
+            return func["body"]
+    return None
+
+
+def scan_property(tree, name):
+    for prop in tree["property_declarations"]:
+        if name in prop:
+            return prop
+    return None
+
+
+def scan_import(tree, name):
+    for imp in tree["imports"]:
+        if name in imp or any(part in imp for part in name.split('.')):
+            return imp
+    return None
+
+
+def test_lookups_match_linear_scans():
+    queries = NAMES + ["com.ex.Foo", "ex.Missing", "missing", "val user", ": Foo"]
+    for seed in range(200):
+        tree = random_tree(seed)
+        lookup = ElementLookup(tree)
+        for name in queries:
+            assert lookup.function_body(name) == scan_function_body(tree, name), (seed, name)
+            assert lookup.has_class(name) == (name in tree["class_names"]), (seed, name)
+            assert lookup.property_containing(name) == scan_property(tree, name), (seed, name)
+            assert lookup.import_matching(name) == scan_import(tree, name), (seed, name)
+
+
+def test_tree_nodes_and_dicts_agree():
+    node_tree = TreeNode(
+        file_path="/code/repo/src/Users.kt",
+        class_names=["UserRepo"],
+        imports=["import com.ex.User"],
+        property_declarations=["val userId: Int"],
+        functions=[
+            FunctionNode("getUser", [], "User", "return users[id]"),
+            FunctionNode("getUser", [], "User", "shadowed overload"),
+        ],
+    )
+    from_node = ElementLookup(node_tree)
+    from_dict = ElementLookup(node_tree.to_dict())
+    for lookup in (from_node, from_dict):
+        assert lookup.function_body("getUser") == "return users[id]"
+        assert lookup.function_body("missing") is None
+        assert lookup.has_class("UserRepo") and not lookup.has_class("User")
+        assert lookup.property_containing("user") == "val userId: Int"
+        assert lookup.import_matching("User") == "import com.ex.User"
+
+
+def test_lookups_are_cached_per_tree():
+    trees = [random_tree(seed) for seed in range(5)]
+    first = element_lookup(trees[0], cache_size=3)
+    assert element_lookup(trees[0], cache_size=3) is first
+
+    for tree in trees[1:]:
+        element_lookup(tree, cache_size=3)
+    assert len(element_lookup_module._lookups) <= 3
+    # evicted, built again on the next request
+    assert element_lookup(trees[0], cache_size=3) is not first
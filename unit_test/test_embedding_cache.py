@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.embeddings.embedding_cache import EmbeddingCache
+
+
+def vector(i):
+    return np.full(4, i, dtype=np.float32)
+
+
+def test_round_trip_per_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    cache.put_many("m", [("a", vector(1)), ("b", vector(2)), ("c", None)])
+    found = cache.get_many("m", ["a", "b", "c", "a"])
+    np.testing.assert_array_equal(found[0], vector(1))
+    np.testing.assert_array_equal(found[1], vector(2))
+    assert found[2] is None
+    np.testing.assert_array_equal(found[3], vector(1))
+    assert cache.get("other", "a") is None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_row_count_ignores_replacements(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = EmbeddingCache(path)
+    cache.put_many("m", [(f"t{i}", vector(i)) for i in range(10)])
+    cache.put_many("m", [(f"t{i}", vector(i + 1)) for i in range(5, 15)] + [("t14", vector(0))])
+    assert len(cache) == 15
+    np.testing.assert_array_equal(cache.get("m", "t14"), vector(0))
+    cache.close()
+    assert len(EmbeddingCache(path)) == 15
+
+
+def test_least_recently_used_rows_are_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=10)
+    for i in range(10):
+        cache.put("m", f"t{i}", vector(i))
+    cache._conn.execute("UPDATE embeddings SET last_used = 0")
+    cache.get("m", "t0")  # recently used again
+    cache.put("m", "t10", vector(10))
+
+    # down to 90% of max_entries, oldest first
+    assert len(cache) == 9
+    assert cache.evictions == 2
+    assert cache._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == 9
+    assert cache.get("m", "t0") is not None and cache.get("m", "t10") is not None
@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.embeddings.embedding_client import EmbeddingClient
+
+
+class EmbeddingServer(BaseHTTPRequestHandler):
+    # replies: path -> function of the request json returning (status, body bytes)
+    replies = {}
+    calls = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.calls.append(self.path)
+        reply = self.replies.get(self.path)
+        status, data = reply(body) if reply else (404, b"404 page not found")
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    EmbeddingServer.replies = {}
+    EmbeddingServer.calls = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), EmbeddingServer)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield EmbeddingServer, f"http://127.0.0.1:{httpd.server_address[1]}/api/embeddings"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def vectors(body):
+    return 200, json.dumps({"embeddings": [[float(len(text)), 1.0] for text in body["input"]]}).encode()
+
+
+def vector(body):
+    return 200, json.dumps({"embedding": [float(len(body["prompt"])), 1.0]}).encode()
+
+
+def test_batches_through_api_embed(server):
+    handler, url = server
+    handler.replies = {"/api/embed": vectors, "/api/embeddings": vector}
+    client = EmbeddingClient(url, model="m", batch_size=2, backoff=0)
+    embeddings = client.embed_many(["a", "bb", "ccc"])
+    assert [embedding[0] for embedding in embeddings] == [1.0, 2.0, 3.0]
+    # a batch of one goes through the single prompt endpoint
+    assert sorted(handler.calls) == ["/api/embed", "/api/embeddings"]
+
+
+def test_non_json_replies_fail_the_item_not_the_run(server):
+    handler, url = server
+    handler.replies = {
+        "/api/embed": lambda body: (200, b"<html>502 Bad Gateway</html>"),
+        "/api/embeddings": lambda body: (200, b'{"embedding": [1.0,') if body["prompt"] == "truncated" else vector(body),
+    }
+    client = EmbeddingClient(url, model="m", batch_size=4, backoff=0)
+    embeddings = client.embed_many(["ok", "truncated", "fine"])
+    assert embeddings[1] is None
+    assert embeddings[0][0] == 2.0 and embeddings[2][0] == 4.0
+    # a bad batch reply falls back to single prompts, batching stays on
+    assert client.supports_batch
+    assert client.report()["failures"] == 1
+
+
+def test_missing_batch_endpoint_turns_batching_off(server):
+    handler, url = server
+    handler.replies = {"/api/embeddings": vector}
+    client = EmbeddingClient(url, model="m", batch_size=4, backoff=0)
+    assert all(embedding is not None for embedding in client.embed_many(["a", "b"]))
+    assert not client.supports_batch
+
+
+def test_unknown_model_keeps_batching(server):
+    handler, url = server
+    error = json.dumps({"error": "model \"m\" not found, try pulling it first"}).encode()
+    handler.replies = {"/api/embed": lambda body: (404, error), "/api/embeddings": lambda body: (404, error)}
+    client = EmbeddingClient(url, model="m", batch_size=4, backoff=0)
+    assert client.embed_many(["a", "b", "c"]) == [None, None, None]
+    assert client.supports_batch
+    assert handler.calls == ["/api/embed"]
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.embeddings.embedding_pipeline import EmbeddingPipeline
+
+
+class RecordingEmbedder:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        # "fail" marks a prompt the server could not embed
+        return [None if text == "fail" else len(text) for text in texts]
+
+
+def file_prompts(n_files, per_file):
+    return [{f"function:f{i}_{j}|path:/code/repo/src/file{i}.py": f"prompt {i} {j}" for j in range(per_file)} for i in range(n_files)]
+
+
+def test_prompts_of_several_files_share_batches():
+    embedder = RecordingEmbedder()
+    target = {}
+    pipeline = EmbeddingPipeline(embedder, target, batch_size=8, max_workers=2)
+    files = file_prompts(n_files=10, per_file=3)
+    for prompts in files:
+        pipeline.add(prompts)
+    pipeline.close()
+
+    assert [len(batch) for batch in embedder.batches] == [8, 8, 8, 6]
+    expected_keys = [key for prompts in files for key in prompts]
+    # stored in the order the keys were added, whichever batch finished first
+    assert list(target) == expected_keys
+    assert all(target[key] == len(text) for prompts in files for key, text in prompts.items())
+
+
+def test_batches_run_concurrently_and_in_flight_work_is_bounded():
+    embedder = RecordingEmbedder(delay=0.02)
+    target = {}
+    pipeline = EmbeddingPipeline(embedder, target, batch_size=2, max_workers=4, max_pending=4)
+    for prompts in file_prompts(n_files=20, per_file=2):
+        pipeline.add(prompts)
+        assert len(pipeline._pending) <= 4
+    pipeline.close()
+
+    assert embedder.peak > 1
+    assert len(target) == 40
+
+
+def test_failed_embeddings_are_left_out():
+    target = {}
+    pipeline = EmbeddingPipeline(RecordingEmbedder(), target, batch_size=4, max_workers=1)
+    pipeline.add({"a": "ok", "b": "fail", "c": "fine"})
+    pipeline.close()
+    assert target == {"a": 2, "c": 4}
@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.indexing.file_tree_store import FileTreeStore, index_path, scan_index, write_file_trees
+
+
+def sample_trees():
+    return {
+        "/code/repo/src/Main.kt": {
+            "imports": ["import com.ex.Foo"],
+            "functions": [{"name": "main", "body": "fun main() {\n    println(\"héllo, \\\"wörld\\\"\")\n}"}],
+            "class_names": [],
+        },
+        "/code/repo/src/ünïcode path.py": {"imports": [], "functions": [], "class_names": ["Thing"]},
+        "/code/repo/src/empty.c": {},
+        "/code/repo/src/nested.go": {"functions": [{"name": "f", "body": "{ [ ] } , : \"\\n\""}], "package": None},
+    }
+
+
+@pytest.mark.parametrize("indent", [4, None])
+def test_written_json_matches_json_dump(tmp_path, indent):
+    path = str(tmp_path / "file_trees.json")
+    trees = sample_trees()
+    write_file_trees(path, trees, indent=indent)
+    with open(path, "r") as f:
+        assert f.read() == json.dumps(trees, indent=indent, separators=(",", ": ") if indent is not None else (",", ":"))
+
+
+@pytest.mark.parametrize("indent", [4, None])
+def test_offsets_round_trip(tmp_path, indent):
+    path = str(tmp_path / "file_trees.json")
+    trees = sample_trees()
+    write_file_trees(path, trees.items(), indent=indent)
+
+    with open(index_path(path), "r") as f:
+        index = json.load(f)
+    # the index written with the json and a fresh scan agree
+    assert scan_index(path) == (index["paths"], index["offsets"], index["lengths"])
+
+    store = FileTreeStore.open(path)
+    assert list(store) == list(trees)
+    for file_path, tree in trees.items():
+        assert store[file_path] == tree
+    assert dict(store.items()) == trees
+
+
+def test_empty_file_trees(tmp_path):
+    path = str(tmp_path / "file_trees.json")
+    write_file_trees(path, {}, indent=4)
+    with open(path, "r") as f:
+        assert json.load(f) == {}
+    assert len(FileTreeStore.open(path)) == 0
+
+
+def test_missing_or_stale_index_is_rebuilt(tmp_path):
+    path = str(tmp_path / "file_trees.json")
+    trees = sample_trees()
+    # written by something else, e.g. an older version of app.py: no index next to it
+    with open(path, "w") as f:
+        json.dump(trees, f, indent=2)
+    store = FileTreeStore.open(path)
+    assert os.path.exists(index_path(path))
+    assert dict(store.items()) == trees
+
+    trees["/code/repo/src/new.kt"] = {"class_names": ["New"]}
+    with open(path, "w") as f:
+        json.dump(trees, f)
+    assert store.is_stale()
+    reopened = FileTreeStore.open(path)
+    assert not reopened.is_stale()
+    assert reopened["/code/repo/src/new.kt"] == {"class_names": ["New"]}
+
+
+def test_lru_is_bounded(tmp_path):
+    path = str(tmp_path / "file_trees.json")
+    trees = {f"/code/repo/src/f{i}.py": {"class_names": [f"C{i}"]} for i in range(10)}
+    write_file_trees(path, trees)
+    store = FileTreeStore.open(path, cache_size=3)
+    for file_path in trees:
+        assert store[file_path] == trees[file_path]
+    store["/code/repo/src/f9.py"]
+    assert (store.hits, store.misses) == (1, 10)
+    assert len(store._cache) == 3
+
+    with pytest.raises(KeyError):
+        store["/code/repo/src/missing.py"]
+    assert "/code/repo/src/missing.py" not in store
@@ -0,0 +1,155 @@
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.search import query_cache as query_cache_module
+from utils.search.query_cache import QueryCache, normalize_query
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    # replaces the module's time, not time.monotonic itself, which threading relies on
+    monkeypatch.setattr(query_cache_module, "time", fake)
+    return fake
+
+
+def test_normalize_query():
+    assert normalize_query("  find  the\tparser \n") == "find the parser"
+
+
+def test_hits_and_lru_eviction():
+    cache = QueryCache(max_entries=2)
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return value
+
+    assert cache.get_or_compute("a", lambda: compute(1)) == 1
+    assert cache.get_or_compute("a", lambda: compute(2)) == 1
+    cache.get_or_compute("b", lambda: compute(3))
+    cache.get_or_compute("a", lambda: compute(4))  # a is now the most recently used
+    cache.get_or_compute("c", lambda: compute(5))  # evicts b
+    assert cache.get_or_compute("b", lambda: compute(6)) == 6
+    assert calls == [1, 3, 5, 6]
+    assert (cache.hits, cache.misses) == (2, 4)
+    assert len(cache) == 2
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = QueryCache(max_entries=10, ttl=60)
+    assert cache.get_or_compute("q", lambda: "first") == "first"
+    clock.now += 59
+    assert cache.get_or_compute("q", lambda: "second") == "first"
+    clock.now += 2
+    assert cache.get_or_compute("q", lambda: "second") == "second"
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_none_results_are_not_stored():
+    cache = QueryCache(max_entries=10)
+    assert cache.get_or_compute("q", lambda: None) is None
+    assert cache.get_or_compute("q", lambda: "ok") == "ok"
+    assert cache.misses == 2
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = QueryCache(max_entries=10)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        owner = pool.submit(cache.get_or_compute, "q", compute)
+        assert started.wait(5)
+        waiters = [pool.submit(cache.get_or_compute, "q", compute) for _ in range(7)]
+        while cache.coalesced < len(waiters):
+            time.sleep(0.001)
+        release.set()
+        results = [owner.result(5)] + [waiter.result(5) for waiter in waiters]
+
+    assert results == ["result"] * 8
+    assert len(calls) == 1
+    assert (cache.misses, cache.coalesced) == (1, 7)
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    cache = QueryCache(max_entries=10)
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("embedding server down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        owner = pool.submit(cache.get_or_compute, "q", compute)
+        assert started.wait(5)
+        waiter = pool.submit(cache.get_or_compute, "q", compute)
+        while cache.coalesced < 1:
+            time.sleep(0.001)
+        release.set()
+        for future in (owner, waiter):
+            with pytest.raises(RuntimeError):
+                future.result(5)
+
+    assert cache.get_or_compute("q", lambda: "recovered") == "recovered"
+
+
+def test_results_computed_across_a_clear_are_not_stored():
+    cache = QueryCache(max_entries=10)
+
+    def compute():
+        # the index is reloaded while this result is still being computed
+        cache.clear()
+        return "stale"
+
+    assert cache.get_or_compute("q", compute) == "stale"
+    assert len(cache) == 0
+    assert cache.get_or_compute("q", lambda: "fresh") == "fresh"
+
+
+def test_callers_after_a_clear_do_not_join_earlier_computations():
+    cache = QueryCache(max_entries=10)
+    started = threading.Event()
+    release = threading.Event()
+
+    def stale():
+        started.set()
+        release.wait(5)
+        return "stale"
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        old = pool.submit(cache.get_or_compute, "q", stale)
+        assert started.wait(5)
+        cache.clear()  # /reload while the old query is still embedding
+        assert cache.get_or_compute("q", lambda: "fresh") == "fresh"
+        release.set()
+        assert old.result(5) == "stale"
+
+    # the old computation neither overwrote the new entry nor dropped it from the cache
+    assert cache.get_or_compute("q", lambda: "again") == "fresh"
+    assert (cache.misses, cache.coalesced) == (2, 0)
+    assert cache._in_flight == {}
@@ -0,0 +1,59 @@
+import os
+import sys
+import random
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app
+
+
+def full_graph(n_files=120, seed=5):
+    rng = random.Random(seed)
+    # None is a file outside any component, extract_component_name found no "<component>/src/" in its path
+    users = ["alpha", "beta", "gamma", None]
+    nodes = [{"id": f"/code/f{i}.kt", "user": rng.choice(users), "description": "", "fileSize": rng.randrange(1, 5000)} for i in range(n_files)]
+    links = [{"source": rng.choice(nodes)["id"], "target": rng.choice(nodes)["id"]} for _ in range(400)]
+    return {"nodes": nodes, "links": links}
+
+
+def scan_root_level(json_data):
+    # the original per-component scans
+    users = {node['user'] for node in json_data['nodes']}
+    nodes = [
+        {
+            'id': user,
+            'description': user,
+            'fileSize': sum(node['fileSize'] for node in json_data['nodes'] if node['user'] == user),
+            'fileCount': sum(1 for node in json_data['nodes'] if node['user'] == user)
+        }
+        for user in users
+    ]
+    links = set()
+    for link in json_data['links']:
+        source_user = next(node['user'] for node in json_data['nodes'] if node['id'] == link['source'])
+        target_user = next(node['user'] for node in json_data['nodes'] if node['id'] == link['target'])
+        if source_user != target_user:
+            links.add((source_user, target_user))
+    return nodes, links
+
+
+def test_root_level_json_matches_scan(monkeypatch):
+    written = {}
+    monkeypatch.setattr(app, "write_graph_json", lambda path, nodes, links, indent=None: written.update(nodes=nodes, links=links))
+    json_data = full_graph()
+    repo_json = app.generate_root_level_json(json_data)
+
+    expected_nodes, expected_links = scan_root_level(json_data)
+    key = lambda node: str(node['id'])
+    assert sorted(repo_json['nodes'], key=key) == sorted(expected_nodes, key=key)
+    assert {(link['source'], link['target']) for link in repo_json['links']} == expected_links
+    assert any(None in pair for pair in expected_links)
+    assert written == repo_json
+
+    # weights count the file links behind each component link
+    for link in repo_json['links']:
+        assert link['weight'] == sum(
+            1 for file_link in json_data['links']
+            if (next(n['user'] for n in json_data['nodes'] if n['id'] == file_link['source']),
+                next(n['user'] for n in json_data['nodes'] if n['id'] == file_link['target'])) == (link['source'], link['target'])
+        )
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.search.similarity_matrix import blocked_top_k, file_signature, load_cached_matrix, save_cached_matrix
+from utils.search.vector_search import VectorSearch
+
+
+def code_index(n_rows=500, dim=24, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = {f"function:f{i}|path:/code/repo/src/file{i}.py": rng.standard_normal(dim).astype(np.float32) for i in range(n_rows)}
+    return VectorSearch(embeddings)
+
+
+def dense_top_k(queries, index, k):
+    matrix = np.asarray(index.matrix, dtype=np.float32)
+    normalized = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalized.T
+    rows = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return rows, np.take_along_axis(scores, rows, axis=1)
+
+
+def collect(batches):
+    rows, scores = [], []
+    expected_start = 0
+    for query_start, batch_rows, batch_scores in batches:
+        assert query_start == expected_start
+        expected_start += len(batch_rows)
+        rows.append(batch_rows)
+        scores.append(batch_scores)
+    return np.concatenate(rows), np.concatenate(scores)
+
+
+def test_matches_dense_argsort_across_blocks():
+    index = code_index()
+    queries = np.random.default_rng(1).standard_normal((70, 24)).astype(np.float32)
+    expected_rows, expected_scores = dense_top_k(queries, index, 10)
+
+    # blocks that don't divide either side evenly
+    rows, scores = collect(blocked_top_k(queries, index, top_k=10, query_block=16, code_block=37))
+    np.testing.assert_array_equal(rows, expected_rows)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-6)
+
+    rows, scores = collect(blocked_top_k(queries, index, top_k=10))
+    np.testing.assert_array_equal(rows, expected_rows)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-6)
+
+
+def test_top_k_larger_than_code_matrix():
+    index = code_index(n_rows=6)
+    queries = np.random.default_rng(2).standard_normal((3, 24)).astype(np.float32)
+    rows, scores = collect(blocked_top_k(queries, index, top_k=10, code_block=4))
+    expected_rows, expected_scores = dense_top_k(queries, index, 6)
+    assert rows.shape == (3, 6)
+    np.testing.assert_array_equal(rows, expected_rows)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-6)
+
+
+def test_cached_matrix_is_tied_to_the_signature(tmp_path):
+    db_path = tmp_path / "requirements.db"
+    db_path.write_text("{}")
+    cache_path = str(tmp_path / "cache" / "similarity_matrix.json")
+    signature = file_signature(str(db_path), str(tmp_path / "missing.npy"))
+    matrix = [{"requirement_id": "R1", "code_snippets": []}]
+
+    assert load_cached_matrix(cache_path, signature) is None
+    save_cached_matrix(cache_path, signature, matrix)
+    assert load_cached_matrix(cache_path, signature) == matrix
+
+    db_path.write_text('{"R1": {}}')
+    assert load_cached_matrix(cache_path, file_signature(str(db_path), str(tmp_path / "missing.npy"))) is None
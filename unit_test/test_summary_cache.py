@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.llm.summary_cache import SummaryCache
+
+
+def test_summaries_are_keyed_by_model_template_and_content(tmp_path):
+    path = str(tmp_path / "summaries.db")
+    cache = SummaryCache(path)
+    cache.put("m", "Summarize: {}", "def f(): pass", "defines f")
+    cache.put("m", "Summarize: {}", "def g(): pass", None)
+
+    assert cache.get("m", "Summarize: {}", "def f(): pass") == "defines f"
+    assert cache.get("other", "Summarize: {}", "def f(): pass") is None
+    assert cache.get("m", "Explain: {}", "def f(): pass") is None
+    assert cache.get("m", "Summarize: {}", "def g(): pass") is None
+    assert cache.report()["hits"] == 1
+    cache.close()
+
+    # persisted across restarts
+    assert SummaryCache(path).get("m", "Summarize: {}", "def f(): pass") == "defines f"
+
+
+def test_summary_cache_is_bounded(tmp_path):
+    cache = SummaryCache(str(tmp_path / "summaries.db"), max_entries=5)
+    for i in range(6):
+        cache.put("m", "t", f"content {i}", f"summary {i}")
+    assert len(cache) == 4
+    assert cache.evictions == 2
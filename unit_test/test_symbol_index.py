@@ -0,0 +1,113 @@
+import os
+import sys
+import random
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.graph.symbol_index import ElementSymbolIndex, FileSymbolIndex, file_base_name
+
+WORDS = ["Foo", "Bar", "Baz", "Eng", "Engine", "Helper", "Svc", "Service", "Data", "Repo", "a", "X"]
+
+
+def random_file_trees(n_files=400, seed=3):
+    rng = random.Random(seed)
+    file_trees = {}
+    for i in range(n_files):
+        base = rng.choice(WORDS) + rng.choice(["", "Impl", str(i % 40), "Repo"])
+        path = f"/r/c{i % 9}/src/pkg{i % 13}/{base}{'' if rng.random() < .5 else i}.{rng.choice(['kt', 'java', 'py'])}"
+        file_trees[path] = {
+            "imports": [f"import com.ex.{rng.choice(WORDS)}{rng.choice(['', ';', '.*'])}" for _ in range(rng.randrange(4))],
+            "functions": [{"name": rng.choice(WORDS).lower() + rng.choice(WORDS)} for _ in range(rng.randrange(4))],
+            "class_names": [rng.choice(WORDS) + rng.choice(WORDS) for _ in range(rng.randrange(3))],
+            "property_declarations": [f"@State var {rng.choice(WORDS)}" for _ in range(rng.randrange(2))],
+            "package": f"package com.ex{'' if rng.random() < .3 else i % 5}",
+        }
+    return file_trees
+
+
+def symbols(node_tree):
+    # (imports, property names, function names, class names) as the linker sees them
+    return (
+        [imp.rstrip(";") for imp in node_tree["imports"]],
+        [prop.split()[-1] for prop in node_tree["property_declarations"]],
+        [func["name"] for func in node_tree["functions"]],
+        node_tree["class_names"],
+    )
+
+
+def pairwise_links(file_trees):
+    # the original every-file-against-every-file scan
+    links = set()
+    for file_path, node_tree in file_trees.items():
+        imports, properties, function_names, class_names = symbols(node_tree)
+        for other_path in file_trees:
+            if other_path == file_path:
+                continue
+            base = file_base_name(other_path)
+            if (any(imp.endswith(base) for imp in imports) or any(prop == base for prop in properties)
+                    or any(base in name for name in function_names) or any(base in name for name in class_names)):
+                links.add((file_path, other_path))
+    return links
+
+
+def indexed_links(file_trees, raw_imports=False):
+    index = FileSymbolIndex(file_trees)
+    links = set()
+    for file_path, node_tree in file_trees.items():
+        dependencies = index.resolve(file_path, *symbols(node_tree), raw_imports=node_tree["imports"] if raw_imports else ())
+        links.update((file_path, other_path) for other_path in dependencies)
+    return links
+
+
+def test_basename_rules_match_pairwise_scan():
+    file_trees = random_file_trees()
+    assert indexed_links(file_trees) == pairwise_links(file_trees)
+
+
+def test_qualified_imports_only_add_links():
+    file_trees = random_file_trees()
+    index = FileSymbolIndex(file_trees)
+    links = indexed_links(file_trees, raw_imports=True)
+    baseline = pairwise_links(file_trees)
+    extra = links - baseline
+    assert baseline <= links
+    assert all(any(target in index.files_for_import(imp) for imp in file_trees[source]["imports"]) for source, target in extra)
+
+
+def test_files_for_import():
+    file_trees = {
+        "/r/a/src/Foo.kt": {"package": "package com.ex", "class_names": ["Foo"], "package_import_paths": {"com.ex.util.top": ""}},
+        "/r/a/src/Bar.kt": {"package": "package com.ex;", "class_names": ["Bar"]},
+        "/r/a/src/Other.kt": {"package": "package com.other", "class_names": ["Foo"]},
+    }
+    index = FileSymbolIndex(file_trees)
+    assert index.files_for_import("import com.ex.Foo") == {"/r/a/src/Foo.kt"}
+    assert index.files_for_import("import com.ex.Foo as F") == {"/r/a/src/Foo.kt"}
+    assert index.files_for_import("import static com.ex.Bar.method;") == {"/r/a/src/Bar.kt"}
+    assert index.files_for_import("import com.ex.*") == {"/r/a/src/Foo.kt", "/r/a/src/Bar.kt"}
+    assert index.files_for_import("import com.ex.util.top") == {"/r/a/src/Foo.kt"}
+    assert index.files_for_import("import com.missing.Foo") == set()
+
+
+def scan_imported_elements(file_trees, import_stmt):
+    # the original full scan behind find_imported_elements
+    found = []
+    for file_path, node_tree in file_trees.items():
+        for class_name in node_tree["class_names"]:
+            if import_stmt in class_name:
+                found.append(f"class:{class_name}|{file_path}")
+        for func in node_tree["functions"]:
+            if func["name"] == import_stmt:
+                found.append(f"function:{func['name']}|{file_path}")
+        for prop in node_tree["property_declarations"]:
+            if import_stmt in prop:
+                found.append(f"property:{prop}|{file_path}")
+    return found
+
+
+def test_element_index_matches_full_scan():
+    file_trees = random_file_trees(n_files=200)
+    index = ElementSymbolIndex(file_trees)
+    queries = WORDS + ["FooBar", "fooBar", "var", "@State var Foo", "ng", "zzz", "x"]
+    for query in queries:
+        assert index.find_imported_elements(query) == scan_imported_elements(file_trees, query), query
@@ -0,0 +1,107 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.embeddings.vector_store import VectorStore, save_vector_store
+from utils.search.vector_search import VectorSearch, drop_search_index, search_index_for
+
+REPOS = ["alpha", "beta", "gamma"]
+TYPES = ["function", "class", "import"]
+
+
+def make_embeddings(n_rows=300, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = {}
+    for i in range(n_rows):
+        repo = REPOS[i % len(REPOS)]
+        element_type = TYPES[i % len(TYPES)]
+        key = f"{element_type}:name{i}|path:/code/{repo}/src/file{i % 7}.py"
+        embeddings[key] = rng.standard_normal(dim).astype(np.float32)
+    return embeddings
+
+
+def brute_force(embeddings, query, top_k, keep=lambda key: True):
+    scored = []
+    for key, vector in embeddings.items():
+        if keep(key):
+            scored.append((key, float(np.dot(vector, query) / (np.linalg.norm(vector) * np.linalg.norm(query)))))
+    scored.sort(key=lambda item: -item[1])
+    return scored[:top_k]
+
+
+def assert_same_results(results, expected):
+    assert [key for key, _ in results] == [key for key, _ in expected]
+    np.testing.assert_allclose([score for _, score in results], [score for _, score in expected], rtol=1e-5, atol=1e-6)
+
+
+def test_search_matches_brute_force():
+    embeddings = make_embeddings()
+    index = VectorSearch(embeddings)
+    rng = np.random.default_rng(1)
+    for _ in range(10):
+        query = rng.standard_normal(16).astype(np.float32)
+        assert_same_results(index.search(query, top_k=10), brute_force(embeddings, query, 10))
+
+
+def test_filters_match_brute_force():
+    embeddings = make_embeddings()
+    index = VectorSearch(embeddings)
+    query = np.random.default_rng(2).standard_normal(16).astype(np.float32)
+
+    results = index.search(query, top_k=8, element_types=["class"])
+    assert_same_results(results, brute_force(embeddings, query, 8, lambda key: key.startswith("class:")))
+
+    results = index.search(query, top_k=8, repos=["beta"])
+    assert_same_results(results, brute_force(embeddings, query, 8, lambda key: "/beta/" in key))
+
+    results = index.search(query, top_k=8, path_prefix="/code/gamma/src/file3")
+    assert_same_results(results, brute_force(embeddings, query, 8, lambda key: key.endswith("/code/gamma/src/file3.py")))
+
+    results = index.search(query, top_k=8, element_types=["function", "import"], repos=["alpha", "gamma"])
+    assert_same_results(results, brute_force(
+        embeddings, query, 8,
+        lambda key: key.split(':')[0] in ("function", "import") and ("/alpha/" in key or "/gamma/" in key)
+    ))
+
+
+def test_filter_without_matches_returns_nothing():
+    index = VectorSearch(make_embeddings(n_rows=30))
+    assert index.search(np.ones(16, dtype=np.float32), top_k=5, repos=["missing"]) == []
+
+
+def test_zero_vectors_and_empty_db():
+    embeddings = make_embeddings(n_rows=20)
+    embeddings["function:zero|path:/code/alpha/src/zero.py"] = np.zeros(16, dtype=np.float32)
+    index = VectorSearch(embeddings)
+    results = index.search(np.ones(16, dtype=np.float32), top_k=len(embeddings))
+    assert dict(results)["function:zero|path:/code/alpha/src/zero.py"] == 0.0
+    assert all(np.isfinite(score) for _, score in results)
+
+    assert VectorSearch({}).search(np.ones(16, dtype=np.float32), top_k=5) == []
+
+
+def test_memory_mapped_store_matches_dict(tmp_path):
+    embeddings = make_embeddings(n_rows=100)
+    prefix = str(tmp_path / "store")
+    save_vector_store(prefix, embeddings)
+    store = VectorStore.open(prefix)
+    query = np.random.default_rng(3).standard_normal(16).astype(np.float32)
+    assert_same_results(VectorSearch(store).search(query, top_k=10), brute_force(embeddings, query, 10))
+
+
+def test_search_index_for_caches_per_db():
+    embeddings = make_embeddings(n_rows=50)
+    index = search_index_for(embeddings)
+    assert search_index_for(embeddings) is index
+
+    # plain dicts are re-indexed once their size changes
+    embeddings["function:extra|path:/code/alpha/src/extra.py"] = np.ones(16, dtype=np.float32)
+    rebuilt = search_index_for(embeddings)
+    assert rebuilt is not index
+    assert len(rebuilt) == len(embeddings)
+
+    drop_search_index(embeddings)
+    assert search_index_for(embeddings) is not rebuilt
@@ -0,0 +1,48 @@
+import hashlib
+
+import numpy as np
+
+from utils.storage.sqlite_lru_cache import SqliteLRUCache
+
+############################################################################
+######         CONTENT-ADDRESSED, ON-DISK EMBEDDING CACHE             ######
+######                                                                ######
+###### - rows are keyed by (model, sha256(prompt)) so unchanged text  ######
+######   never goes back to the embedding server                      ######
+###### - vectors are stored as raw float32 blobs in a sqlite table    ######
+###### - size bounded LRU, see utils/storage/sqlite_lru_cache.py      ######
+############################################################################
+
+DEFAULT_MAX_ENTRIES = 2_000_000
+
+
+def prompt_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _encode_vector(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def _decode_vector(blob):
+    return np.frombuffer(blob, dtype=np.float32).copy()
+
+
+class EmbeddingCache(SqliteLRUCache):
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(path, "embeddings", ("model", "hash"), "vector", "BLOB", max_entries,
+                         encode=_encode_vector, decode=_decode_vector, name="Embedding cache")
+
+    def get_many(self, model, texts):
+        # Returns one vector per text, None where the cache has nothing yet.
+        return self.get_values((model, prompt_hash(text)) for text in texts)
+
+    def get(self, model, text):
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model, items):
+        # items: iterable of (text, vector) pairs
+        self.put_values(((model, prompt_hash(text)), vector) for text, vector in items)
+
+    def put(self, model, text, vector):
+        self.put_many(model, [(text, vector)])
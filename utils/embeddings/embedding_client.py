@@ -0,0 +1,189 @@
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+############################################################################
+######    POOLED, CONCURRENT CLIENT FOR THE OLLAMA EMBEDDING SERVER    ######
+######                                                                ######
+###### - one keep-alive session shared by a bounded pool of workers   ######
+###### - batches through /api/embed when the server supports it and   ######
+######   falls back to one /api/embeddings call per prompt otherwise  ######
+###### - retries with exponential backoff, keeps per-run counters     ######
+############################################################################
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 0.5
+DEFAULT_TIMEOUT_SECONDS = 120
+
+
+def _json_body(response):
+    # the decoded json object, or None for anything else (proxy error pages, truncated replies)
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def _model_error(response):
+    # ollama answers an unknown model with a json error on the endpoint itself,
+    # a server without the endpoint answers with a plain "404 page not found"
+    body = _json_body(response)
+    return body.get('error') if body else None
+
+
+class EmbeddingClient:
+    def __init__(self, api_url, model=None, max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF_SECONDS, timeout=DEFAULT_TIMEOUT_SECONDS):
+        self.api_url = api_url
+        # ollama >= 0.3 exposes a batched endpoint next to the legacy single-prompt one
+        self.batch_url = api_url[:-len("embeddings")] + "embed" if api_url.endswith("/embeddings") else None
+        self.model = model
+        self.max_workers = max(1, max_workers)
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.supports_batch = self.batch_url is not None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def configure(self, max_workers=None, batch_size=None):
+        if max_workers:
+            self.max_workers = max_workers
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+        if batch_size:
+            self.batch_size = batch_size
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = {"texts": 0, "requests": 0, "retries": 0, "failures": 0}
+            self._started_at = time.perf_counter()
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    def embed(self, text, model=None):
+        return self.embed_many([text], model=model)[0]
+
+    def embed_many(self, texts, model=None):
+        # Returns one float32 vector (or None on failure) per input text, in input order.
+        texts = list(texts)
+        if not texts:
+            return []
+        model = model or self.model
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        if len(batches) == 1 or self.max_workers == 1:
+            results = [self._embed_batch(batch, model) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                results = list(pool.map(lambda batch: self._embed_batch(batch, model), batches))
+
+        embeddings = [embedding for batch in results for embedding in batch]
+        self._count(texts=len(texts), failures=sum(1 for e in embeddings if e is None))
+        return embeddings
+
+    def _embed_batch(self, batch, model):
+        if self.supports_batch and len(batch) > 1:
+            embeddings = self._post_batch(batch, model)
+            if embeddings is not None:
+                return embeddings
+        return [self._post_single(text, model) for text in batch]
+
+    def _post_batch(self, batch, model):
+        response = self._post(self.batch_url, {"model": model, "input": batch})
+        if response is None:
+            return None
+        if response.status_code == 404:
+            error = _model_error(response)
+            if error:
+                # the endpoint exists, e.g. the model isn't pulled: single prompts would fail the same way
+                logging.error(f"Error in embedding request: {error}")
+                return [None] * len(batch)
+            # older servers only know /api/embeddings, stop trying the batched endpoint
+            logging.info("Embedding server has no batch endpoint, falling back to single prompts")
+            self.supports_batch = False
+            return None
+        body = _json_body(response)
+        if body is None:
+            logging.error(f"Invalid batch embedding response: not a json object ({len(response.content)} bytes)")
+            return None
+        embeddings = body.get('embeddings')
+        if not embeddings or len(embeddings) != len(batch):
+            logging.error(f"Invalid batch embedding response: expected {len(batch)} vectors, got {len(embeddings) if embeddings else 'None'}")
+            return None
+        return [np.array(embedding, dtype=np.float32) for embedding in embeddings]
+
+    def _post_single(self, text, model):
+        response = self._post(self.api_url, {"model": model, "prompt": text})
+        if response is None:
+            return None
+        body = _json_body(response)
+        if body is None:
+            logging.error(f"Invalid embedding response: not a json object ({len(response.content)} bytes)")
+            return None
+        embedding = body.get('embedding')
+        if not embedding:
+            logging.error(f"Invalid embedding format received. Expected 768 dimensions, got {len(embedding) if embedding else 'None'}")
+            return None
+        return np.array(embedding, dtype=np.float32)
+
+    def _post(self, url, payload):
+        data = json.dumps(payload)
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._count(requests=1)
+                response = self.session.post(url, data=data, timeout=self.timeout)
+                if response.status_code < 500:
+                    # 404 is handed back so callers can detect a missing endpoint
+                    if response.status_code != 404:
+                        response.raise_for_status()
+                    return response
+                logging.warning(f"Embedding server returned {response.status_code} (attempt {attempt + 1})")
+            except requests.HTTPError as e:
+                logging.error(f"Error in embedding request: {str(e)}")
+                return None
+            except requests.RequestException as e:
+                logging.warning(f"Embedding request failed (attempt {attempt + 1}): {str(e)}")
+            if attempt < self.max_retries:
+                self._count(retries=1)
+                time.sleep(self.backoff * (2 ** attempt))
+        logging.error(f"Giving up on embedding request after {self.max_retries + 1} attempts")
+        return None
+
+    def report(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+            elapsed = time.perf_counter() - self._started_at
+        stats["elapsed"] = elapsed
+        stats["texts_per_second"] = stats["texts"] / elapsed if elapsed > 0 else 0.0
+        return stats
+
+    def log_report(self):
+        stats = self.report()
+        logging.info(
+            f"Embedded {stats['texts']} texts in {stats['elapsed']:.2f}s "
+            f"({stats['texts_per_second']:.1f} texts/s) using {stats['requests']} requests, "
+            f"{stats['retries']} retries, {stats['failures']} failures"
+        )
+        return stats
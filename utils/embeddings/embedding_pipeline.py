@@ -0,0 +1,59 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+############################################################################
+######         CROSS-FILE EMBEDDING BATCHES, EMBEDDED CONCURRENTLY    ######
+######                                                                ######
+###### - prompts from consecutive files are packed into full batches, ######
+######   a typical file alone has far fewer elements than one batch   ######
+###### - full batches are embedded on a bounded pool of threads while ######
+######   the caller keeps parsing; once max_pending batches are in    ######
+######   flight add() waits for the oldest one                        ######
+###### - results are stored in the order the keys were added, so the  ######
+######   db comes out exactly as with one request per file            ######
+############################################################################
+
+
+class EmbeddingPipeline:
+    def __init__(self, embed_batch, target, batch_size, max_workers, max_pending=None):
+        # embed_batch: list of texts -> list of vectors (None for failures), target: {key: vector}
+        self.embed_batch = embed_batch
+        self.target = target
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max_pending or 2 * max(1, max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._keys = []
+        self._texts = []
+        self._pending = deque()
+
+    def add(self, prompts):
+        # prompts: {key: text}
+        for key, text in prompts.items():
+            self._keys.append(key)
+            self._texts.append(text)
+            if len(self._keys) >= self.batch_size:
+                self._submit()
+
+    def _submit(self):
+        if self._keys:
+            self._pending.append((self._keys, self._pool.submit(self.embed_batch, self._texts)))
+            self._keys = []
+            self._texts = []
+        while self._pending and (len(self._pending) > self.max_pending or self._pending[0][1].done()):
+            self._store_oldest()
+
+    def _store_oldest(self):
+        keys, future = self._pending.popleft()
+        for key, embedding in zip(keys, future.result()):
+            if embedding is not None:
+                self.target[key] = embedding
+
+    def close(self):
+        # embeds what is left and waits for every batch, target is complete afterwards
+        try:
+            self._submit()
+            while self._pending:
+                self._store_oldest()
+        finally:
+            self._pool.shutdown(wait=True)
+
@@ -0,0 +1,134 @@
+import os
+import json
+import logging
+from collections.abc import Mapping
+
+import numpy as np
+
+############################################################################
+######            BINARY, MEMORY-MAPPED EMBEDDING STORE               ######
+######                                                                ######
+###### - <prefix>.npy: one contiguous (rows x dim) float matrix,      ######
+######   opened with mmap so pages load only when a query touches it ######
+###### - <prefix>.keys.json: row order + dtype/dim metadata           ######
+###### - behaves like the old {key: np.array} dict so existing        ######
+######   callers keep working while search code reads .matrix         ######
+############################################################################
+
+STORE_FORMAT_VERSION = 1
+
+
+def matrix_path(prefix):
+    return f"{prefix}.npy"
+
+
+def keys_path(prefix):
+    return f"{prefix}.keys.json"
+
+
+class VectorStore(Mapping):
+    def __init__(self, matrix, keys, path=None):
+        self.matrix = matrix
+        self.key_list = keys
+        self.path = path
+        self._index = None
+
+    @classmethod
+    def exists(cls, prefix):
+        return os.path.exists(matrix_path(prefix)) and os.path.exists(keys_path(prefix))
+
+    @classmethod
+    def open(cls, prefix):
+        with open(keys_path(prefix), "r") as f:
+            meta = json.load(f)
+        keys = meta["keys"]
+        if keys:
+            matrix = np.load(matrix_path(prefix), mmap_mode="r")
+        else:
+            # zero-length files can't be mapped
+            matrix = np.load(matrix_path(prefix))
+        if matrix.shape[0] != len(keys):
+            raise ValueError(f"Vector store {prefix} is corrupt: {matrix.shape[0]} rows for {len(keys)} keys")
+        return cls(matrix, keys, path=prefix)
+
+    @property
+    def index(self):
+        # key -> row, built on first lookup so opening the store stays O(keys file)
+        if self._index is None:
+            self._index = {key: row for row, key in enumerate(self.key_list)}
+        return self._index
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def row_of(self, key):
+        return self.index[key]
+
+    def __getitem__(self, key):
+        return self.matrix[self.index[key]]
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(self.key_list)
+
+    def __len__(self):
+        return len(self.key_list)
+
+    def items(self):
+        # positional, avoids building the key index for full scans
+        return ((key, self.matrix[row]) for row, key in enumerate(self.key_list))
+
+    def values(self):
+        return (self.matrix[row] for row in range(len(self.key_list)))
+
+
+def save_vector_store(prefix, embeddings, dtype=np.float32):
+    # embeddings: mapping or iterable of (key, vector); None vectors are skipped
+    items = embeddings.items() if hasattr(embeddings, "items") else embeddings
+    items = [(key, vector) for key, vector in items if vector is not None]
+    keys = [key for key, _ in items]
+    dim = len(items[0][1]) if items else 0
+
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # write next to the target and swap in, readers never see a half written store
+    tmp_matrix = matrix_path(prefix) + ".tmp"
+    tmp_keys = keys_path(prefix) + ".tmp"
+    if items:
+        matrix = np.lib.format.open_memmap(tmp_matrix, mode="w+", dtype=dtype, shape=(len(items), dim))
+        for row, (key, vector) in enumerate(items):
+            if len(vector) != dim:
+                raise ValueError(f"Embedding for {key} has {len(vector)} dimensions, expected {dim}")
+            matrix[row] = vector
+        matrix.flush()
+        del matrix
+    else:
+        with open(tmp_matrix, "wb") as f:
+            np.save(f, np.zeros((0, 0), dtype=dtype))
+
+    with open(tmp_keys, "w") as f:
+        json.dump({
+            "version": STORE_FORMAT_VERSION,
+            "dtype": np.dtype(dtype).name,
+            "dim": dim,
+            "count": len(keys),
+            "keys": keys,
+        }, f)
+
+    os.replace(tmp_matrix, matrix_path(prefix))
+    os.replace(tmp_keys, keys_path(prefix))
+    logging.info(f"Saved {len(keys)} embeddings ({dim} dims, {np.dtype(dtype).name}) to {matrix_path(prefix)}")
+
+
+def convert_json_db(json_db_path, prefix, dtype=np.float32):
+    # one-off migration from the old {key: [floats]} JSON db
+    logging.info(f"Converting JSON embeddings db {json_db_path} to vector store {prefix}")
+    with open(json_db_path, "r") as f:
+        embeddings = json.load(f)
+    save_vector_store(prefix, ((key, np.asarray(vector, dtype=dtype)) for key, vector in embeddings.items() if vector), dtype=dtype)
+    return VectorStore.open(prefix)
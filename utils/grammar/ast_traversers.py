@@ -1,5 +1,7 @@
 import json
 import re
+import sys
+from bisect import bisect_left, bisect_right
 
 ############################################################################
 ############################################################################
@@ -12,7 +14,109 @@ import re
 ############################################################################
 ############################################################################
 
-def traverse_tree_java(node, code, node_tree, language):
+# (language name, query string) -> compiled Query, compiling is the expensive part
+_compiled_queries = {}
+
+
+def compiled_query(language, query_string):
+    key = (language.name, query_string)
+    query = _compiled_queries.get(key)
+    if query is None:
+        query = _compiled_queries[key] = language.query(query_string)
+    return query
+
+
+class QueryCaptures:
+    # One captures() pass over the root. The traversers still recurse the way they always have,
+    # but each level slices its subtree's captures out of this list instead of re-running the query.
+    def __init__(self, language, query_string, root):
+        self.captures = compiled_query(language, query_string).captures(root)
+        self.starts = [capture_node.start_byte for capture_node, _ in self.captures]
+        self.captured_ids = {capture_node.id for capture_node, _ in self.captures}
+
+    def within(self, node):
+        # same captures, in the same order, as query.captures(node)
+        lo = bisect_left(self.starts, node.start_byte)
+        hi = bisect_right(self.starts, node.end_byte)
+        return [capture for capture in self.captures[lo:hi] if capture[0].end_byte <= node.end_byte]
+
+    def is_captured(self, node):
+        return node.id in self.captured_ids
+
+
+##### Reading text straight off the syntax tree #####
+# names, parameters and bodies come from the grammar's field nodes, only the bytes of
+# the field are decoded (from a memoryview, no intermediate copy). The old regexes are
+# kept as a fallback for grammars without the field, run over the header only.
+
+# what str.strip() removes, as far as single bytes go
+WHITESPACE_BYTES = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+
+
+def node_text(code, node, start_offset=0, end_offset=0):
+    return str(memoryview(code)[node.start_byte + start_offset : node.end_byte - end_offset], "utf-8")
+
+
+def field_text(code, node, field_name):
+    child = node.child_by_field_name(field_name)
+    return node_text(code, child) if child is not None else None
+
+
+def delimited_range(code, node, field_name, delimited_only=False):
+    # (start, end) bytes of a "(a, b)" / "{ ... }" field without its delimiters, other fields as is;
+    # stripped. None if the field is missing, or isn't delimited and delimited_only is set
+    child = node.child_by_field_name(field_name)
+    if child is None:
+        return None
+    start, end = child.start_byte, child.end_byte
+    if end - start >= 2 and code[start] in b"({" and code[end - 1] in b")}":
+        start, end = start + 1, end - 1
+    elif delimited_only:
+        return None
+    while start < end and code[start] in WHITESPACE_BYTES:
+        start += 1
+    while end > start and code[end - 1] in WHITESPACE_BYTES:
+        end -= 1
+    return start, end
+
+
+def delimited_text(code, node, field_name):
+    text_range = delimited_range(code, node, field_name)
+    if text_range is None:
+        return None
+    return str(memoryview(code)[text_range[0]:text_range[1]], "utf-8")
+
+
+def function_body(code, node, delimited_only=True):
+    # The body without its braces, "" for expression bodies (delimited_only) or no body.
+    # Kept as a SourceSpan into the parsed bytes and only decoded when it is read.
+    body_range = delimited_range(code, node, "body", delimited_only=delimited_only)
+    if body_range is None:
+        return ""
+    start, end = body_range
+    return SourceSpan(code, start, end - start)
+
+
+def header_text(code, node):
+    # everything before the body, e.g. "public static int foo(int a)"
+    body = node.child_by_field_name("body")
+    end_offset = node.end_byte - body.start_byte if body is not None else 0
+    return node_text(code, node, 0, end_offset)
+
+
+def function_declarator(node):
+    # C/C++: the function_declarator under any pointer/reference declarators
+    declarator = node.child_by_field_name("declarator")
+    while declarator is not None and declarator.type != "function_declarator":
+        declarator = declarator.child_by_field_name("declarator")
+    return declarator
+
+
+def split_parameters(parameters):
+    return parameters.split(",") if parameters else []
+
+
+def traverse_tree_java(node, code, node_tree, language, query_captures=None):
     java_function = None
     query_string = """
     (import_declaration) @import
@@ -24,77 +128,46 @@ def traverse_tree_java(node, code, node_tree, language):
     (method_declaration) @method
     """
 
-    query = language.query(query_string)
-    captures = query.captures(node)
+    if query_captures is None:
+        query_captures = QueryCaptures(language, query_string, node)
+    captures = query_captures.within(node)
 
-    should_traverse_children = True
-    for capture_node, capture_name in captures:
-        if capture_node == node:
-            should_traverse_children = False
+    should_traverse_children = not query_captures.is_captured(node)
 
     for capture_node, capture_index in captures:
         if capture_index == "import":
-            node_tree.imports.append(
-                code[capture_node.start_byte : capture_node.end_byte]
-                .decode("utf-8")
-                .strip()
-            )
+            node_tree.imports.append(node_text(code, capture_node).strip())
 
         elif capture_index == "package":
-            node_tree.package = (
-                code[capture_node.start_byte : capture_node.end_byte]
-                .decode("utf-8")
-                .strip()
-            )
+            node_tree.package = node_text(code, capture_node).strip()
 
         elif capture_index in ["class", "class_public", "class_abstract"]:
-            class_name_match = re.search(
-                r"\b(?:class|interface)\s+([a-zA-Z_]\w*)",
-                code[capture_node.start_byte : capture_node.end_byte].decode("utf-8"),
-            )
-            if class_name_match:
-                class_name = class_name_match.group(1)
+            class_name = field_text(code, capture_node, "name")
+            if class_name:
                 node_tree.class_names.append(class_name)
 
         elif capture_index == "field":
-            property_declaration = (
-                code[capture_node.start_byte : capture_node.end_byte]
-                .decode("utf-8")
-                .strip()
-            )
+            property_declaration = node_text(code, capture_node).strip()
             node_tree.property_declarations.append(property_declaration)
 
         elif capture_index == "annotation":
-            annotation_text = (
-                code[capture_node.start_byte : capture_node.end_byte]
-                .decode("utf-8")
-                .strip()
-            )
+            annotation_text = node_text(code, capture_node).strip()
             if java_function:
                 java_function.annotations.append(annotation_text)
 
         elif capture_index == "method":
-            method_code = code[capture_node.start_byte : capture_node.end_byte].decode(
-                "utf-8"
-            )
-            func_name_match = re.search(
-                r"\b(?:public|protected|private|static|final|abstract|synchronized|native|strictfp)?\s*(\w+\s+)?(\w+)\s*\(",
-                method_code,
-            )
-            if func_name_match:
-                return_type = func_name_match.group(1).strip() if func_name_match.group(1) else "void"
-                func_name = func_name_match.group(2).strip()
-                parameters_match = re.search(r'\((.*?)\)', method_code)
-                parameters = parameters_match.group(1).strip() if parameters_match else ""
-                func_body_match = re.search(r'\{(.*)\}', method_code, re.DOTALL)
-                func_body = func_body_match.group(1).strip() if func_body_match else ""
+            func_name = field_text(code, capture_node, "name")
+            if func_name:
+                return_type = field_text(code, capture_node, "type") or "void"
+                parameters = delimited_text(code, capture_node, "parameters") or ""
+                func_body = function_body(code, capture_node)
 
                 java_function = FunctionNode(
                     name=func_name,
-                    parameters=parameters.split(",") if parameters else [],
+                    parameters=split_parameters(parameters),
                     return_type=return_type,
                     body=func_body,
-                    class_names=node_tree.class_names,
+                    class_name=node_tree.joined_class_names(),
                 )
 
                 duplicate_found = any(
@@ -109,10 +182,10 @@ def traverse_tree_java(node, code, node_tree, language):
 
     if should_traverse_children:
         for child_node in node.children:
-            traverse_tree_java(child_node, code, node_tree, language)
+            traverse_tree_java(child_node, code, node_tree, language, query_captures)
 
 
-def traverse_tree_c(node, code, node_tree, language):
+def traverse_tree_c(node, code, node_tree, language, query_captures=None):
     c_function = None
     query_string = """
     (preproc_include) @include
@@ -120,56 +193,57 @@ def traverse_tree_c(node, code, node_tree, language):
     (declaration) @variable
     (struct_specifier) @struct
     """
-    query = language.query(query_string)
-    captures = query.captures(node)
+    if query_captures is None:
+        query_captures = QueryCaptures(language, query_string, node)
+    captures = query_captures.within(node)
 
-    should_traverse_children = True
-    for capture_node, capture_name in captures:
-        if capture_node == node:
-            should_traverse_children = False
+    should_traverse_children = not query_captures.is_captured(node)
 
     for capture_node, capture_index in captures:
-        text = code[capture_node.start_byte : capture_node.end_byte].decode("utf-8").strip()
-
         if capture_index == "include":
-            node_tree.imports.append(text)
+            node_tree.imports.append(node_text(code, capture_node).strip())
         elif capture_index == "function":
-            function_details = extract_function_details_c(text)
+            function_details = extract_function_details_c(capture_node, code, node_tree)
             if function_details and not any(f.name == function_details.name for f in node_tree.functions):
                 node_tree.functions.append(function_details)
         elif capture_index == "variable":
             # Consider global variables only if outside any function definition
             if not node_tree.functions:
-                node_tree.property_declarations.append(text)
+                node_tree.property_declarations.append(node_text(code, capture_node).strip())
         elif capture_index == "struct":
-            struct_name_match = re.search(r'struct\s+(\w+)', text)
-            if struct_name_match:
-                node_tree.class_names.append(struct_name_match.group(1))
+            struct_name = field_text(code, capture_node, "name")
+            if struct_name:
+                node_tree.class_names.append(struct_name)
 
     if should_traverse_children:
         for child in node.children:
-            traverse_tree_c(child, code, node_tree, language)
+            traverse_tree_c(child, code, node_tree, language, query_captures)
 
-def extract_function_details_c(text):
-    func_name_match = re.search(r'(\w+)\s*\(', text)
-    func_name = func_name_match.group(1) if func_name_match else "anonymous"
-    parameters_match = re.search(r'\((.*?)\)', text)
-    parameters = parameters_match.group(1).strip() if parameters_match else ""
-    return_type_match = re.search(r'^(\w+)\s+', text)
-    return_type = return_type_match.group(1).strip() if return_type_match else "int"  # Default return type in C is int
-    func_body_match = re.search(r'\{\s*(.*?)\s*\}', text, re.DOTALL)
-    func_body = func_body_match.group(1).strip() if func_body_match else ""
+def extract_function_details_c(node, code, node_tree):
+    declarator = function_declarator(node)
+    if declarator is not None:
+        func_name = field_text(code, declarator, "declarator") or "anonymous"
+        parameters = delimited_text(code, declarator, "parameters") or ""
+    else:
+        # e.g. K&R definitions or macros the grammar can't see through
+        header = header_text(code, node)
+        func_name_match = re.search(r'(\w+)\s*\(', header)
+        func_name = func_name_match.group(1) if func_name_match else "anonymous"
+        parameters_match = re.search(r'\((.*?)\)', header)
+        parameters = parameters_match.group(1).strip() if parameters_match else ""
+    return_type = field_text(code, node, "type") or "int"  # Default return type in C is int
+    func_body = function_body(code, node)
 
     return FunctionNode(
         name=func_name,
-        parameters=parameters.split(",") if parameters else [],
+        parameters=split_parameters(parameters),
         return_type=return_type,
         body=func_body
     )
 
 
 
-def traverse_tree_cpp(node, code, node_tree, language):
+def traverse_tree_cpp(node, code, node_tree, language, query_captures=None):
     cpp_function = None
     query_string = """
     (preproc_include) @include
@@ -179,59 +253,62 @@ def traverse_tree_cpp(node, code, node_tree, language):
     (function_definition) @function
     (declaration) @field
     """
-    query = language.query(query_string)
-    captures = query.captures(node)
+    if query_captures is None:
+        query_captures = QueryCaptures(language, query_string, node)
+    captures = query_captures.within(node)
 
-    should_traverse_children = True
-    for capture_node, capture_name in captures:
-        if capture_node == node:
-            should_traverse_children = False
+    should_traverse_children = not query_captures.is_captured(node)
 
     for capture_node, capture_index in captures:
-        text = code[capture_node.start_byte : capture_node.end_byte].decode("utf-8").strip()
-
         if capture_index == "include":
-            node_tree.imports.append(text)
+            node_tree.imports.append(node_text(code, capture_node).strip())
         elif capture_index == "namespace":
             # Assuming the namespace can be nested or complex, this simplifies to a single namespace string
-            namespace_name_match = re.search(r'namespace\s+([\w:]+)', text)
-            if namespace_name_match:
-                node_tree.package = namespace_name_match.group(1)
+            namespace_name = field_text(code, capture_node, "name")
+            if namespace_name:
+                node_tree.package = namespace_name
         elif capture_index in ["class", "struct"]:
-            class_or_struct_match = re.search(r'\b(class|struct)\s+([\w<>,\s]+)', text)
-            if class_or_struct_match:
-                node_tree.class_names.append(class_or_struct_match.group(2).strip())
+            class_or_struct_name = field_text(code, capture_node, "name")
+            if class_or_struct_name:
+                node_tree.class_names.append(class_or_struct_name.strip())
         elif capture_index == "function":
-            function_details = extract_function_details_cpp(text, node_tree.class_names)
+            function_details = extract_function_details_cpp(capture_node, code, node_tree)
             if function_details and not any(f.name == function_details.name for f in node_tree.functions):
                 node_tree.functions.append(function_details)
         elif capture_index == "field":
-            node_tree.property_declarations.append(text)
+            node_tree.property_declarations.append(node_text(code, capture_node).strip())
 
     if should_traverse_children:
         for child in node.children:
-            traverse_tree_cpp(child, code, node_tree, language)
-
-def extract_function_details_cpp(text, class_names):
-    func_name_match = re.search(r'(\w+)\s*\((.*)\)\s*(const)?\s*{?', text)
-    parameters = func_name_match.group(2).strip() if func_name_match else ""
-    func_name = func_name_match.group(1) if func_name_match else ""
-    return_type_match = re.search(r'\w+\s+(\w+)', text.split('(')[0])
-    return_type = return_type_match.group(1).strip() if return_type_match else "void"
-    func_body_match = re.search(r'\{(.*)\}', text, re.DOTALL)
-    func_body = func_body_match.group(1).strip() if func_body_match else ""
+            traverse_tree_cpp(child, code, node_tree, language, query_captures)
+
+def extract_function_details_cpp(node, code, node_tree):
+    declarator = function_declarator(node)
+    if declarator is not None:
+        # "Foo::bar" / "~Foo" / "operator==" -> last identifier
+        qualified_name = field_text(code, declarator, "declarator") or ""
+        names = re.findall(r'\w+', qualified_name)
+        func_name = names[-1] if names else ""
+        parameters = delimited_text(code, declarator, "parameters") or ""
+    else:
+        header = header_text(code, node)
+        func_name_match = re.search(r'(\w+)\s*\((.*)\)', header)
+        func_name = func_name_match.group(1) if func_name_match else ""
+        parameters = func_name_match.group(2).strip() if func_name_match else ""
+    return_type = field_text(code, node, "type") or "void"
+    func_body = function_body(code, node)
 
     return FunctionNode(
         name=func_name,
         parameters=parameters.split(","),
         return_type=return_type,
         body=func_body,
-        class_names=class_names
+        class_name=node_tree.joined_class_names()
     )
 
 
 
-def traverse_tree_go(node, code, node_tree, language):
+def traverse_tree_go(node, code, node_tree, language, query_captures=None):
     go_function = None
     query_string = """
     (import_declaration) @import
@@ -241,51 +318,44 @@ def traverse_tree_go(node, code, node_tree, language):
     (type_declaration) @type
     (var_declaration) @var
     """
-    query = language.query(query_string)
-    captures = query.captures(node)
+    if query_captures is None:
+        query_captures = QueryCaptures(language, query_string, node)
+    captures = query_captures.within(node)
 
-    should_traverse_children = True
-    for capture_node, capture_name in captures:
-        if capture_node == node:
-            should_traverse_children = False
+    should_traverse_children = not query_captures.is_captured(node)
 
     for capture_node, capture_index in captures:
-        text = code[capture_node.start_byte : capture_node.end_byte].decode("utf-8").strip()
-
         if capture_index == "import":
-            node_tree.imports.append(text)
+            node_tree.imports.append(node_text(code, capture_node).strip())
         elif capture_index == "package":
-            package_name_match = re.search(r'package\s+(\w+)', text)
+            package_name_match = re.search(r'package\s+(\w+)', node_text(code, capture_node))
             if package_name_match:
                 node_tree.package = package_name_match.group(1)
         elif capture_index in ["function", "method"]:
-            function_details = extract_function_details_go(text)
+            function_details = extract_function_details_go(capture_node, code, node_tree)
             if function_details and not any(f.name == function_details.name for f in node_tree.functions):
                 node_tree.functions.append(function_details)
         elif capture_index == "type":
-            type_name_match = re.search(r'type\s+(\w+)\s+struct', text)
-            if type_name_match:
-                node_tree.class_names.append(type_name_match.group(1))
+            for type_spec in capture_node.named_children:
+                type_node = type_spec.child_by_field_name("type")
+                if type_spec.type == "type_spec" and type_node is not None and type_node.type == "struct_type":
+                    node_tree.class_names.append(field_text(code, type_spec, "name"))
         elif capture_index == "var":
-            node_tree.property_declarations.append(text)
+            node_tree.property_declarations.append(node_text(code, capture_node).strip())
 
     if should_traverse_children:
         for child in node.children:
-            traverse_tree_go(child, code, node_tree, language)
+            traverse_tree_go(child, code, node_tree, language, query_captures)
 
-def extract_function_details_go(text):
-    func_name_match = re.search(r'func\s+(\w+)\s*\(', text)
-    if not func_name_match:  # Handle methods
-        func_name_match = re.search(r'func\s*\(\s*\w+\s+\*\w+\s*\)\s+(\w+)\s*\(', text)
-    func_name = func_name_match.group(1) if func_name_match else "anonymous"
-    parameters_match = re.search(r'\((.*?)\)', text)
-    parameters = parameters_match.group(1).strip() if parameters_match else ""
-    func_body_match = re.search(r'\{(.*)\}', text, re.DOTALL)
-    func_body = func_body_match.group(1).strip() if func_body_match else ""
+def extract_function_details_go(node, code, node_tree):
+    # functions and methods alike, the receiver of a method is not a parameter
+    func_name = field_text(code, node, "name") or "anonymous"
+    parameters = delimited_text(code, node, "parameters") or ""
+    func_body = function_body(code, node)
 
     return FunctionNode(
         name=func_name,
-        parameters=parameters.split(",") if parameters else [],
+        parameters=split_parameters(parameters),
         return_type="undefined",  # Go functions might not declare return types explicitly in all cases
         body=func_body
     )
@@ -306,7 +376,7 @@ def extract_property_name(property_declaration):
 
 
 
-def traverse_tree_js(node, code, node_tree, language):
+def traverse_tree_js(node, code, node_tree, language, query_captures=None):
     js_function = None
     query_string = """
     (import_statement) @import
@@ -317,56 +387,49 @@ def traverse_tree_js(node, code, node_tree, language):
     (variable_declarator) @variable
     (export_statement) @export
     """
-    query = language.query(query_string)
-    captures = query.captures(node)
+    if query_captures is None:
+        query_captures = QueryCaptures(language, query_string, node)
+    captures = query_captures.within(node)
 
-    should_traverse_children = True
-    for capture_node, capture_name in captures:
-        if capture_node == node:
-            should_traverse_children = False
+    should_traverse_children = not query_captures.is_captured(node)
 
     for capture_node, capture_index in captures:
-        text = code[capture_node.start_byte : capture_node.end_byte].decode("utf-8").strip()
-
         if capture_index == "import":
-            node_tree.imports.append(text)
+            node_tree.imports.append(node_text(code, capture_node).strip())
         elif capture_index == "class":
-            class_name_match = re.search(r'class\s+(\w+)', text)
-            if class_name_match:
-                node_tree.class_names.append(class_name_match.group(1))
+            class_name = field_text(code, capture_node, "name")
+            if class_name:
+                node_tree.class_names.append(class_name)
         elif capture_index in ["function", "arrow_function", "method"]:
-            function_details = extract_function_details_js(text)
+            function_details = extract_function_details_js(capture_node, code, node_tree)
             if function_details and not any(f.name == function_details.name for f in node_tree.functions):
                 node_tree.functions.append(function_details)
         elif capture_index == "variable":
-            node_tree.property_declarations.append(text)
+            node_tree.property_declarations.append(node_text(code, capture_node).strip())
         elif capture_index == "export":
-            node_tree.exports.append(text)  # Assuming you might want to track exports similarly
+            node_tree.exports.append(node_text(code, capture_node).strip())  # Assuming you might want to track exports similarly
 
     if should_traverse_children:
         for child in node.children:
-            traverse_tree_js(child, code, node_tree, language)
+            traverse_tree_js(child, code, node_tree, language, query_captures)
 
-def extract_function_details_js(text):
-    func_name_match = re.search(r'function\s+(\w+)\s*\(', text)
-    if not func_name_match:  # Check for arrow functions or anonymous functions
-        func_name_match = re.search(r'(\w+)\s*=\s*\(', text)
-    func_name = func_name_match.group(1) if func_name_match else "anonymous"
-    parameters_match = re.search(r'\((.*?)\)', text)
-    parameters = parameters_match.group(1).strip() if parameters_match else ""
-    func_body_match = re.search(r'\{(.*)\}', text, re.DOTALL)
-    func_body = func_body_match.group(1).strip() if func_body_match else ""
+def extract_function_details_js(node, code, node_tree):
+    # arrow functions have no name of their own
+    func_name = field_text(code, node, "name") or "anonymous"
+    # "x => ..." has a single `parameter` instead of a parameter list
+    parameters = delimited_text(code, node, "parameters") or delimited_text(code, node, "parameter") or ""
+    func_body = function_body(code, node)
 
     return FunctionNode(
         name=func_name,
-        parameters=parameters.split(",") if parameters else [],
+        parameters=split_parameters(parameters),
         return_type="n/a",  # JavaScript functions do not explicitly declare return types
         body=func_body
     )
 
 
 
-def traverse_tree_kt(node, code, node_tree, language):
+def traverse_tree_kt(node, code, node_tree, language, query_captures=None):
     kotlin_function = None
     query_string = """
     (import_list) @import
@@ -378,107 +441,80 @@ def traverse_tree_kt(node, code, node_tree, language):
     (function_declaration) @function
     """
 
-    query = language.query(query_string)
-    captures = query.captures(node)
+    if query_captures is None:
+        query_captures = QueryCaptures(language, query_string, node)
+    captures = query_captures.within(node)
 
-    should_traverse_children = True
-    for capture_node, capture_name in captures:
-        if capture_node == node:
-            should_traverse_children = False
+    should_traverse_children = not query_captures.is_captured(node)
 
     is_data_class = False
     for capture_node, capture_index in captures:
         if capture_index == "import":
-            node_tree.imports = (
-                code[capture_node.start_byte : capture_node.end_byte]
-                .decode("utf-8")
-                .strip()
-            ).split("\n")
+            node_tree.imports = node_text(code, capture_node).strip().split("\n")
 
         elif capture_index == "package":
-            node_tree.package = (
-                code[capture_node.start_byte : capture_node.end_byte]
-                .decode("utf-8")
-                .strip()
-            )
+            node_tree.package = node_text(code, capture_node).strip()
 
         elif capture_index == "class_or_interface":
-            class_code = code[capture_node.start_byte : capture_node.end_byte].decode(
-                "utf-8"
-            )
-            class_name_match = re.search(
-                r"\b(?:sealed\s+class|data\s+class|class|interface)\s+([a-zA-Z_]\w*)",
-                class_code,
-            )
-            if class_name_match:
-                class_name = class_name_match.group(1)
-                is_data_class = "data class" in class_code
+            class_header = header_text(code, capture_node)
+            class_name = field_text(code, capture_node, "name")
+            if class_name is None:
+                class_name_match = re.search(
+                    r"\b(?:sealed\s+class|data\s+class|class|interface)\s+([a-zA-Z_]\w*)",
+                    class_header,
+                )
+                class_name = class_name_match.group(1) if class_name_match else None
+            if class_name:
+                is_data_class = "data class" in class_header
                 node_tree.class_names.append(f"{class_name}")
-                node_tree.is_interface = "interface" in class_code
+                node_tree.is_interface = "interface" in class_header
 
                 # Extract data class fields
                 if is_data_class:
                     # Modified regular expression to capture the entire line for each property
                     fields = re.findall(
                         r"\b(val|var)\s+([a-zA-Z_]\w*\s*:\s*[a-zA-Z_]\w*(\??)(<.*>)?(\??))",
-                        class_code,
+                        node_text(code, capture_node),
                     )
                     node_tree.property_declarations = (
                         ",\n".join(" ".join(f) for f in fields)
                     ).split("\n")
 
         elif capture_index == "annotation":
-            annotation_text = (
-                code[capture_node.start_byte : capture_node.end_byte]
-                .decode("utf-8")
-                .strip()
-            )
+            annotation_text = node_text(code, capture_node).strip()
             if kotlin_function:
                 kotlin_function.annotations.append(annotation_text)
 
         # Added extraction of object declarations
         elif capture_index == "object_declaration":
-            object_name_match = re.search(
-                r"\b(?:object)\s+([a-zA-Z_]\w*)",
-                code[capture_node.start_byte : capture_node.end_byte].decode("utf-8"),
-            )
-            if object_name_match:
-                object_name = object_name_match.group(1)
+            object_name = field_text(code, capture_node, "name")
+            if object_name is None:
+                object_name_match = re.search(r"\b(?:object)\s+([a-zA-Z_]\w*)", header_text(code, capture_node))
+                object_name = object_name_match.group(1) if object_name_match else None
+            if object_name:
                 node_tree.class_names.append(object_name)
 
         elif capture_index == "field" and not is_data_class:
-            property_declaration = (
-                code[capture_node.start_byte : capture_node.end_byte]
-                .decode("utf-8")
-                .strip()
-            )
+            property_declaration = node_text(code, capture_node).strip()
             node_tree.property_declarations.append(property_declaration)
 
         elif capture_index == "function":
-            function_code = code[
-                capture_node.start_byte : capture_node.end_byte
-            ].decode("utf-8")
-            func_name_match = re.search(
-                r"\b(?:fun)\s+(?:[a-zA-Z_]\w*\.)*([a-zA-Z_]\w*)", function_code
-            )
-            if func_name_match:
-                func_name = func_name_match.group(1)
-                parameters_match = re.search(r"\((.*?)\)", function_code)
-                parameters = parameters_match.group(1) if parameters_match else ""
-                return_type_match = re.search(
-                    r":\s*([a-zA-Z_][\w<>,.? ]*)", function_code
-                )
-                return_type = (
-                    return_type_match.group(1).strip() if return_type_match else "Unit"
+            func_name = field_text(code, capture_node, "name")
+            if func_name is None:
+                func_name_match = re.search(
+                    r"\b(?:fun)\s+(?:[a-zA-Z_]\w*\.)*([a-zA-Z_]\w*)", header_text(code, capture_node)
                 )
-                func_body_match = re.search(r"\{(.*)\}", function_code, re.DOTALL)
-                func_body = func_body_match.group(1).strip() if func_body_match else ""
+                func_name = func_name_match.group(1) if func_name_match else None
+            if func_name:
+                parameters = delimited_text(code, capture_node, "parameters") or ""
+                return_type = field_text(code, capture_node, "return_type") or "Unit"
+                func_body = function_body(code, capture_node)
                 kotlin_function = FunctionNode(
                     func_name,
                     parameters.split(","),
                     return_type,
                     func_body,
-                    class_names=node_tree.class_names,
+                    class_name=node_tree.joined_class_names(),
                 )
 
                 # Check for duplicates
@@ -492,7 +528,7 @@ def traverse_tree_kt(node, code, node_tree, language):
                     node_tree.functions.append(kotlin_function)
     if should_traverse_children:
         for child in node.children:
-            traverse_tree_kt(child, code, node_tree, language)
+            traverse_tree_kt(child, code, node_tree, language, query_captures)
     else:
         # Append class names, function names, and property names to package_import_paths
         if node_tree.package:
@@ -519,7 +555,7 @@ def append_to_package_import_paths(package, name, node_tree):
     node_tree.package_import_paths[package_import_path] = package_import_path
 
 
-def traverse_tree_python(node, code, node_tree, language):
+def traverse_tree_python(node, code, node_tree, language, query_captures=None):
     query_string = """
     (import_from_statement) @import_from
     (import_statement) @import
@@ -527,100 +563,93 @@ def traverse_tree_python(node, code, node_tree, language):
     (function_definition) @function
     (assignment) @variable
     """
-    query = language.query(query_string)
-    captures = query.captures(node)
+    if query_captures is None:
+        query_captures = QueryCaptures(language, query_string, node)
+    captures = query_captures.within(node)
 
-    should_traverse_children = True
-    for capture_node, capture_name in captures:
-        if capture_node == node:
-            should_traverse_children = False
+    should_traverse_children = not query_captures.is_captured(node)
 
     for capture_node, capture_index in captures:
-        extracted_text = code[capture_node.start_byte : capture_node.end_byte].decode("utf-8").strip()
-
         if capture_index == "import":
-            node_tree.imports.append(extracted_text)
+            node_tree.imports.append(node_text(code, capture_node).strip())
         elif capture_index == "import_from":
-            module_name = ' '.join([node.text.decode('utf-8') for node in capture_node.named_children if node.type == 'identifier'])
-            import_name = capture_node.child_by_field_name('name').text.decode('utf-8')
+            module_name = ' '.join([node_text(code, node) for node in capture_node.named_children if node.type == 'identifier'])
+            import_name = field_text(code, capture_node, 'name')
             node_tree.imports.append(f"from {module_name} import {import_name}")
         elif capture_index == "class":
-            class_name_match = re.search(r'class\s+(\w+)', extracted_text)
-            if class_name_match:
-                node_tree.class_names.append(class_name_match.group(1))
+            class_name = field_text(code, capture_node, "name")
+            if class_name:
+                node_tree.class_names.append(class_name)
         elif capture_index == "function":
-            function_details = extract_function_details_python(extracted_text)
+            function_details = extract_function_details_python(capture_node, code, node_tree)
             if function_details and not any(f.name == function_details.name for f in node_tree.functions):
                 node_tree.functions.append(function_details)
         elif capture_index == "variable":
             if not node_tree.functions and not node_tree.class_names:
-                node_tree.property_declarations.append(extracted_text)
+                node_tree.property_declarations.append(node_text(code, capture_node).strip())
 
     if should_traverse_children:
         for child in node.children:
-            traverse_tree_python(child, code, node_tree, language)
+            traverse_tree_python(child, code, node_tree, language, query_captures)
 
 
-def extract_function_details_python(text):
-    func_name_match = re.search(r'def\s+(\w+)\s*\(', text)
-    if func_name_match:
-        func_name = func_name_match.group(1)
-        parameters_match = re.search(r'\((.*?)\)', text)
-        parameters = parameters_match.group(1).strip() if parameters_match else ""
-        func_body_match = re.search(r':\s*\n(.*?)(^\s*$|\Z)', text, re.DOTALL | re.MULTILINE)
-        func_body = func_body_match.group(1).strip() if func_body_match else ""
+def extract_function_details_python(node, code, node_tree):
+    func_name = field_text(code, node, "name")
+    if func_name:
+        parameters = delimited_text(code, node, "parameters") or ""
+        func_body = function_body(code, node, delimited_only=False)
 
         return FunctionNode(
             name=func_name,
-            parameters=parameters.split(",") if parameters else [],
+            parameters=split_parameters(parameters),
             return_type="None",
             body=func_body
         )
 
     return None
 
-def traverse_tree_swift(node, code, node_tree, language):
+def traverse_tree_swift(node, code, node_tree, language, query_captures=None):
     query_string = """
     (import_declaration) @import
     (class_declaration) @class
     (function_declaration) @function
     (property_declaration) @variable
     """
-    query = language.query(query_string)
-    captures = query.captures(node)
+    if query_captures is None:
+        query_captures = QueryCaptures(language, query_string, node)
+    captures = query_captures.within(node)
 
     for capture_node, capture_name in captures:
-        text = code[capture_node.start_byte : capture_node.end_byte].decode("utf-8").strip()
-
         if capture_name == "import":
-            node_tree.imports.append(text)
+            node_tree.imports.append(node_text(code, capture_node).strip())
         elif capture_name == "class":
-            class_name_match = re.search(r'(class|struct|actor|extension|enum)\s+(\w+)', text)
+            class_name_match = re.search(r'(class|struct|actor|extension|enum)\s+(\w+)', header_text(code, capture_node))
             if class_name_match:
                 node_tree.class_names.append(class_name_match.group(2))
         elif capture_name == "function":
-            function_details = extract_function_details_swift(text)
+            function_details = extract_function_details_swift(capture_node, code, node_tree)
             if function_details and not any(f.name == function_details.name for f in node_tree.functions):
                 node_tree.functions.append(function_details)
         elif capture_name == "variable":
-            node_tree.property_declarations.append(text)
+            node_tree.property_declarations.append(node_text(code, capture_node).strip())
 
     for child in node.children:
-        traverse_tree_swift(child, code, node_tree, language)
+        traverse_tree_swift(child, code, node_tree, language, query_captures)
 
-def extract_function_details_swift(text):
-    func_name_match = re.search(r'func\s+(\w+)\s*\(', text)
+def extract_function_details_swift(node, code, node_tree):
+    # the swift grammar has few fields, so the regexes stay but only see the signature
+    header = header_text(code, node)
+    func_name_match = re.search(r'func\s+(\w+)\s*\(', header)
     func_name = func_name_match.group(1) if func_name_match else "anonymous"
-    parameters_match = re.search(r'\((.*?)\)', text)
+    parameters_match = re.search(r'\((.*?)\)', header)
     parameters = parameters_match.group(1).strip() if parameters_match else ""
-    return_type_match = re.search(r'->\s*(\w+)', text)
+    return_type_match = re.search(r'->\s*(\w+)', header)
     return_type = return_type_match.group(1).strip() if return_type_match else "Void"
-    func_body_match = re.search(r'\{(.*)\}', text, re.DOTALL)
-    func_body = func_body_match.group(1).strip() if func_body_match else ""
+    func_body = function_body(code, node)
 
     return FunctionNode(
         name=func_name,
-        parameters=parameters.split(",") if parameters else [],
+        parameters=split_parameters(parameters),
         return_type=return_type,
         body=func_body
     )
@@ -631,6 +660,11 @@ def extract_function_details_swift(text):
 ##### Model struture to hold parsed code #####
 
 class TreeNode:
+    __slots__ = (
+        "file_path", "class_names", "package_import_paths", "package", "imports", "exports",
+        "property_declarations", "functions", "is_interface", "_joined_class_names",
+    )
+
     def __init__(self, file_path=None, class_names=None, package_import_paths=None, package=None, imports=None, functions=None, property_declarations=None, exports=None):
         self.file_path = file_path
         self.class_names = class_names or []
@@ -640,6 +674,14 @@ class TreeNode:
         self.exports = exports or []
         self.property_declarations = property_declarations or []
         self.functions = functions or []
+        self.is_interface = False
+        self._joined_class_names = (0, "")
+
+    def joined_class_names(self):
+        # FunctionNode.class_name of a function declared now, joined again only after a class was added
+        if self._joined_class_names[0] != len(self.class_names):
+            self._joined_class_names = (len(self.class_names), sys.intern(" ".join(self.class_names)))
+        return self._joined_class_names[1]
 
     def to_dict(self):
         return {
@@ -661,18 +703,49 @@ class TreeNode:
             f"Functions:\n{functions}\nPackage Paths:{self.package_import_paths}\nPackage: {self.package}"
         )
 
+class SourceSpan:
+    # (offset, length) of a function body in the bytes its file was parsed from, decoded only when read.
+    # All spans of a file share that one bytes object; it is freed once the TreeNode is converted with to_dict
+    # and dropped (save_file_trees does this as it writes).
+    __slots__ = ("source", "offset", "length")
+
+    def __init__(self, source, offset, length):
+        self.source = source
+        self.offset = offset
+        self.length = length
+
+    def read(self):
+        return str(memoryview(self.source)[self.offset:self.offset + self.length], "utf-8")
+
+    def __repr__(self):
+        return f"SourceSpan({self.offset}, {self.length})"
+
 class FunctionNode:
-    def __init__(self, name, parameters, return_type, body, is_abstract=False, class_names=None, annotations=None):
-        self.name = name
+    __slots__ = ("name", "parameters", "return_type", "_body", "is_abstract", "class_name", "annotations")
+
+    def __init__(self, name, parameters, return_type, body, is_abstract=False, class_names=None, annotations=None, class_name=None):
+        self.name = sys.intern(name) if isinstance(name, str) else name
         self.parameters = parameters or []
-        self.return_type = return_type
+        self.return_type = sys.intern(return_type) if isinstance(return_type, str) else return_type
         self.body = body
         self.is_abstract = is_abstract
-        self.class_name = " ".join(class_names) if class_names else ""
+        # an already joined class_name wins over class_names
+        if class_name is None:
+            class_name = " ".join(class_names) if class_names else ""
+        self.class_name = sys.intern(class_name)
         self.annotations = annotations or []
 
+    @property
+    def body(self):
+        return self._body.read() if isinstance(self._body, SourceSpan) else self._body
+
+    @body.setter
+    def body(self, body):
+        self._body = body
+
     def to_dict(self):
-        body = self.body.decode("utf-8") if isinstance(self.body, bytes) else self.body
+        body = self.body
+        body = body.decode("utf-8") if isinstance(body, bytes) else body
         return {
             "name": self.name,
             "parameters": self.parameters,
@@ -693,6 +766,4 @@ class FunctionNode:
         )
 
     def to_json(self):
-        if isinstance(self.body, bytes):
-            self.body = self.body.decode("utf-8")
-        return json.dumps(self.__dict__, indent=4)
+        return json.dumps(self.to_dict(), indent=4)
@@ -0,0 +1,54 @@
+import json
+import logging
+
+############################################################################
+######          IN-MEMORY FILE-TO-FILE DEPENDENCY GRAPH               ######
+######                                                                ######
+###### - built from full_graph.json ({"nodes", "links"}) on first use ######
+######   (app.get_dependency_graph), reset on rebuild and /reload     ######
+###### - per-file dependency sets, so dependency lookups and          ######
+######   subgraphs never touch file_trees.json again                  ######
+############################################################################
+
+
+class DependencyGraph:
+    def __init__(self, graph_data):
+        self.nodes = {node['id']: dict(node) for node in graph_data.get('nodes', [])}
+        self.successors = {node_id: set() for node_id in self.nodes}
+        for link in graph_data.get('links', []):
+            self.successors.setdefault(link['source'], set()).add(link['target'])
+
+    @classmethod
+    def load(cls, full_graph_path):
+        with open(full_graph_path, 'r') as file:
+            graph = cls(json.load(file))
+        logging.info(f"Loaded dependency graph: {len(graph.nodes)} files, {graph.link_count()} links")
+        return graph
+
+    def __contains__(self, file_path):
+        return file_path in self.nodes
+
+    def link_count(self):
+        return sum(len(targets) for targets in self.successors.values())
+
+    def dependencies(self, file_paths):
+        # files directly referenced by any of file_paths
+        deps = set()
+        for file_path in file_paths:
+            deps.update(self.successors.get(file_path, ()))
+        return deps
+
+    def subgraph(self, file_paths, include_dependencies=True):
+        # {"nodes", "links"} for file_paths (plus their direct dependencies), same shape as full_graph.json
+        file_paths = [file_path for file_path in file_paths if file_path in self.nodes]
+        node_ids = set(file_paths)
+        if include_dependencies:
+            node_ids |= self.dependencies(file_paths)
+        links = [
+            {"source": source, "target": target}
+            for source in sorted(node_ids)
+            for target in sorted(self.successors.get(source, ()))
+            if target in node_ids
+        ]
+        nodes = [self.nodes[node_id] for node_id in sorted(node_ids) if node_id in self.nodes]
+        return {"nodes": nodes, "links": links}
@@ -0,0 +1,50 @@
+import os
+import json
+
+############################################################################
+######              STREAMING WRITER FOR THE GRAPH JSONS              ######
+######                                                                ######
+###### - {"links": [...], "nodes": [...]} is written one element at a ######
+######   time, nodes/links can be generators and are never encoded    ######
+######   as one big string                                           ######
+###### - indent=None (default) writes compact json with the C encoder,######
+######   an indent reproduces json.dump(..., indent, sort_keys=True)  ######
+############################################################################
+
+
+def _separators(indent):
+    return (",", ": ") if indent is not None else (",", ":")
+
+
+def _newline(indent, level):
+    return "\n" + " " * (indent * level) if indent is not None else ""
+
+
+def write_graph_json(path, nodes, links, indent=None):
+    # keys in sort_keys order, like every graph json written before
+    write_json_sections(path, [("links", links), ("nodes", nodes)], indent=indent)
+
+
+def write_json_sections(path, sections, indent=None):
+    # sections: [(key, iterable of json values)] -> {key: [values...], ...}, keys written in the given order
+    separators = _separators(indent)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("{")
+        for i, (key, values) in enumerate(sections):
+            f.write(("," if i else "") + _newline(indent, 1) + json.dumps(key) + separators[1] + "[")
+            count = 0
+            for value in values:
+                text = json.dumps(value, indent=indent, separators=separators, sort_keys=True)
+                if indent is not None:
+                    text = text.replace("\n", _newline(indent, 2))
+                f.write(("," if count else "") + _newline(indent, 2) + text)
+                count += 1
+            f.write((_newline(indent, 1) if count else "") + "]")
+        f.write((_newline(indent, 0) if sections else "") + "}")
+    # readers (the frontend, the flask server) never see a half written file
+    os.replace(tmp_path, path)
@@ -0,0 +1,210 @@
+import os
+import logging
+import threading
+from collections import defaultdict
+
+############################################################################
+######            SYMBOL INDEX FOR FILE-TO-FILE LINKING               ######
+######                                                                ######
+###### - built in one pass over file_trees:                           ######
+######     basename            -> files                               ######
+######     package.ClassName   -> files (+ kotlin package_import_paths)######
+######     package             -> files (wildcard imports)            ######
+###### - "ends with"/"contains a basename" checks only probe the      ######
+######   basename lengths that exist, so linking is near-linear       ######
+######                                                                ######
+###### ElementSymbolIndex: classes / functions / properties of every   ######
+###### file for find_imported_elements, exact names in a dict and a    ######
+###### trigram index over distinct names for the substring checks     ######
+############################################################################
+
+
+def file_base_name(file_path):
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def normalize_package(package):
+    if not package:
+        return None
+    package = package.strip()
+    if package.startswith("package "):
+        package = package[len("package "):]
+    return package.rstrip(";").strip() or None
+
+
+def qualified_import_name(import_stmt):
+    # "import static a.b.C.m;" / "import a.b.C as D" -> "a.b.C.m" / "a.b.C"
+    name = import_stmt.strip()
+    for prefix in ("import ", "static "):
+        if name.startswith(prefix):
+            name = name[len(prefix):].strip()
+    name = name.rstrip(";").strip()
+    return name.split()[0] if name else ""
+
+
+class FileSymbolIndex:
+    def __init__(self, file_trees):
+        self.files_by_base = defaultdict(set)
+        self.files_by_qualified_name = defaultdict(set)
+        self.files_by_package = defaultdict(set)
+
+        for file_path, node_tree in file_trees.items():
+            if not isinstance(node_tree, dict):
+                continue
+            self.files_by_base[file_base_name(file_path)].add(file_path)
+
+            package = normalize_package(node_tree.get("package"))
+            if package:
+                self.files_by_package[package].add(file_path)
+                for class_name in node_tree.get("class_names", []):
+                    self.files_by_qualified_name[f"{package}.{class_name}"].add(file_path)
+            for package_import_path in node_tree.get("package_import_paths", {}) or {}:
+                self.files_by_qualified_name[package_import_path].add(file_path)
+
+        self.base_lengths = sorted({len(base) for base in self.files_by_base})
+
+    def files_with_base_suffix(self, text):
+        # files whose basename `text` ends with
+        found = set()
+        for length in self.base_lengths:
+            if length > len(text):
+                break
+            found |= self.files_by_base.get(text[len(text) - length:], set())
+        return found
+
+    def files_with_base_inside(self, text):
+        # files whose basename occurs anywhere in `text`
+        found = set()
+        for length in self.base_lengths:
+            if length > len(text):
+                break
+            for start in range(len(text) - length + 1):
+                found |= self.files_by_base.get(text[start:start + length], set())
+        return found
+
+    def files_for_import(self, import_stmt):
+        name = qualified_import_name(import_stmt)
+        if not name:
+            return set()
+        if name.endswith(".*"):
+            return set(self.files_by_package.get(name[:-2], set())) | self.files_by_qualified_name.get(name[:-2], set())
+        found = set(self.files_by_qualified_name.get(name, set()))
+        if not found and "." in name:
+            # static member imports name the class one level up
+            found |= self.files_by_qualified_name.get(name.rsplit(".", 1)[0], set())
+        return found
+
+    def resolve(self, file_path, node_imports, property_dependencies, function_names, class_names, raw_imports=()):
+        # Files `file_path` depends on. The basename rules match process_full_graph's original
+        # pairwise checks exactly; raw_imports additionally resolve fully-qualified imports.
+        dependencies = set()
+        for imp in node_imports:
+            dependencies |= self.files_with_base_suffix(imp)
+        for prop in property_dependencies:
+            dependencies |= self.files_by_base.get(prop, set())
+        for name in function_names:
+            dependencies |= self.files_with_base_inside(name)
+        for class_name in class_names:
+            dependencies |= self.files_with_base_inside(class_name)
+        for import_stmt in raw_imports:
+            dependencies |= self.files_for_import(import_stmt)
+        dependencies.discard(file_path)
+        return dependencies
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _tree_elements(node_tree):
+    # (class names, function names, properties) of a file tree dict or TreeNode
+    if isinstance(node_tree, dict):
+        functions = node_tree.get("functions", [])
+        return (
+            node_tree.get("class_names", []),
+            [func["name"] if isinstance(func, dict) else func.name for func in functions],
+            node_tree.get("property_declarations", []),
+        )
+    return node_tree.class_names, [func.name for func in node_tree.functions], node_tree.property_declarations
+
+
+class SubstringIndex:
+    # names -> element ids, queried with "query in name"
+    def __init__(self):
+        self.names = []
+        self.ids_by_name = {}
+        self.names_by_trigram = defaultdict(set)
+
+    def add(self, name, element_id):
+        ids = self.ids_by_name.get(name)
+        if ids is None:
+            ids = self.ids_by_name[name] = []
+            name_id = len(self.names)
+            self.names.append(name)
+            for trigram in trigrams(name):
+                self.names_by_trigram[trigram].add(name_id)
+        ids.append(element_id)
+
+    def find(self, query):
+        if len(query) < 3:
+            candidates = range(len(self.names))
+        else:
+            postings = sorted((self.names_by_trigram.get(trigram, set()) for trigram in trigrams(query)), key=len)
+            candidates = set.intersection(*postings) if postings[0] else ()
+        found = []
+        for name_id in candidates:
+            name = self.names[name_id]
+            if query in name:
+                found.extend(self.ids_by_name[name])
+        return found
+
+
+class ElementSymbolIndex:
+    def __init__(self, file_trees):
+        # element ids follow file_trees order, then classes, functions, properties within a file,
+        # so sorted ids reproduce the order of a full scan
+        self.elements = []
+        self.classes = SubstringIndex()
+        self.functions = defaultdict(list)
+        self.properties = SubstringIndex()
+
+        for file_path, node_tree in file_trees.items():
+            if not node_tree:
+                continue
+            class_names, function_names, properties = _tree_elements(node_tree)
+            for class_name in class_names:
+                self.classes.add(class_name, len(self.elements))
+                self.elements.append(f"class:{class_name}|{file_path}")
+            for name in function_names:
+                self.functions[name].append(len(self.elements))
+                self.elements.append(f"function:{name}|{file_path}")
+            for prop in properties:
+                self.properties.add(prop, len(self.elements))
+                self.elements.append(f"property:{prop}|{file_path}")
+
+    def __len__(self):
+        return len(self.elements)
+
+    def find_imported_elements(self, import_stmt):
+        # classes and properties containing import_stmt, functions named exactly import_stmt
+        element_ids = self.classes.find(import_stmt) + self.functions.get(import_stmt, []) + self.properties.find(import_stmt)
+        return [self.elements[element_id] for element_id in sorted(element_ids)]
+
+
+_element_index = None
+_element_index_lock = threading.Lock()
+
+
+def element_index_for(file_trees):
+    # One ElementSymbolIndex for the latest file_trees object; plain dicts are re-indexed when their size changes.
+    global _element_index
+    with _element_index_lock:
+        cached = _element_index
+    if cached is not None and cached[0] is file_trees and cached[2] == len(file_trees):
+        return cached[1]
+
+    index = ElementSymbolIndex(file_trees)
+    logging.info(f"Built element symbol index: {len(file_trees)} files, {len(index)} elements")
+    with _element_index_lock:
+        _element_index = (file_trees, index, len(file_trees))
+    return index
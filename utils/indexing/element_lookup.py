@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+
+############################################################################
+######              PER-FILE ELEMENT LOOKUP FOR SNIPPETS              ######
+######                                                                ######
+###### - one ElementLookup per file tree: function name -> first      ######
+######   function, class names as a set, first exact property/import  ######
+###### - substring rules of get_snippet are kept: the first element   ######
+######   containing the name can only come before the exact match, so ######
+######   only that prefix is scanned                                  ######
+###### - lookups are cached per tree object in a bounded LRU          ######
+############################################################################
+
+DEFAULT_CACHE_SIZE = 2048
+
+
+def _first_positions(items):
+    positions = {}
+    for i, item in enumerate(items):
+        positions.setdefault(item, i)
+    return positions
+
+
+class ElementLookup:
+    def __init__(self, node_tree):
+        if isinstance(node_tree, dict):
+            functions = node_tree.get('functions', [])
+            class_names = node_tree.get('class_names', [])
+            self.properties = node_tree.get('property_declarations', [])
+            self.imports = node_tree.get('imports', [])
+        else:
+            functions = node_tree.functions
+            class_names = node_tree.class_names
+            self.properties = node_tree.property_declarations
+            self.imports = node_tree.imports
+
+        self.functions = {}
+        for func in functions:
+            name = func.get('name') if isinstance(func, dict) else func.name
+            self.functions.setdefault(name, func)
+        self.class_names = set(class_names)
+        self.property_positions = _first_positions(self.properties)
+        self.import_positions = _first_positions(self.imports)
+
+    def function_body(self, name):
+        func = self.functions.get(name)
+        if func is None:
+            return None
+        return func.get('body', '') if isinstance(func, dict) else func.body
+
+    def has_class(self, name):
+        return name in self.class_names
+
+    def property_containing(self, name):
+        end = self.property_positions.get(name, len(self.properties) - 1)
+        for prop in self.properties[:end + 1]:
+            if name in prop:
+                return prop
+        return None
+
+    def import_matching(self, name):
+        # first import containing the name or one of its dotted parts
+        parts = name.split('.')
+        end = self.import_positions.get(name, len(self.imports) - 1)
+        for imp in self.imports[:end + 1]:
+            if name in imp or any(part in imp for part in parts):
+                return imp
+        return None
+
+
+_lookups = OrderedDict()
+_lookups_lock = threading.Lock()
+
+
+def element_lookup(node_tree, cache_size=DEFAULT_CACHE_SIZE):
+    # the tree is held alongside its lookup so its id can't be reused while cached
+    with _lookups_lock:
+        cached = _lookups.get(id(node_tree))
+        if cached is not None and cached[0] is node_tree:
+            _lookups.move_to_end(id(node_tree))
+            return cached[1]
+
+    lookup = ElementLookup(node_tree)
+    with _lookups_lock:
+        _lookups[id(node_tree)] = (node_tree, lookup)
+        _lookups.move_to_end(id(node_tree))
+        while len(_lookups) > cache_size:
+            _lookups.popitem(last=False)
+    return lookup
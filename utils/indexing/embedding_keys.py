@@ -0,0 +1,41 @@
+import re
+
+# Embedding keys look like "<type>:<name>|...|path:<file>", body chunks like
+# "function_<name>_body_chunk_<i>|class:<class>|path:<file>". These helpers pull
+# the pieces back out without every caller re-implementing the splits.
+
+BODY_CHUNK_TYPE = "body_chunk"
+_BODY_CHUNK_ELEMENT = re.compile(r"^function_(.*)_body_chunk_\d+$")
+
+
+def path_of_key(key):
+    return key.split('|path:')[-1]
+
+
+def element_of_key(key):
+    return key.split('|')[0]
+
+
+def element_type_of_key(key):
+    element = element_of_key(key)
+    if ':' in element:
+        return element.split(':', 1)[0]
+    if '_body_chunk_' in element:
+        return BODY_CHUNK_TYPE
+    return element
+
+
+def function_name_of_key(key):
+    # name of the function a "function:" or body chunk key belongs to, None for other elements
+    element = element_of_key(key)
+    if element.startswith("function:"):
+        return element.split(':', 1)[1]
+    match = _BODY_CHUNK_ELEMENT.match(element)
+    return match.group(1) if match else None
+
+
+def extract_component_name(file_path):
+    match = re.search(r"/([^/]+)/(?:app/)?src/", file_path)
+    if match:
+        return match.group(1)
+    return None
@@ -0,0 +1,90 @@
+import os
+import json
+import hashlib
+import logging
+
+############################################################################
+######         FILE MANIFEST FOR INCREMENTAL RE-INDEXING              ######
+######                                                                ######
+###### - records (size, mtime, content hash) for every indexed file   ######
+###### - size + mtime is the fast path, the hash is only recomputed   ######
+######   when those changed so touched-but-identical files are kept   ######
+############################################################################
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_file(file_path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_bytes(data):
+    # same digest as hash_file, for contents that are already in memory
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def file_entry(file_path, stat=None, content_hash=None):
+    stat = stat or os.stat(file_path)
+    return {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "hash": content_hash or hash_file(file_path),
+    }
+
+
+def build_manifest(file_paths):
+    files = {}
+    for file_path in file_paths:
+        try:
+            files[file_path] = file_entry(file_path)
+        except OSError as e:
+            logging.warning(f"Skipping {file_path} in manifest: {str(e)}")
+    return files
+
+
+def diff_manifest(previous_files, file_paths):
+    # Returns (current manifest, added, changed, removed) for the files found on disk now.
+    current = {}
+    added, changed = [], []
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            logging.warning(f"Skipping {file_path} in manifest: {str(e)}")
+            continue
+
+        old_entry = previous_files.get(file_path)
+        if old_entry and old_entry["size"] == stat.st_size and old_entry["mtime"] == stat.st_mtime:
+            current[file_path] = old_entry
+            continue
+
+        entry = file_entry(file_path, stat)
+        current[file_path] = entry
+        if old_entry is None:
+            added.append(file_path)
+        elif old_entry["hash"] != entry["hash"]:
+            changed.append(file_path)
+
+    removed = [file_path for file_path in previous_files if file_path not in current]
+    return current, added, changed, removed
+
+
+def load_manifest(manifest_path):
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    return {"root_dir": None, "files": {}}
+
+
+def save_manifest(manifest_path, root_dir, files):
+    directory = os.path.dirname(manifest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(manifest_path, "w") as f:
+        json.dump({"root_dir": os.path.abspath(root_dir), "files": files}, f)
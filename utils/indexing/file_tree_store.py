@@ -0,0 +1,194 @@
+import os
+import re
+import json
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+############################################################################
+######           OFFSET-INDEXED, LAZILY LOADED file_trees.json        ######
+######                                                                ######
+###### - file_trees.json keeps its format, a sidecar index maps every ######
+######   path to the (byte offset, length) of its entry               ######
+###### - lookups read and parse only that entry, a bounded LRU keeps  ######
+######   the hot ones, so opening costs O(paths) not O(file size)     ######
+###### - the index is written together with the json, or rebuilt     ######
+######   with one scan when it is missing or older than the json      ######
+############################################################################
+
+INDEX_FORMAT_VERSION = 1
+DEFAULT_CACHE_SIZE = 2048
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def index_path(path):
+    return f"{path}.index"
+
+
+def source_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def write_file_trees(path, entries, indent=4):
+    # entries: mapping or iterable of (file path, tree dict). Written one entry at a time,
+    # byte for byte what json.dump(dict(entries), f, indent=indent) would produce.
+    items = entries.items() if hasattr(entries, "items") else entries
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    paths, offsets, lengths = [], [], []
+    newline = "\n" + " " * indent if indent is not None else ""
+    separators = (",", ": ") if indent is not None else (",", ":")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="ascii") as f:
+        f.write("{")
+        position = 1
+        for i, (file_path, tree) in enumerate(items):
+            head = ("," if i else "") + newline + json.dumps(file_path) + separators[1]
+            value = json.dumps(tree, indent=indent, separators=separators)
+            if indent is not None:
+                value = value.replace("\n", newline)
+            f.write(head)
+            f.write(value)
+            paths.append(file_path)
+            offsets.append(position + len(head))
+            lengths.append(len(value))
+            position += len(head) + len(value)
+        f.write(("\n" if indent is not None and paths else "") + "}")
+    os.replace(tmp_path, path)
+    save_index(path, paths, offsets, lengths)
+    logging.info(f"Saved {len(paths)} file trees to {path}")
+
+
+def save_index(path, paths, offsets, lengths):
+    tmp_path = index_path(path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({
+            "version": INDEX_FORMAT_VERSION,
+            "source": source_signature(path),
+            "paths": paths,
+            "offsets": offsets,
+            "lengths": lengths,
+        }, f)
+    os.replace(tmp_path, index_path(path))
+
+
+def scan_index(path):
+    # (paths, offsets, lengths) of any top-level json object, indented or not.
+    # Decoded as latin-1 so string positions are byte offsets; only keys are decoded properly.
+    with open(path, "rb") as f:
+        data = f.read()
+    text = data.decode("latin-1")
+    decoder = json.JSONDecoder()
+    paths, offsets, lengths = [], [], []
+
+    position = _WHITESPACE.match(text, 0).end()
+    if text[position:position + 1] != "{":
+        raise ValueError(f"{path} is not a json object")
+    position += 1
+    while True:
+        position = _WHITESPACE.match(text, position).end()
+        if text[position:position + 1] == "}":
+            break
+        key_start = position
+        _, position = decoder.raw_decode(text, position)
+        file_path = json.loads(data[key_start:position])
+        position = _WHITESPACE.match(text, position).end() + 1  # ':'
+        value_start = _WHITESPACE.match(text, position).end()
+        _, position = decoder.raw_decode(text, value_start)
+        paths.append(file_path)
+        offsets.append(value_start)
+        lengths.append(position - value_start)
+        position = _WHITESPACE.match(text, position).end()
+        if text[position:position + 1] == ",":
+            position += 1
+    return paths, offsets, lengths
+
+
+class FileTreeStore(Mapping):
+    # read-only {file path: tree dict} view of file_trees.json
+    def __init__(self, path, paths, offsets, lengths, signature, cache_size=DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.signature = signature
+        self.cache_size = cache_size
+        self._entries = {file_path: (offset, length) for file_path, offset, length in zip(paths, offsets, lengths)}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, path, cache_size=DEFAULT_CACHE_SIZE):
+        signature = source_signature(path)
+        index = None
+        if os.path.exists(index_path(path)):
+            try:
+                with open(index_path(path), "r") as f:
+                    index = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable file tree index {index_path(path)}: {str(e)}")
+        if index is None or index.get("version") != INDEX_FORMAT_VERSION or index.get("source") != signature:
+            logging.info(f"Indexing {path}")
+            paths, offsets, lengths = scan_index(path)
+            try:
+                save_index(path, paths, offsets, lengths)
+            except OSError as e:
+                logging.warning(f"Could not save file tree index {index_path(path)}: {str(e)}")
+        else:
+            paths, offsets, lengths = index["paths"], index["offsets"], index["lengths"]
+        return cls(path, paths, offsets, lengths, signature, cache_size=cache_size)
+
+    def is_stale(self):
+        # True once file_trees.json was rewritten (or removed) after this store was opened
+        try:
+            return source_signature(self.path) != self.signature
+        except OSError:
+            return True
+
+    def _read(self, f, offset, length):
+        f.seek(offset)
+        return json.loads(f.read(length))
+
+    def __getitem__(self, file_path):
+        with self._lock:
+            tree = self._cache.get(file_path)
+            if tree is not None:
+                self._cache.move_to_end(file_path)
+                self.hits += 1
+                return tree
+        offset, length = self._entries[file_path]
+        with open(self.path, "rb") as f:
+            tree = self._read(f, offset, length)
+        with self._lock:
+            self.misses += 1
+            self._cache[file_path] = tree
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tree
+
+    def __contains__(self, file_path):
+        return file_path in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def items(self):
+        # full scans read the file front to back once and leave the LRU alone
+        with open(self.path, "rb") as f:
+            for file_path, (offset, length) in self._entries.items():
+                yield file_path, self._read(f, offset, length)
+
+    def values(self):
+        return (tree for _, tree in self.items())
+
+    def report(self):
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0.0
+        return f"File tree store: {len(self)} files, {len(self._cache)} cached, hits: {self.hits}, misses: {self.misses} ({hit_rate:.1f}% hit rate)"
@@ -0,0 +1,55 @@
+import hashlib
+
+from utils.tokens.token_counter import count_tokens, truncate_to_tokens
+
+############################################################################
+######              TOKEN-BUDGETED CONTEXT PACKING                    ######
+######                                                                ######
+###### - candidates are (score, text) pieces, taken best score first  ######
+######   until the budget is spent; pieces that don't fit are skipped ######
+######   so smaller, lower scored ones can still fill the gap         ######
+###### - identical pieces (ignoring surrounding whitespace) go in once######
+###### - the separator between pieces is counted against the budget  ######
+############################################################################
+
+SEPARATOR = "\n\n"
+
+
+def _fingerprint(text):
+    return hashlib.sha1(text.strip().encode("utf-8")).hexdigest()
+
+
+def select_within_budget(candidates, max_tokens, separator=SEPARATOR, truncate_first=True):
+    # Returns the indexes of the chosen candidates, best score first, plus the text to use for each
+    # (only the very first piece is ever truncated, when it alone is over budget and truncate_first is set).
+    order = sorted(range(len(candidates)), key=lambda i: -candidates[i][0])
+    separator_tokens = count_tokens(separator) if separator else 0
+    seen = set()
+    chosen = []
+    used = 0
+    for i in order:
+        text = candidates[i][1]
+        if not text or not text.strip():
+            continue
+        fingerprint = _fingerprint(text)
+        if fingerprint in seen:
+            continue
+        cost = count_tokens(text) + (separator_tokens if chosen else 0)
+        if used + cost > max_tokens:
+            if chosen or not truncate_first:
+                continue
+            text = truncate_to_tokens(text, max_tokens)
+            cost = count_tokens(text)
+        seen.add(fingerprint)
+        chosen.append((i, text))
+        used += cost
+    return chosen
+
+
+def pack_context(candidates, max_tokens, separator=SEPARATOR, keep_order=False):
+    # candidates: list of (score, text). keep_order joins the chosen pieces in candidate order
+    # instead of by score, e.g. functions in the order they appear in their file.
+    chosen = select_within_budget(candidates, max_tokens, separator=separator)
+    if keep_order:
+        chosen.sort()
+    return separator.join(text for _, text in chosen)
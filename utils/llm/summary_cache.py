@@ -0,0 +1,30 @@
+import hashlib
+
+from utils.storage.sqlite_lru_cache import SqliteLRUCache
+
+############################################################################
+######              CONTENT-ADDRESSED, ON-DISK SUMMARY CACHE          ######
+######                                                                ######
+###### - rows are keyed by (model, sha256(prompt template),           ######
+######   sha256(content)) so a file is summarized once per model and  ######
+######   prompt, then reused across queries, users and restarts       ######
+###### - size bounded LRU, see utils/storage/sqlite_lru_cache.py      ######
+############################################################################
+
+DEFAULT_MAX_ENTRIES = 200_000
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SummaryCache(SqliteLRUCache):
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(path, "summaries", ("model", "template", "hash"), "summary", "TEXT", max_entries,
+                         name="Summary cache")
+
+    def get(self, model, template, content):
+        return self.get_values([(model, content_hash(template), content_hash(content))])[0]
+
+    def put(self, model, template, content, summary):
+        self.put_values([((model, content_hash(template), content_hash(content)), summary)])
@@ -0,0 +1,157 @@
+import os
+import hashlib
+import logging
+
+import numpy as np
+
+############################################################################
+######        APPROXIMATE NEAREST NEIGHBOURS: INVERTED FILE (IVF)     ######
+######                                                                ######
+###### - spherical k-means splits the normalized vectors into n_lists ######
+######   cells, every row is filed under its closest centroid         ######
+###### - a query only scores the rows of its nprobe closest cells,    ######
+######   nprobe trades recall for latency (n_lists = exact search)    ######
+###### - pure numpy, persisted as <store prefix>.ivf.npz              ######
+############################################################################
+
+DEFAULT_NPROBE = 16
+KMEANS_ITERATIONS = 10
+# k-means trains on a sample, this many points per centroid is plenty
+TRAINING_POINTS_PER_LIST = 64
+# rows x n_lists scores held at once while assigning rows to cells
+ASSIGN_BLOCK_ROWS = 4096
+
+
+def ann_index_path(store_prefix):
+    return f"{store_prefix}.ivf.npz"
+
+
+def default_n_lists(n_rows):
+    return max(1, min(n_rows, int(4 * np.sqrt(n_rows))))
+
+
+def keys_fingerprint(keys):
+    # ties a persisted index to the exact row order of the store it was built from
+    digest = hashlib.blake2b(digest_size=16)
+    for key in keys:
+        digest.update(key.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _normalized(matrix, inv_norms, rows):
+    return np.asarray(matrix[rows], dtype=np.float32) * inv_norms[rows, None]
+
+
+def _assign(vectors, centroids):
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        block = vectors[start:start + ASSIGN_BLOCK_ROWS]
+        assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+def train_centroids(matrix, inv_norms, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    n_rows = matrix.shape[0]
+    sample_size = min(n_rows, n_lists * TRAINING_POINTS_PER_LIST)
+    # sorted rows keep reads sequential on a memmap
+    sample = _normalized(matrix, inv_norms, np.sort(rng.choice(n_rows, sample_size, replace=False)))
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = _assign(sample, centroids)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=n_lists)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        non_empty = counts > 0
+        sums = np.add.reduceat(sample[order], starts[non_empty], axis=0)
+        centroids[non_empty] = sums
+        # empty cells get a fresh random point so they can pick up a cluster next round
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.where(norms > 0, norms, 1.0)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids, offsets, row_ids, fingerprint, nprobe=DEFAULT_NPROBE):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.row_ids = row_ids
+        self.fingerprint = fingerprint
+        self.nprobe = nprobe
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @property
+    def n_rows(self):
+        return len(self.row_ids)
+
+    @classmethod
+    def build(cls, matrix, inv_norms, keys, n_lists=None, centroids=None, nprobe=DEFAULT_NPROBE, seed=0):
+        # pass centroids to re-file rows under an existing partition without re-training
+        n_rows = matrix.shape[0]
+        if centroids is None:
+            centroids = train_centroids(matrix, inv_norms, n_lists or default_n_lists(n_rows), seed=seed)
+
+        assignment = np.empty(n_rows, dtype=np.int32)
+        for start in range(0, n_rows, ASSIGN_BLOCK_ROWS):
+            rows = np.arange(start, min(start + ASSIGN_BLOCK_ROWS, n_rows))
+            assignment[rows] = _assign(_normalized(matrix, inv_norms, rows), centroids)
+
+        row_ids = np.argsort(assignment, kind="stable").astype(np.int64)
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=len(centroids))))).astype(np.int64)
+        return cls(centroids, offsets, row_ids, keys_fingerprint(keys), nprobe=nprobe)
+
+    def probe_rows(self, query_vector, nprobe=None):
+        # Sorted row ids of the nprobe cells closest to the query.
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        query = np.asarray(query_vector, dtype=np.float32)
+        cell_scores = self.centroids @ query
+        cells = np.argpartition(-cell_scores, nprobe - 1)[:nprobe] if nprobe < self.n_lists else np.arange(self.n_lists)
+        rows = np.concatenate([self.row_ids[self.offsets[cell]:self.offsets[cell + 1]] for cell in cells])
+        rows.sort()
+        return rows
+
+    def save(self, path):
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, offsets=self.offsets, row_ids=self.row_ids,
+                 fingerprint=np.array(self.fingerprint))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, nprobe=DEFAULT_NPROBE):
+        with np.load(path) as data:
+            return cls(data["centroids"], data["offsets"], data["row_ids"], str(data["fingerprint"]), nprobe=nprobe)
+
+
+def load_ann_index(store_prefix, keys, nprobe=DEFAULT_NPROBE):
+    # None when there is no index or it was built for a different version of the store
+    path = ann_index_path(store_prefix)
+    if not os.path.exists(path):
+        return None
+    ann = IVFIndex.load(path, nprobe=nprobe)
+    if ann.n_rows != len(keys) or ann.fingerprint != keys_fingerprint(keys):
+        logging.warning(f"Ignoring stale ANN index {path}, it does not match the embeddings store")
+        return None
+    return ann
+
+
+def recall_at_k(search_index, k=10, n_queries=100, nprobe=None, seed=0):
+    # Mean overlap between ANN and exact top-k, using stored vectors as queries.
+    if search_index.ann is None or len(search_index) == 0:
+        return 1.0
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(search_index), min(n_queries, len(search_index)), replace=False)
+    hits = 0
+    for row in query_rows:
+        query = np.asarray(search_index.matrix[row], dtype=np.float32)
+        exact_rows, _ = search_index.search_rows(query, k, exact=True)
+        approx_rows, _ = search_index.search_rows(query, k, nprobe=nprobe)
+        hits += len(np.intersect1d(exact_rows, approx_rows))
+    return hits / (len(query_rows) * min(k, len(search_index)))
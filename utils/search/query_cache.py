@@ -0,0 +1,93 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+############################################################################
+######        IN-PROCESS LRU + TTL CACHE WITH REQUEST COALESCING      ######
+######                                                                ######
+###### - bounded OrderedDict, least recently used entries go first,   ######
+######   entries older than ttl seconds count as missing              ######
+###### - concurrent misses on the same key share one computation: the ######
+######   first caller computes, the others wait on its future         ######
+###### - None results (failed requests) are handed out but not stored ######
+###### - clear() drops everything and starts a new generation:        ######
+######   computations still running from before it are detached, so   ######
+######   new callers don't join them, their results are dropped       ######
+############################################################################
+
+
+def normalize_query(text):
+    # "  find  the parser " and "find the parser" are the same query
+    return " ".join(text.split())
+
+
+class QueryCache:
+    def __init__(self, max_entries, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+                generation = self._generation
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._finish(key, future)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._finish(key, future)
+            if value is not None and generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl if self.ttl else None, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def _finish(self, key, future):
+        # after a clear() the key may already belong to a newer computation
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            # callers waiting on the old futures still get their results
+            self._in_flight = {}
+            self._generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def report(self):
+        total = self.hits + self.misses + self.coalesced
+        hit_rate = (self.hits / total * 100) if total else 0.0
+        return f"Query cache: {len(self)} entries, hits: {self.hits}, misses: {self.misses}, coalesced: {self.coalesced} ({hit_rate:.1f}% hit rate)"
@@ -0,0 +1,95 @@
+import os
+import json
+import logging
+
+import numpy as np
+
+############################################################################
+######        BLOCKED (REQUIREMENTS x CODE) TOP-K SIMILARITIES        ######
+######                                                                ######
+###### - requirement batches are multiplied against blocks of the     ######
+######   code matrix, so memory stays at query_block x code_block     ######
+######   scores no matter how big either side is                      ######
+###### - every row keeps a running top-k that is merged with each     ######
+######   block's own top-k (a vectorized bounded heap)                ######
+###### - results are cached on disk against a signature of both dbs  ######
+############################################################################
+
+QUERY_BLOCK_ROWS = 256
+CODE_BLOCK_ROWS = 16384
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def _top_k_per_row(scores, rows, k):
+    # scores/rows: (b x n) -> best k of each row, unsorted
+    if scores.shape[1] <= k:
+        return scores, rows
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(scores, top, axis=1), np.take_along_axis(rows, top, axis=1)
+
+
+def blocked_top_k(query_vectors, search_index, top_k=10, query_block=QUERY_BLOCK_ROWS, code_block=CODE_BLOCK_ROWS):
+    # Yields (query_start, rows, scores) per query batch, rows/scores shaped (batch x k) and sorted best first.
+    # search_index is a VectorSearch, its inv_norms make the code matrix behave as pre-normalized.
+    n_code = len(search_index)
+    k = min(top_k, n_code)
+    queries = _normalize_rows(np.asarray(query_vectors, dtype=np.float32))
+
+    for query_start in range(0, len(queries), query_block):
+        batch = queries[query_start:query_start + query_block]
+        best_scores = np.full((len(batch), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(batch), 0), dtype=np.int64)
+
+        for code_start in range(0, n_code, code_block):
+            block = np.asarray(search_index.matrix[code_start:code_start + code_block], dtype=np.float32)
+            block_scores = (batch @ block.T) * search_index.inv_norms[code_start:code_start + len(block)]
+            block_rows = np.broadcast_to(np.arange(code_start, code_start + len(block)), block_scores.shape)
+            block_scores, block_rows = _top_k_per_row(block_scores, block_rows, k)
+            best_scores, best_rows = _top_k_per_row(
+                np.concatenate([best_scores, block_scores], axis=1),
+                np.concatenate([best_rows, block_rows], axis=1),
+                k,
+            )
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        yield query_start, np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def file_signature(*paths):
+    # changes whenever one of the files is rewritten; missing files count too
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append([path, stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            signature.append([path, None, None])
+    return signature
+
+
+def load_cached_matrix(cache_path, signature):
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable similarity matrix cache {cache_path}: {str(e)}")
+        return None
+    if cached.get("signature") != signature:
+        return None
+    return cached["matrix"]
+
+
+def save_cached_matrix(cache_path, signature, matrix):
+    directory = os.path.dirname(cache_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"signature": signature, "matrix": matrix}, f)
+    os.replace(tmp_path, cache_path)
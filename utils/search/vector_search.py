@@ -0,0 +1,205 @@
+import logging
+import threading
+
+import numpy as np
+
+from utils.embeddings.vector_store import VectorStore
+from utils.indexing.embedding_keys import element_type_of_key, extract_component_name, path_of_key
+from utils.search.ann_index import DEFAULT_NPROBE, load_ann_index
+
+############################################################################
+######              VECTORIZED TOP-K SIMILARITY SEARCH                ######
+######                                                                ######
+###### - cosine similarity for every row is one matrix-vector         ######
+######   product against the embedding matrix scaled by 1/||row||     ######
+###### - argpartition picks the top k, only those k get sorted        ######
+###### - optional filters on element type, repo and path prefix       ######
+######   backed by per-row integer codes, no per-key python loop      ######
+###### - with an attached IVF index only the probed cells are scored  ######
+######   (opt-in through configure_ann, exact search by default)      ######
+############################################################################
+
+# rows scored per matmul when scanning a memory-mapped matrix
+SCAN_BLOCK_ROWS = 1 << 16
+
+
+class VectorSearch:
+    def __init__(self, embeddings, repo_of=extract_component_name):
+        if isinstance(embeddings, VectorStore):
+            self.keys = embeddings.key_list
+            # keep the memmap, norms are enough to treat it as pre-normalized
+            self.matrix = embeddings.matrix
+        else:
+            items = [(key, vector) for key, vector in embeddings.items() if vector is not None and len(vector)]
+            self.keys = [key for key, _ in items]
+            self.matrix = np.array([vector for _, vector in items], dtype=np.float32) if items else np.zeros((0, 0), dtype=np.float32)
+
+        self.inv_norms = self._inverse_norms(self.matrix)
+        self._build_metadata(repo_of)
+        # optional IVFIndex, see utils/search/ann_index.py
+        self.ann = None
+
+    @staticmethod
+    def _inverse_norms(matrix):
+        inv_norms = np.zeros(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], SCAN_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            norms = np.linalg.norm(block, axis=1)
+            # zero vectors never match anything instead of producing nan
+            inv_norms[start:start + len(block)] = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        return inv_norms
+
+    def _build_metadata(self, repo_of):
+        self.element_types, self.type_codes = self._encode([element_type_of_key(key) for key in self.keys])
+        self.paths, self.path_codes = self._encode([path_of_key(key) for key in self.keys])
+        path_repos = [repo_of(path) for path in self.paths]
+        self.repos = sorted(set(path_repos), key=str)
+        repo_code_of = {repo: code for code, repo in enumerate(self.repos)}
+        repo_code_per_path = np.array([repo_code_of[repo] for repo in path_repos], dtype=np.int32)
+        self.repo_codes = repo_code_per_path[self.path_codes] if len(self.paths) else np.zeros(0, dtype=np.int32)
+
+    @staticmethod
+    def _encode(values):
+        uniques = sorted(set(values))
+        code_of = {value: code for code, value in enumerate(uniques)}
+        return uniques, np.array([code_of[value] for value in values], dtype=np.int32)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def candidate_rows(self, element_types=None, repos=None, path_prefix=None, paths=None):
+        # None means "no filter"; returns the matching row indices or None for all rows
+        if element_types is None and repos is None and path_prefix is None and paths is None:
+            return None
+        mask = np.ones(len(self.keys), dtype=bool)
+        if element_types is not None:
+            element_types = set(element_types)
+            wanted = [code for code, value in enumerate(self.element_types) if value in element_types]
+            mask &= np.isin(self.type_codes, wanted)
+        if repos is not None:
+            repos = set(repos)
+            wanted = [code for code, value in enumerate(self.repos) if value in repos]
+            mask &= np.isin(self.repo_codes, wanted)
+        if path_prefix is not None or paths is not None:
+            wanted_paths = set(paths) if paths is not None else None
+            wanted = [
+                code for code, path in enumerate(self.paths)
+                if (path_prefix is None or path.startswith(path_prefix))
+                and (wanted_paths is None or path in wanted_paths)
+            ]
+            mask &= np.isin(self.path_codes, wanted)
+        return np.flatnonzero(mask)
+
+    def scores(self, query_vector, rows=None):
+        query = np.asarray(query_vector, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0 or len(self.keys) == 0:
+            return np.zeros(len(self.keys) if rows is None else len(rows), dtype=np.float32)
+        query = query / query_norm
+
+        if rows is not None:
+            return (np.asarray(self.matrix[rows], dtype=np.float32) @ query) * self.inv_norms[rows]
+
+        scores = np.empty(len(self.keys), dtype=np.float32)
+        for start in range(0, len(self.keys), SCAN_BLOCK_ROWS):
+            block = np.asarray(self.matrix[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+        return scores * self.inv_norms
+
+    def search_rows(self, query_vector, top_k=5, nprobe=None, exact=False, **filters):
+        # Returns (rows, scores) of the best matches, best first.
+        rows = self.candidate_rows(**filters)
+        if self.ann is not None and not exact:
+            probed = self.ann.probe_rows(query_vector, nprobe)
+            ann_rows = probed if rows is None else np.intersect1d(rows, probed, assume_unique=True)
+            # tight filters can leave the probed cells short of k matches, scan exactly then
+            if len(ann_rows) >= top_k:
+                rows = ann_rows
+        scores = self.scores(query_vector, rows)
+        if len(scores) == 0 or top_k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        result_rows = top if rows is None else rows[top]
+        return result_rows, scores[top]
+
+    def search(self, query_vector, top_k=5, element_types=None, repos=None, path_prefix=None, paths=None,
+               nprobe=None, exact=False):
+        # Returns [(key, similarity), ...] best first, similarity = 1 - cosine distance.
+        rows, scores = self.search_rows(
+            query_vector, top_k, nprobe=nprobe, exact=exact,
+            element_types=element_types, repos=repos, path_prefix=path_prefix, paths=paths
+        )
+        return [(self.keys[row], float(score)) for row, score in zip(rows, scores)]
+
+
+# a handful of dbs at most (code, requirements, a reloaded copy), oldest dropped first
+MAX_CACHED_INDEXES = 8
+_index_cache = {}
+_index_cache_lock = threading.Lock()
+# builds scan the whole matrix, concurrent first requests for the same db wait for one build
+_index_build_lock = threading.Lock()
+# approximate search only when asked for (app.py / flask_server.py --ann), see configure_ann
+_ann_enabled = False
+_ann_nprobe = DEFAULT_NPROBE
+
+
+def configure_ann(enabled, nprobe=None):
+    # indexes already built were made with the previous settings and are dropped
+    global _ann_enabled, _ann_nprobe
+    with _index_cache_lock:
+        _ann_enabled = enabled
+        _ann_nprobe = nprobe or DEFAULT_NPROBE
+        _index_cache.clear()
+
+
+def ann_enabled():
+    return _ann_enabled
+
+
+def ann_nprobe():
+    return _ann_nprobe
+
+
+def search_index_for(embeddings, vectors_of=None):
+    # One VectorSearch per embeddings db object, shared by the CLI, RaggedyRag and the flask routes.
+    # vectors_of maps dbs that aren't {key: vector} (e.g. the requirements db) to one that is.
+    # Plain dicts are re-indexed when their size changes.
+    cached = _cached_index(embeddings)
+    if cached is not None:
+        return cached
+
+    with _index_build_lock:
+        cached = _cached_index(embeddings)
+        if cached is not None:
+            return cached
+        return _build_index(embeddings, vectors_of)
+
+
+def _cached_index(embeddings):
+    with _index_cache_lock:
+        cached = _index_cache.get(id(embeddings))
+        if cached is not None and cached[0] is embeddings and cached[2] == len(embeddings):
+            return cached[1]
+    return None
+
+
+def _build_index(embeddings, vectors_of):
+    logging.info(f"Building vector search index over {len(embeddings)} embeddings")
+    index = VectorSearch(vectors_of(embeddings) if vectors_of else embeddings)
+    if _ann_enabled and isinstance(embeddings, VectorStore) and embeddings.path:
+        index.ann = load_ann_index(embeddings.path, embeddings.key_list, nprobe=_ann_nprobe)
+    with _index_cache_lock:
+        # the db is held alongside the index so its id can't be reused while cached
+        _index_cache.pop(id(embeddings), None)
+        _index_cache[id(embeddings)] = (embeddings, index, len(embeddings))
+        while len(_index_cache) > MAX_CACHED_INDEXES:
+            _index_cache.pop(next(iter(_index_cache)))
+    return index
+
+
+def drop_search_index(embeddings):
+    with _index_cache_lock:
+        _index_cache.pop(id(embeddings), None)
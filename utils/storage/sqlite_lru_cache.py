@@ -0,0 +1,171 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import defaultdict
+
+############################################################################
+######           SIZE-BOUNDED, ON-DISK LRU CACHE IN ONE SQLITE TABLE  ######
+######                                                                ######
+###### - rows are (key columns..., value, last_used), the key columns ######
+######   are the primary key, values go through an encode/decode pair ######
+###### - the row count is read once at open and kept up to date by    ######
+######   puts and evictions, no COUNT(*) per write                    ######
+###### - least recently used rows go first, down to 90% of            ######
+######   max_entries so eviction doesn't run on every insert          ######
+###### - shared by the embedding cache and the LLM summary cache      ######
+############################################################################
+
+# evict down to this fraction of max_entries
+EVICTION_TARGET_RATIO = 0.9
+SQLITE_MAX_VARIABLES = 900
+
+
+class SqliteLRUCache:
+    def __init__(self, path, table, key_columns, value_column, value_type, max_entries,
+                 encode=lambda value: value, decode=lambda value: value, name=None):
+        self.path = path
+        self.table = table
+        self.key_columns = tuple(key_columns)
+        self.value_column = value_column
+        self.value_type = value_type
+        self.max_entries = max_entries
+        self.encode = encode
+        self.decode = decode
+        self.name = name or table
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._row_count = 0
+
+    def _connection(self):
+        # opened lazily so importing the app never touches the disk
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            key_definitions = ", ".join(f"{column} TEXT NOT NULL" for column in self.key_columns)
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    {key_definitions},
+                    {self.value_column} {self.value_type} NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY ({", ".join(self.key_columns)})
+                )
+            """)
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_last_used ON {self.table} (last_used)")
+            self._conn.commit()
+            # the only full count, puts and evictions keep it current from here on
+            self._row_count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return self._conn
+
+    def _select(self, conn, columns, keys):
+        # rows of `columns` for the given key tuples: one IN query per key prefix, in chunks
+        by_prefix = defaultdict(set)
+        for key in keys:
+            by_prefix[key[:-1]].add(key[-1])
+        prefix_condition = "".join(f"{column} = ? AND " for column in self.key_columns[:-1])
+        for prefix, lasts in by_prefix.items():
+            lasts = list(lasts)
+            for i in range(0, len(lasts), SQLITE_MAX_VARIABLES):
+                chunk = lasts[i:i + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                yield from conn.execute(
+                    f"SELECT {', '.join(columns)} FROM {self.table} "
+                    f"WHERE {prefix_condition}{self.key_columns[-1]} IN ({placeholders})",
+                    [*prefix, *chunk],
+                )
+
+    def get_values(self, keys):
+        # Returns one decoded value per key tuple, None where the cache has nothing yet.
+        keys = [tuple(key) for key in keys]
+        with self._lock:
+            conn = self._connection()
+            found = {}
+            for row in self._select(conn, (*self.key_columns, self.value_column), keys):
+                found[tuple(row[:-1])] = row[-1]
+
+            if found:
+                key_condition = " AND ".join(f"{column} = ?" for column in self.key_columns)
+                conn.executemany(
+                    f"UPDATE {self.table} SET last_used = ? WHERE {key_condition}",
+                    [(time.time(), *key) for key in found],
+                )
+                conn.commit()
+
+            results = [self.decode(found[key]) if key in found else None for key in keys]
+            hit_count = sum(1 for key in keys if key in found)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return results
+
+    def put_values(self, items):
+        # items: iterable of (key tuple, value); None values are skipped
+        now = time.time()
+        rows = {tuple(key): (*key, self.encode(value), now) for key, value in items if value is not None}
+        if not rows:
+            return
+        columns = (*self.key_columns, self.value_column, "last_used")
+        with self._lock:
+            conn = self._connection()
+            # primary key lookups for the batch, replaced rows don't grow the table
+            existing = sum(1 for _ in self._select(conn, self.key_columns[-1:], rows))
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                rows.values(),
+            )
+            conn.commit()
+            self._row_count += len(rows) - existing
+            self._evict(conn)
+
+    def _evict(self, conn):
+        if self._row_count <= self.max_entries:
+            return
+        excess = self._row_count - int(self.max_entries * EVICTION_TARGET_RATIO)
+        conn.execute(
+            f"DELETE FROM {self.table} WHERE rowid IN (SELECT rowid FROM {self.table} ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        conn.commit()
+        self._row_count -= excess
+        self.evictions += excess
+
+    def __len__(self):
+        with self._lock:
+            self._connection()
+            return self._row_count
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def report(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def log_report(self):
+        stats = self.report()
+        logging.info(
+            f"{self.name}: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate'] * 100:.1f}% hit rate), {stats['evictions']} evictions"
+        )
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
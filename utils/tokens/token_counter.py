@@ -0,0 +1,65 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import tiktoken
+
+############################################################################
+######                  SHARED, CACHED TOKEN COUNTING                 ######
+######                                                                ######
+###### - one tiktoken encoder for app.py and rag.py (rag can't import ######
+######   app, app imports rag)                                        ######
+###### - counts are memoized under a digest of the text, so packing   ######
+######   the same snippets again costs a hash and a dict lookup, and  ######
+######   the cache never keeps the texts themselves alive             ######
+############################################################################
+
+ENCODING_MODEL = "gpt-4"
+TOKEN_COUNT_CACHE_SIZE = 65536
+
+_encoder = None
+_encoder_lock = threading.Lock()
+_counts = OrderedDict()
+_counts_lock = threading.Lock()
+
+
+def encoder():
+    # built on first use, loading the encoding takes a moment
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                _encoder = tiktoken.encoding_for_model(ENCODING_MODEL)
+    return _encoder
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def count_tokens(text):
+    key = _digest(text)
+    with _counts_lock:
+        count = _counts.get(key)
+        if count is not None:
+            _counts.move_to_end(key)
+            return count
+    count = len(encoder().encode(text))
+    with _counts_lock:
+        _counts[key] = count
+        if len(_counts) > TOKEN_COUNT_CACHE_SIZE:
+            _counts.popitem(last=False)
+    return count
+
+
+def clear_cache():
+    with _counts_lock:
+        _counts.clear()
+
+
+def truncate_to_tokens(text, max_tokens):
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    return encoder().decode(encoder().encode(text)[:max_tokens])